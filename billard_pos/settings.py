@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.clubs.clubs_context',
             ],
         },
     },
@@ -78,6 +82,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Writers take the lock when their transaction starts and queue for it,
+        # instead of failing when two readers both try to upgrade to writing
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        # A file, not shared memory, so threads in tests wait on each other's locks
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 # DATABASES = {
@@ -91,6 +100,25 @@ DATABASES = {
 #     }
 # }
 
+# Multi-club: the club this deployment runs, and the databases of the other clubs
+# head office reads from, as JSON {"code": {Django DATABASES entry}, ...}. A club
+# may live in its own SQLite file or in a Postgres schema (OPTIONS search_path).
+CLUB_CODE = os.getenv('CLUB_CODE', 'main')
+CLUB_DATABASES = json.loads(os.getenv('CLUB_DATABASES', '{}'))
+for _code, _database in CLUB_DATABASES.items():
+    DATABASES[f'club_{_code}'] = _database
+# Club code -> database alias, used by core.clubs.ClubRouter
+CLUBS = {CLUB_CODE: 'default', **{code: f'club_{code}' for code in CLUB_DATABASES}}
+
+# Read replica for reports (core.replica), a Django DATABASES entry as JSON.
+# Reports fall back to the primary when it is further behind than REPLICA_MAX_LAG_SECONDS.
+REPLICA_DATABASE = json.loads(os.getenv('REPLICA_DATABASE', 'null'))
+if REPLICA_DATABASE:
+    DATABASES['replica'] = {**REPLICA_DATABASE, 'TEST': {'MIRROR': 'default'}}
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 30))
+
+DATABASE_ROUTERS = ['core.clubs.ClubRouter', 'core.replica.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -131,4 +159,55 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'core:dashboard'
-LOGOUT_REDIRECT_URL = 'login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login'
+
+# Closed shifts older than this are moved to the archive by `manage.py archive_shifts`
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 90))
+
+# Shared between all worker processes without needing Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / '.cache')),
+        'TIMEOUT': 600,
+    }
+}
+
+# Share of requests profiled by core.middleware.ProfilingMiddleware (0 = off, 1 = all).
+# Results are shown to staff on /perf/
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', 0))
+PERF_BUFFER_SIZE = int(os.getenv('PERF_BUFFER_SIZE', 200))
+
+# Addresses allowed to scrape /metrics (Prometheus text format)
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Statements slower than this (ms) are logged with their EXPLAIN plan; 0 turns it off.
+# Summarise with `manage.py slow_queries`
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+SLOW_QUERY_LOG = Path(os.getenv('SLOW_QUERY_LOG', BASE_DIR / 'slow_queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'raw': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'formatter': 'raw',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.slowlog': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
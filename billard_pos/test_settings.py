@@ -0,0 +1,16 @@
+"""
+Settings for `manage.py test`: the live settings with everything the tests
+would share with a running server swapped for per-process stand-ins.
+"""
+from .settings import *  # noqa: F401,F403
+
+# The live file cache would hand test rows (the open shift...) to the server, and the tests clear it
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 600,
+    }
+}
+
+# The EXPLAIN thread keeps writing after a test; tests read the records with assertLogs
+LOGGING = {**LOGGING, 'handlers': {**LOGGING['handlers'], 'slow_queries': {'class': 'logging.NullHandler'}}}  # noqa: F405
@@ -1,25 +1,90 @@
 import math
+from contextlib import nullcontext
 from django.contrib import admin, messages
-from .models import Resource, Product, Session, Bill, SessionItem, Shift, StockMovement
+from .models import Resource, Product, Session, Bill, BillLine, SessionItem, Shift, StockMovement, CashLedgerEntry, ArchivedBill, StockCount, StockCountLine, StockAlert, TariffRule, Club
 from django.contrib.auth.models import User
-from django.utils.html import format_html
-from django.db.models import Sum, Count, F
+from django.utils.html import escape, format_html
+from django.db.models import Sum, Count, F, Max
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.safestring import mark_safe
 from django.utils.formats import date_format
 from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.shortcuts import redirect
+from django.conf import settings
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from . import billing, exports
+from .caching import get_active_shift
+from .forms import BulkIntakeForm, StockCountForm
+from .labels import label_sheet
+from .replica import reporting
+from .stock import bulk_intake, record_counts, commit_stock_count
 
 admin.site.site_header = "Панель управления Billiard POS"
 admin.site.site_title = "Billiard POS Админ"
 admin.site.index_title = "Добро пожаловать в систему управления"
 
+
+def export_csv_action(dataset, filter_field=None):
+    """Admin action that streams the selected rows of `dataset` as CSV."""
+    def action(modeladmin, request, queryset):
+        rows, header = exports.export_queryset(dataset, pks=queryset.values('pk'), filter_field=filter_field)
+        return exports.csv_response(dataset, rows, header)
+    action.__name__ = f'export_{dataset}_csv'
+    action.short_description = "Экспорт в CSV"
+    return action
+
+
 # 1. Stock Movement Admin
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
     # FIXED: Replaced 'timestamp' with 'get_local_timestamp' to apply the timezone conversion
     list_display = ('get_local_timestamp', 'product', 'type', 'quantity', 'shift')
     list_filter = ('type', 'timestamp', 'product')
+    actions = [export_csv_action('stock_movements')]
+    change_list_template = 'admin/core/stockmovement/change_list.html'
+
+    def get_urls(self):
+        custom = [
+            path('bulk-intake/', self.admin_site.admin_view(self.bulk_intake_view), name='core_stockmovement_bulk_intake'),
+        ]
+        return custom + super().get_urls()
+
+    def bulk_intake_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:core_stockmovement_changelist')
+
+        shift = get_active_shift()
+        if request.method == 'POST':
+            form = BulkIntakeForm(request.POST, request.FILES)
+            if form.is_valid():
+                if shift is None:
+                    form.add_error(None, "Нет открытой смены. Откройте смену, чтобы оформить поставку.")
+                else:
+                    try:
+                        created, products = bulk_intake(form.cleaned_data['parsed_rows'], shift, form.cleaned_data['type'])
+                    except ValidationError as e:
+                        for error in e.messages:
+                            form.add_error(None, error)
+                    else:
+                        self.message_user(request, f"Оформлено движений: {created}, товаров: {products}.", messages.SUCCESS)
+                        return redirect('admin:core_stockmovement_changelist')
+        else:
+            # ProductAdmin's action passes the selected products in ?products=1,2,3
+            pks = [pk for pk in request.GET.get('products', '').split(',') if pk.isdigit()]
+            names = Product.objects.filter(pk__in=pks).order_by('name').values_list('name', flat=True)
+            form = BulkIntakeForm(initial={'rows': "\n".join(f"{name};" for name in names)})
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Массовый приход / списание",
+            'form': form,
+            'shift': shift,
+        }
+        return TemplateResponse(request, 'admin/core/stockmovement/bulk_intake.html', context)
     
     def get_local_timestamp(self, obj):
         if obj.timestamp:
@@ -58,6 +123,17 @@ class BillInline(admin.StackedInline):
     model = Bill
     extra = 0
     can_delete = False
+    readonly_fields = ('total_amount', 'billed_minutes', 'time_amount', 'discount_amount', 'items_amount', 'shift')
+
+class BillLineInline(admin.TabularInline):
+    # Lines are written at close and never edited
+    model = BillLine
+    extra = 0
+    can_delete = False
+    fields = readonly_fields = ('kind', 'description', 'quantity', 'unit_price', 'amount')
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 # 2. Shift Admin
@@ -75,7 +151,9 @@ class ShiftAdmin(admin.ModelAdmin):
         'get_profit'
     )
     list_display_links = ('id', 'get_shift_date')
-    readonly_fields = ('start_time', 'end_time', 'get_full_report')
+    actions = [export_csv_action('shifts')]
+    readonly_fields = ('start_time', 'end_time', 'cash_balance', 'archived_at', 'get_full_report')
+    exclude = ('report_snapshot', 'report_html')
 
     def get_shift_date(self, obj):
         if obj.start_time:
@@ -102,20 +180,17 @@ class ShiftAdmin(admin.ModelAdmin):
         if not obj.start_time:
             return "Нет данных"
 
-        report = obj.get_shift_report()
-        end = obj.end_time if obj.end_time else timezone.now()
+        if obj.report_html and not obj.is_active:
+            return mark_safe(obj.report_html)
+
+        # A closed shift's report is stored for good, so it is computed on the primary
+        with reporting() if obj.is_active else nullcontext():
+            data = obj.get_report_data()
+        report = data['report']
         
         # 1. Product Logic
-        items = SessionItem.objects.filter(
-            session__bill__closed_at__range=(obj.start_time, end)
-        ).values('product__name').annotate(
-            total_qty=Sum('quantity'),
-            total_rev=Sum(F('quantity') * F('price_at_order')),
-            total_cost=Sum(F('quantity') * F('product__cost_price'))
-        )
-
         product_rows = ""
-        for item in items:
+        for item in data['products']:
             rev = item['total_rev'] or 0
             cost = item['total_cost'] or 0
             profit = rev - cost
@@ -128,14 +203,8 @@ class ShiftAdmin(admin.ModelAdmin):
                 </tr>"""
 
         # 2. Resource Logic
-        resource_stats = Bill.objects.filter(
-            closed_at__range=(obj.start_time, end)
-        ).values('session__resource__name').annotate(
-            total_earned=Sum('total_amount')
-        )
-
         resource_rows = ""
-        for res in resource_stats:
+        for res in data['resources']:
             resource_rows += f"""
                 <tr style='border-bottom: 1px solid #ddd;'>
                     <td style='padding: 12px; color: #000;'><b>{res['session__resource__name']}</b></td>
@@ -200,6 +269,7 @@ class ShiftAdmin(admin.ModelAdmin):
             </div>
         </div>
         """
+        obj.store_report_html(html_content)
         return mark_safe(html_content)
     get_full_report.short_description = "Аналитический отчет"
 
@@ -238,23 +308,19 @@ class SessionAdmin(admin.ModelAdmin):
     list_filter = ('shift', 'is_active', 'mode', 'resource')
     search_fields = ('resource__name', 'created_by__username')
     autocomplete_fields = ['shift'] 
+    actions = [export_csv_action('session_items', filter_field='session')]
     inlines = [SessionItemInline, BillInline]
 
     def get_table_only_cost(self, obj):
         if obj.is_active:
-            now = timezone.now()
-            diff = now - obj.start_time
-            mins = Decimal(diff.total_seconds() / 60)
-            price_min = Decimal(obj.resource.price_per_hour) / Decimal(60)
-            amount_str = f"{round(mins * price_min, 2):.2f}"
+            preview = billing.preview_bill(obj)[0]
+            amount_str = f"{preview.table_amount:.2f}"
             return format_html('<b style="color: #3498db; font-size: 1.2em;">{} сом (текущая)</b>', amount_str)
         else:
             bill = Bill.objects.filter(session=obj).first()
             if bill:
-                items_total = sum(item.total_price() for item in obj.items.all())
-                table_cost = bill.total_amount - Decimal(items_total)
                 # ✅ FIX: Explicitly format it to a plain string first, then use standard {} placeholder
-                amount_str = f"{table_cost:.2f}"
+                amount_str = f"{bill.table_amount:.2f}"
                 return format_html('<b style="font-size: 1.2em;">{} сом</b>', amount_str)
         return "0.00 сом"
 
@@ -262,44 +328,41 @@ class SessionAdmin(admin.ModelAdmin):
 # 4. Bill Admin 
 @admin.register(Bill)
 class BillAdmin(admin.ModelAdmin):
-    list_display = ('id', 'session', 'get_table_cost', 'get_items_cost', 'total_amount')
-    readonly_fields = ('get_details_html', 'total_amount', 'session')
+    list_display = ('id', 'session', 'get_table_cost', 'get_items_cost', 'discount_amount', 'total_amount')
+    readonly_fields = (
+        'get_details_html', 'total_amount', 'session', 'shift',
+        'billed_minutes', 'time_amount', 'discount_amount', 'items_amount',
+    )
+    inlines = [BillLineInline]
+    actions = [export_csv_action('bills')]
 
     def get_table_cost(self, obj):
-        items_total = sum(item.total_price() for item in obj.session.items.all())
-        table_cost = obj.total_amount - Decimal(items_total)
-        return f"{table_cost:.2f} сом"
+        return f"{obj.table_amount:.2f} сом"
     get_table_cost.short_description = "Стоимость стола"
 
     def get_items_cost(self, obj):
-        items_total = sum(item.total_price() for item in obj.session.items.all())
-        return f"{items_total:.2f} сом"
+        return f"{obj.items_amount:.2f} сом"
     get_items_cost.short_description = "Сумма бара"
+    get_items_cost.admin_order_field = 'items_amount'
 
     def get_details_html(self, obj):
         session = obj.session
-        items = session.items.all()
-        items_total = sum(item.total_price() for item in items)
-        table_cost = obj.total_amount - Decimal(items_total)
         local_start = timezone.localtime(session.start_time)
         
         html = f"""
         <div style="background: #fff; padding: 20px; border: 1px solid #ccc; border-radius: 8px; max-width: 500px; font-family: monospace; color: #000;">
             <h3 style="text-align: center; border-bottom: 2px dashed #000; padding-bottom: 10px; color: #000;">ДЕТАЛИЗАЦИЯ СЧЕТА #{obj.id}</h3>
-            <p><b>Ресурс:</b> {session.resource.name}</p>
+            <p><b>Ресурс:</b> {session.resource.name if session.resource else 'БАР'}</p>
             <p><b>Время начала:</b> {local_start.strftime('%H:%M')}</p>
             <hr style="border: 0; border-top: 1px dashed #000;">
             <table style="width: 100%;">
-                <tr>
-                    <td style="padding: 5px 0; color: #000;">Услуга: Время</td>
-                    <td style="text-align: right; color: #000;">{table_cost:.2f} сом</td>
-                </tr>
         """
-        for item in items:
+        for line in obj.lines.all():
+            unit = f"x{line.quantity:.0f}" if line.kind == 'item' else f"{line.quantity:.0f} мин"
             html += f"""
                 <tr>
-                    <td style="padding: 5px 0; color: #000;">{item.product.name} (x{item.quantity})</td>
-                    <td style="text-align: right; color: #000;">{item.total_price():.2f} сом</td>
+                    <td style="padding: 5px 0; color: #000;">{escape(line.description)} ({unit})</td>
+                    <td style="text-align: right; color: #000;">{line.amount:.2f} сом</td>
                 </tr>
             """
         html += f"""
@@ -324,12 +387,17 @@ class ResourceAdmin(admin.ModelAdmin):
 # 6. Product Admin
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'cost_price', 'price', 'stock', 'get_margin', 'get_total_cost_value', 'get_total_sales_value')
-    # list_editable = ('is_active',)
+    list_display = ('name', 'cost_price', 'price', 'stock', 'reorder_level', 'is_favorite', 'get_margin', 'get_total_cost_value', 'get_total_sales_value',
+                    'sales_velocity', 'days_of_stock', 'suggested_order')
+    actions = ['start_bulk_intake', 'print_labels']
+    search_fields = ('name', '=barcode')
+    list_filter = ('is_favorite', 'is_low_stock')
+    list_editable = ('is_favorite',)
     def get_readonly_fields(self, request, obj=None):
+        forecast = ['sales_velocity', 'days_of_stock', 'suggested_order', 'forecast_at']
         if obj: 
-            return ['name', 'stock']
-        return []
+            return ['name', 'stock', 'is_low_stock'] + forecast
+        return ['is_low_stock'] + forecast
 
     def get_margin(self, obj):
         margin = obj.price - (obj.cost_price or 0)
@@ -346,21 +414,40 @@ class ProductAdmin(admin.ModelAdmin):
         return f"{int(total)} сом"
     get_total_sales_value.short_description = "Итого (Продажа)"
 
+    @admin.action(description="Печать этикеток со штрихкодом")
+    def print_labels(self, request, queryset):
+        labels, skipped = label_sheet(queryset.order_by('name'))
+        return TemplateResponse(request, 'admin/core/product/labels.html', {'labels': labels, 'skipped': skipped})
+
+    @admin.action(description="Оформить поставку выбранных товаров")
+    def start_bulk_intake(self, request, queryset):
+        pks = ",".join(str(pk) for pk in queryset.values_list('pk', flat=True))
+        return redirect(f"{reverse('admin:core_stockmovement_bulk_intake')}?products={pks}")
+
     def changelist_view(self, request, extra_context=None):
-        totals = Product.objects.aggregate(
-            all_bar_cost=Sum(F('stock') * F('cost_price')),
-            all_bar_sales=Sum(F('stock') * F('price'))
-        )
+        with reporting():
+            totals = Product.objects.aggregate(
+                all_bar_cost=Sum(F('stock') * F('cost_price')),
+                all_bar_sales=Sum(F('stock') * F('price')),
+                reorder_cost=Sum(F('suggested_order') * F('cost_price')),
+                forecast_at=Max('forecast_at'),
+            )
         cost_total = math.ceil(totals['all_bar_cost'] or 0)
         sales_total = math.ceil(totals['all_bar_sales'] or 0)
         profit_total = sales_total - cost_total
+        reorder_total = math.ceil(totals['reorder_cost'] or 0)
+        forecast_at = (
+            date_format(timezone.localtime(totals['forecast_at']), format="d.m H:i")
+            if totals['forecast_at'] else "нет"
+        )
 
         summary_message = format_html(
             "📊 <b>ОТЧЕТ ПО СКЛАДУ:</b> "
             "Вложено (Закуп): <span style='color: #d9534f; font-weight: bold;'>{} сом</span> | "
             "Выручка (Продажа): <span style='color: #5cb85c; font-weight: bold;'>{} сом</span> | "
-            "Потенциальная прибыль: <span style='color: #0275d8; font-weight: bold;'>{} сом</span>",
-            cost_total, sales_total, profit_total
+            "Потенциальная прибыль: <span style='color: #0275d8; font-weight: bold;'>{} сом</span> | "
+            "К заказу по прогнозу: <span style='font-weight: bold;'>{} сом</span> <small>(прогноз: {})</small>",
+            cost_total, sales_total, profit_total, reorder_total, forecast_at
         )
         storage = messages.get_messages(request)
         for _ in storage: pass 
@@ -368,4 +455,243 @@ class ProductAdmin(admin.ModelAdmin):
 
         extra_context = extra_context or {}
         extra_context['summary_text'] = summary_message
-        return super().changelist_view(request, extra_context=extra_context)
\ No newline at end of file
+        return super().changelist_view(request, extra_context=extra_context)
+
+
+# 7. Cash Ledger Admin
+@admin.register(CashLedgerEntry)
+class CashLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('get_local_created_at', 'shift', 'kind', 'amount', 'bill', 'comment')
+    list_filter = ('kind', 'shift')
+    fields = ('shift', 'kind', 'amount', 'comment')
+
+    def get_local_created_at(self, obj):
+        if obj.created_at:
+            return date_format(timezone.localtime(obj.created_at), format="d E Y г. H:i", use_l10n=True)
+        return "-"
+    get_local_created_at.short_description = "Дата и время"
+    get_local_created_at.admin_order_field = 'created_at'
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj:
+            return [f.name for f in self.model._meta.fields]
+        return self.readonly_fields
+
+    def formfield_for_choice_field(self, db_field, request, **kwargs):
+        # Bill payments are written by the POS itself, staff only book manual movements
+        if db_field.name == 'kind':
+            kwargs['choices'] = [c for c in CashLedgerEntry.KIND_CHOICES if c[0] != 'bill']
+        return super().formfield_for_choice_field(db_field, request, **kwargs)
+
+    def get_changeform_initial_data(self, request):
+        initial = super().get_changeform_initial_data(request)
+        active_shift = get_active_shift()
+        if active_shift:
+            initial.setdefault('shift', active_shift.pk)
+        return initial
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return
+        # Goes through the shift so the running balance moves together with the entry
+        entry = obj.shift.record_cash(obj.kind, obj.amount, comment=obj.comment)
+        obj.pk = entry.pk
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+
+# 8. Archived Bill Admin
+@admin.register(ArchivedBill)
+class ArchivedBillAdmin(admin.ModelAdmin):
+    list_display = ('id', 'get_local_closed_at', 'resource_name', 'mode', 'total_amount', 'shift')
+    list_filter = ('mode',)
+    search_fields = ('=id', '=session_id', 'resource_name')
+    date_hierarchy = 'closed_at'
+    exclude = ('payload',)
+
+    def get_local_closed_at(self, obj):
+        return date_format(timezone.localtime(obj.closed_at), format="d E Y г. H:i", use_l10n=True)
+    get_local_closed_at.short_description = "Закрыто в"
+    get_local_closed_at.admin_order_field = 'closed_at'
+
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields if f.name != 'payload'] + ['get_details_html']
+
+    def get_details_html(self, obj):
+        rows = ""
+        lines = obj.payload.get('lines')
+        if lines is None:
+            # Archived before bills had lines: only the products are known
+            lines = [
+                {
+                    'description': item['product'],
+                    'quantity': item['quantity'],
+                    'amount': Decimal(item['price_at_order'] or 0) * item['quantity'],
+                }
+                for item in obj.payload.get('items', [])
+            ]
+        for line in lines:
+            quantity = Decimal(line['quantity'])
+            unit = f"x{quantity:.0f}" if line.get('kind', 'item') == 'item' else f"{quantity:.0f} мин"
+            rows += f"""
+                <tr>
+                    <td style="padding: 5px 0; color: #000;">{escape(line['description'])} ({unit})</td>
+                    <td style="text-align: right; color: #000;">{Decimal(line['amount']):.2f} сом</td>
+                </tr>"""
+        return mark_safe(f"""
+        <div style="background: #fff; padding: 20px; border: 1px solid #ccc; border-radius: 8px; max-width: 500px; font-family: monospace; color: #000;">
+            <p><b>Открыл:</b> {obj.payload.get('created_by') or '-'}</p>
+            <p><b>Пауз:</b> {len(obj.payload.get('pauses', []))}</p>
+            <table style="width: 100%;">{rows or "<tr><td>Без товаров</td></tr>"}</table>
+            <hr style="border: 0; border-top: 2px solid #000; margin-top: 10px;">
+            <b>ИТОГО: {obj.total_amount} сом</b>
+        </div>
+        """)
+    get_details_html.short_description = "Детализация"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# 9. Stocktake Admin
+class StockCountLineInline(admin.TabularInline):
+    model = StockCountLine
+    extra = 0
+    fields = ('product', 'counted', 'expected', 'get_variance', 'counted_at')
+    readonly_fields = ('expected', 'get_variance', 'counted_at')
+
+    def get_variance(self, obj):
+        if not obj.pk:
+            return "-"
+        color = "green" if obj.variance > 0 else "red" if obj.variance < 0 else "#555"
+        return format_html('<b style="color: {};">{}</b>', color, f"{obj.variance:+d}")
+    get_variance.short_description = "Расхождение"
+
+    def has_add_permission(self, request, obj=None):
+        return obj is None or obj.status == 'open'
+
+    def has_change_permission(self, request, obj=None):
+        return obj is None or obj.status == 'open'
+
+    def has_delete_permission(self, request, obj=None):
+        return obj is None or obj.status == 'open'
+
+
+@admin.register(StockCount)
+class StockCountAdmin(admin.ModelAdmin):
+    form = StockCountForm
+    inlines = [StockCountLineInline]
+    list_display = ('__str__', 'get_local_opened_at', 'status', 'shift', 'comment')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'shift', 'opened_at', 'committed_at', 'get_variance_html')
+    actions = ['commit_counts']
+
+    def get_local_opened_at(self, obj):
+        return date_format(timezone.localtime(obj.opened_at), format="d E Y г. H:i", use_l10n=True)
+    get_local_opened_at.short_description = "Начата"
+    get_local_opened_at.admin_order_field = 'opened_at'
+
+    def get_fields(self, request, obj=None):
+        fields = ['comment', 'status', 'shift', 'opened_at', 'committed_at']
+        if obj:
+            fields.append('get_variance_html')
+        if obj is None or obj.status == 'open':
+            fields.append('entries')
+        return fields
+
+    def get_variance_html(self, obj):
+        v = obj.get_variance()
+        return mark_safe(f"""
+        <div style="background: #fff; padding: 15px; border: 1px solid #ccc; border-radius: 8px; max-width: 400px; color: #000;">
+            <p>Посчитано позиций: <b>{v['lines']}</b>, с расхождением: <b>{v['mismatched']}</b></p>
+            <p style="color: red;">Недостача: <b>{v['shortage']} шт.</b></p>
+            <p style="color: green;">Излишек: <b>+{v['surplus']} шт.</b></p>
+            <hr>
+            <b>Итого по закупу: {v['value']:.2f} сом</b>
+        </div>
+        """)
+    get_variance_html.short_description = "Расхождения"
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.shift = get_active_shift()
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        entries = form.cleaned_data.get('entries')
+        if entries:
+            recorded = record_counts(form.instance, entries)
+            self.message_user(request, f"Записано подсчетов: {recorded}.", messages.SUCCESS)
+
+    @admin.action(description="Провести выбранные инвентаризации")
+    def commit_counts(self, request, queryset):
+        shift = get_active_shift()
+        for count in queryset.filter(status='open'):
+            movement_shift = shift or count.shift
+            if movement_shift is None:
+                self.message_user(request, f"{count}: нет смены для записи движений.", messages.ERROR)
+                continue
+            try:
+                corrected = commit_stock_count(count, movement_shift)
+            except ValidationError as exc:
+                # Committed by someone else since the list was loaded
+                self.message_user(request, f"{count}: {exc.messages[0]}", messages.ERROR)
+                continue
+            self.message_user(request, f"{count} проведена, исправлено товаров: {corrected}.", messages.SUCCESS)
+
+    def has_delete_permission(self, request, obj=None):
+        return obj is None or obj.status == 'open'
+
+
+# 10. Stock Alert Admin
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+    list_display = ('get_local_created_at', 'product', 'stock', 'reorder_level', 'resolved_at')
+    list_filter = (('resolved_at', admin.EmptyFieldListFilter), 'product')
+    date_hierarchy = 'created_at'
+
+    def get_local_created_at(self, obj):
+        return date_format(timezone.localtime(obj.created_at), format="d E Y г. H:i", use_l10n=True)
+    get_local_created_at.short_description = "Дата и время"
+    get_local_created_at.admin_order_field = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# 11. Tariff Admin
+@admin.register(TariffRule)
+class TariffRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'resource_type', 'get_days', 'start_time', 'end_time', 'price_per_hour', 'priority', 'is_active', 'plan')
+    list_filter = ('plan', 'resource_type', 'is_active')
+    list_editable = ('price_per_hour', 'is_active')
+
+    DAY_NAMES = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+    def get_days(self, obj):
+        return ", ".join(self.DAY_NAMES[int(day)] for day in sorted(set(obj.weekdays)))
+    get_days.short_description = "Дни"
+
+
+# 12. Club Admin
+@admin.register(Club)
+class ClubAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'get_database')
+    search_fields = ('code', 'name')
+
+    def get_database(self, obj):
+        return settings.CLUBS.get(obj.code, "—")
+    get_database.short_description = "База данных"
+
+    def get_readonly_fields(self, request, obj=None):
+        # Club rows reference the code, so it is fixed once the club exists
+        return ('code',) if obj else ()
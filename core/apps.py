@@ -4,4 +4,7 @@ from django.utils.translation import gettext_lazy as _
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
-    verbose_name = _("Система управления")
\ No newline at end of file
+    verbose_name = _("Система управления")
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,90 @@
+"""
+Moves old, fully closed shifts out of the hot tables.
+
+Bills (with their lines, sessions, items and pauses) are copied into ArchivedBill
+and deleted; the shift keeps a frozen report so its totals stay intact.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedBill, Bill, Session, Shift
+
+
+def archivable_shifts(older_than_days=None):
+    """Closed shifts that ended more than `older_than_days` ago and have no running tables."""
+    if older_than_days is None:
+        older_than_days = settings.ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Shift.objects.filter(
+        is_active=False,
+        archived_at__isnull=True,
+        end_time__lt=cutoff,
+    ).exclude(sessions__is_active=True).order_by('start_time')
+
+
+def _archived_copy(bill):
+    session = bill.session
+    return ArchivedBill(
+        id=bill.pk,
+        shift_id=bill.shift_id,
+        session_id=session.pk,
+        resource_name=session.resource.name if session.resource else "",
+        mode=session.mode,
+        start_time=session.start_time,
+        end_time=session.end_time,
+        closed_at=bill.closed_at,
+        total_amount=bill.total_amount,
+        payload={
+            'created_by': session.created_by.username if session.created_by else None,
+            'prepaid_minutes': session.prepaid_minutes,
+            'items': [
+                {
+                    'product': item.product.name,
+                    'quantity': item.quantity,
+                    'price_at_order': item.price_at_order,
+                }
+                for item in session.items.all()
+            ],
+            'pauses': [[p.paused_at, p.resumed_at] for p in session.pauses.all()],
+            'billed_minutes': bill.billed_minutes,
+            'charge_overtime': bill.charge_overtime,
+            'time_amount': bill.time_amount,
+            'discount_amount': bill.discount_amount,
+            'items_amount': bill.items_amount,
+            'lines': [
+                {
+                    'kind': line.kind,
+                    'description': line.description,
+                    'quantity': line.quantity,
+                    'unit_price': line.unit_price,
+                    'amount': line.amount,
+                }
+                for line in bill.lines.all()
+            ],
+        },
+    )
+
+
+@transaction.atomic
+def archive_shift(shift):
+    """Archives one shift. Returns the number of bills moved."""
+    shift.report_snapshot = shift.get_report_data()
+
+    bills = list(
+        Bill.objects.filter(shift=shift)
+        .select_related('session__resource', 'session__created_by')
+        .prefetch_related('session__items__product', 'session__pauses', 'lines')
+    )
+    ArchivedBill.objects.bulk_create([_archived_copy(bill) for bill in bills], batch_size=500)
+
+    session_ids = [bill.session_id for bill in bills]
+    Bill.objects.filter(pk__in=[bill.pk for bill in bills]).delete()
+    # Queryset delete: items are already sold, stock must not be returned
+    Session.objects.filter(pk__in=session_ids).delete()
+
+    shift.archived_at = timezone.now()
+    shift.save(update_fields=['report_snapshot', 'archived_at'])
+    return len(bills)
@@ -0,0 +1,218 @@
+"""
+Session pricing shared by single and batch closing.
+
+The functions here work on plain values (timestamps, pause intervals, item
+rows) so a batch can load everything for many sessions with a handful of
+queries and price them in memory. A price is stored as BillLines plus
+subtotals on the Bill; everything that shows a bill reads those.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import tariffs
+from .models import Bill, BillLine, ResourceUsage, Session, SessionItem, SessionPause
+
+PAUSE_CREDIT_MINUTES = 5  # business rule: a pause is free for at most this long
+CENT = Decimal('0.01')
+
+
+def pause_credit(pauses, now):
+    """Free minutes granted for `pauses`, (paused_at, resumed_at) pairs with resumed_at None for a running pause."""
+    credit = 0
+    for paused_at, resumed_at in pauses:
+        duration = ((resumed_at or now) - paused_at).total_seconds() / 60
+        credit += min(duration, PAUSE_CREDIT_MINUTES)
+    return credit
+
+
+def billable_minutes(start, end, pauses, now=None):
+    """Minutes from start to end minus the pause credit."""
+    now = now or timezone.now()
+    total = (end - start).total_seconds() / 60
+    return max(0, total - pause_credit(pauses, now))
+
+
+def _line(kind, description, quantity, unit_price, product_id=None):
+    quantity = Decimal(quantity).quantize(CENT)
+    return BillLine(
+        kind=kind,
+        description=description,
+        product_id=product_id,
+        quantity=quantity,
+        unit_price=unit_price.quantize(Decimal('0.0001')),
+        amount=(quantity * unit_price).quantize(CENT),
+    )
+
+
+def credit_windows(pauses, end):
+    """The free part of each pause, its first PAUSE_CREDIT_MINUTES, as (start, end) intervals."""
+    credit = timedelta(minutes=PAUSE_CREDIT_MINUTES)
+    windows = []
+    for paused_at, resumed_at in pauses:
+        stop = min(resumed_at or end, paused_at + credit, end)
+        if stop > paused_at:
+            windows.append((paused_at, stop))
+    return windows
+
+
+def _time_description(name, prepaid):
+    details = [part for part in ("предоплата" if prepaid else "", name) if part]
+    return f"Время ({', '.join(details)})" if details else "Время"
+
+
+def bill_lines(session, end, pauses, items, charge_overtime=False):
+    """
+    Prices a session that ends at `end` as unsaved BillLines: the table
+    time split by tariff (prepaid time at the amount it was sold for), the
+    pause credit as discounts at the rate it fell under, and one line per
+    product.
+    `items` are (product_id, product_name, quantity, price_at_order) tuples.
+    """
+    lines = []
+    if session.resource:
+        table = tariffs.get_table(session.resource.type)
+        base_rate = session.resource.price_per_hour
+        prepaid = session.mode == 'PREPAID' and not charge_overtime
+        if prepaid and session.prepaid_amount is not None:
+            # Sold at one price when the session started or was extended
+            minutes = Decimal(session.prepaid_minutes or 0)
+            unit_price = session.prepaid_amount / minutes if minutes else Decimal(0)
+            lines.append(_line('time', _time_description('', True), minutes, unit_price))
+            played, credit = [], []
+        elif prepaid:
+            played = [(session.start_time, session.start_time + timedelta(minutes=session.prepaid_minutes or 0))]
+            credit = []
+        else:
+            played = [(session.start_time, end)]
+            credit = credit_windows(pauses, end)
+        for (name, rate), minutes in tariffs.tally(table, played, base_rate).items():
+            lines.append(_line('time', _time_description(name, prepaid), minutes, rate / Decimal(60)))
+        for (name, rate), minutes in tariffs.tally(table, credit, base_rate).items():
+            lines.append(_line('discount', "Пауза (бесплатно)", minutes, -rate / Decimal(60)))
+    for product_id, name, quantity, price in items:
+        lines.append(_line('item', name, quantity, price or Decimal(0), product_id=product_id))
+    for position, line in enumerate(lines):
+        line.position = position
+    return lines
+
+
+def bill_totals(lines):
+    """Bill field values summed from its lines."""
+    totals = {'billed_minutes': Decimal(0), 'time_amount': Decimal(0), 'items_amount': Decimal(0), 'discount_amount': Decimal(0)}
+    for line in lines:
+        if line.kind == 'time':
+            totals['time_amount'] += line.amount
+            totals['billed_minutes'] += line.quantity
+        elif line.kind == 'discount':
+            totals['discount_amount'] -= line.amount
+            totals['billed_minutes'] -= line.quantity
+        else:
+            totals['items_amount'] += line.amount
+    totals['total_amount'] = totals['time_amount'] - totals['discount_amount'] + totals['items_amount']
+    return totals
+
+
+def save_lines(lines_by_bill):
+    """Writes the lines of freshly priced bills, replacing any earlier ones. `lines_by_bill` maps bill pk to lines."""
+    BillLine.objects.filter(bill_id__in=list(lines_by_bill)).delete()
+    rows = []
+    for bill_id, lines in lines_by_bill.items():
+        for line in lines:
+            line.bill_id = bill_id
+            rows.append(line)
+    BillLine.objects.bulk_create(rows)
+
+
+def _item_rows(queryset):
+    return queryset.values_list('product_id', 'product__name', 'quantity', 'price_at_order')
+
+
+def preview_bill(session, now=None):
+    """The bill a running session would get if it ended now, as an unsaved Bill and its lines."""
+    now = now or timezone.now()
+    pauses = list(session.pauses.values_list('paused_at', 'resumed_at'))
+    lines = bill_lines(session, now, pauses, list(_item_rows(session.items.order_by('pk'))))
+    return Bill(session=session, **bill_totals(lines)), lines
+
+
+def close_session(session, drawer_shift, charge_overtime=False):
+    """
+    Ends one session and bills it exactly once. The session is flipped with
+    a conditional UPDATE; its items are read after that, in the same
+    transaction, when no item can be added any more (see views._add_product).
+    Returns the bill, or None when another request closed the session first.
+    """
+    now = timezone.now()
+    pauses = list(session.pauses.values_list('paused_at', 'resumed_at'))
+
+    with transaction.atomic():
+        if not session.finish(now):
+            return None
+        items = list(_item_rows(session.items.order_by('pk')))
+        lines = bill_lines(session, now, pauses, items, charge_overtime)
+        bill, created = Bill.objects.update_or_create(
+            session=session,
+            defaults={**bill_totals(lines), 'shift': drawer_shift, 'charge_overtime': charge_overtime}
+        )
+        save_lines({bill.pk: lines})
+        if created and drawer_shift:
+            drawer_shift.record_cash('bill', bill.total_amount, bill=bill)
+    return bill
+
+
+def close_all_sessions(drawer_shift, charge_overtime=False):
+    """
+    Ends every running session at the same moment and bills them in one
+    transaction: the sessions are locked, open pauses and table usages are
+    ended with one UPDATE each, all sessions are priced in memory and their
+    bills, bill lines and ledger entries are bulk-inserted.
+    Returns the list of new bills.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        sessions = list(
+            Session.objects.select_for_update(of=('self',))
+            .filter(is_active=True)
+            .select_related('resource')
+        )
+        if not sessions:
+            return []
+        ids = [s.pk for s in sessions]
+
+        SessionPause.objects.filter(session_id__in=ids, resumed_at__isnull=True).update(resumed_at=now)
+        Session.objects.filter(pk__in=ids).update(is_active=False, is_paused=False, end_time=now)
+        ResourceUsage.objects.filter(session_id__in=ids, ended_at__isnull=True).update(ended_at=now)
+
+        pauses = defaultdict(list)
+        for session_id, paused_at, resumed_at in SessionPause.objects.filter(session_id__in=ids).values_list(
+            'session_id', 'paused_at', 'resumed_at'
+        ):
+            pauses[session_id].append((paused_at, resumed_at))
+        items = defaultdict(list)
+        for session_id, *item in SessionItem.objects.filter(session_id__in=ids).order_by('pk').values_list(
+            'session_id', 'product_id', 'product__name', 'quantity', 'price_at_order'
+        ):
+            items[session_id].append(item)
+        billed = dict(Bill.objects.filter(session_id__in=ids).values_list('session_id', 'pk'))
+
+        new_bills, lines_by_session = [], {}
+        for session in sessions:
+            session.end_time = now
+            lines = bill_lines(session, now, pauses[session.pk], items[session.pk], charge_overtime)
+            lines_by_session[session.pk] = lines
+            totals = bill_totals(lines)
+            if session.pk in billed:
+                Bill.objects.filter(pk=billed[session.pk]).update(**totals, shift=drawer_shift, charge_overtime=charge_overtime)
+            else:
+                new_bills.append(Bill(session=session, shift=drawer_shift, charge_overtime=charge_overtime, **totals))
+
+        created = Bill.objects.bulk_create(new_bills)
+        billed.update((bill.session_id, bill.pk) for bill in created)
+        save_lines({billed[session_id]: lines for session_id, lines in lines_by_session.items()})
+        if drawer_shift and created:
+            drawer_shift.record_bills(created)
+    return created
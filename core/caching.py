@@ -0,0 +1,111 @@
+"""
+Shared cache for data every POS screen needs.
+
+Backed by settings.CACHES (a file-based cache by default, so all workers
+see the same entries without Redis). Entries are dropped by the model
+signals in core/signals.py whenever the underlying rows change.
+"""
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Product, Resource, Shift
+
+ACTIVE_SHIFT_KEY = 'pos:active_shift'
+RESOURCES_KEY = 'pos:resources'
+CATALOG_KEY = 'pos:catalog'
+TILES_VERSION_KEY = 'pos:tiles_version'
+CATALOG_VERSION_KEY = 'pos:catalog_version'
+TARIFF_VERSION_KEY = 'pos:tariff_version'
+
+# Entries are dropped on change; the timeout only bounds what a missed signal can cost
+CACHE_TIMEOUT = 60 * 60
+
+# Per-process hit/miss counters, keyed by cache key
+stats = Counter()
+
+_MISSING = object()
+
+# This process' barcode -> product id map and the version it was built for
+_barcodes = {'version': None, 'map': {}}
+
+
+def cached(key, build, timeout=CACHE_TIMEOUT):
+    """Returns the cached value for `key`, building and storing it on a miss."""
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        stats[f'{key}:miss'] += 1
+        value = build()
+        cache.set(key, value, timeout)
+    else:
+        stats[f'{key}:hit'] += 1
+    return value
+
+
+def get_active_shift():
+    return cached(ACTIVE_SHIFT_KEY, lambda: Shift.objects.filter(is_active=True).first())
+
+
+def get_resources():
+    return cached(RESOURCES_KEY, lambda: list(Resource.objects.all()))
+
+
+def get_catalog():
+    """Products for the bar menu. Stock is not part of it, so sales don't invalidate it."""
+    return cached(CATALOG_KEY, lambda: list(Product.objects.order_by('name').only('id', 'name', 'price', 'is_favorite')))
+
+
+def get_tiles_version():
+    """Part of every dashboard tile's fragment-cache key; bumped when tables change."""
+    # A fresh value after expiry, so fragments cached under an older version never come back
+    return cached(TILES_VERSION_KEY, time.time_ns)
+
+
+def get_catalog_version():
+    """
+    Changes whenever a product is edited. Per-process indexes built from the
+    catalog (barcodes, search) compare it to know when to rebuild.
+    """
+    return cached(CATALOG_VERSION_KEY, time.time_ns)
+
+
+def get_tariff_version():
+    """Changes whenever a tariff rule is edited; core/tariffs.py recompiles its tables on a change."""
+    return cached(TARIFF_VERSION_KEY, time.time_ns)
+
+
+def get_barcode_map():
+    """Barcode -> product id, held in process memory so a scan costs no query."""
+    version = get_catalog_version()
+    if _barcodes['version'] != version:
+        _barcodes['map'] = dict(Product.objects.exclude(barcode=None).values_list('barcode', 'id'))
+        _barcodes['version'] = version
+    return _barcodes['map']
+
+
+def invalidate_active_shift():
+    """
+    Drops the cached active shift after the current transaction commits.
+    Dropped earlier, a concurrent request could cache the shift as it was
+    before the commit, and the entry would stay until it expires.
+    """
+    transaction.on_commit(lambda: cache.delete(ACTIVE_SHIFT_KEY))
+
+
+def invalidate_resources():
+    cache.delete(RESOURCES_KEY)
+    try:
+        cache.incr(TILES_VERSION_KEY)
+    except ValueError:
+        cache.set(TILES_VERSION_KEY, time.time_ns(), CACHE_TIMEOUT)
+
+
+def invalidate_catalog():
+    cache.delete(CATALOG_KEY)
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), CACHE_TIMEOUT)
+
+
+def invalidate_tariffs():
+    cache.set(TARIFF_VERSION_KEY, time.time_ns(), CACHE_TIMEOUT)
@@ -0,0 +1,67 @@
+"""
+Club (tenant) context and database routing.
+
+Every club keeps its data in its own database alias (settings.CLUBS); the
+club this deployment runs is 'default'. Code that works on another club
+wraps itself in using_club(code): ClubRouter then sends every core query
+to that club's database. The current club is thread-local, so the parallel
+fan-out in core/consolidated.py can serve one club per worker thread.
+
+using_club() is for reading. The POS code opens its transactions on
+'default', so every club's tills run their own deployment and write there.
+
+Nothing here touches the models, so models.py can use current_club_code
+as a field default.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def current_club_code():
+    """Club of the running code: the one selected with using_club(), else this deployment's."""
+    return getattr(_state, 'club', None) or settings.CLUB_CODE
+
+
+def club_database(code):
+    return settings.CLUBS[code]
+
+
+@contextmanager
+def using_club(code):
+    """Routes the core queries of this thread to `code`'s database for the duration of the block."""
+    club_database(code)  # unknown codes fail here, not on the first query
+    previous = getattr(_state, 'club', None)
+    _state.club = code
+    try:
+        yield
+    finally:
+        _state.club = previous
+
+
+class ClubRouter:
+    """
+    Sends core models to the selected club's database. Outside using_club()
+    it has no opinion and Django uses 'default'. Auth, sessions and admin
+    stay where they are: reports join users inside the club's own database.
+    """
+
+    def _database(self, model):
+        code = getattr(_state, 'club', None)
+        if code is None or model._meta.app_label != 'core':
+            return None
+        return club_database(code)
+
+    def db_for_read(self, model, **hints):
+        return self._database(model)
+
+    def db_for_write(self, model, **hints):
+        return self._database(model)
+
+
+def clubs_context(request):
+    """Template context processor: lets the menu offer the network report when there is more than one club."""
+    return {'multiple_clubs': len(settings.CLUBS) > 1}
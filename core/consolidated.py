@@ -0,0 +1,82 @@
+"""
+Head-office reporting across clubs.
+
+for_each_club() runs one function per club in a thread pool; each worker
+selects its club with using_club(), so its queries go to that club's
+database over the worker's own connection, and the clubs are read in
+parallel instead of one after another. The per-club results are then
+merged in Python.
+
+Functions run this way must query the models directly: the shared cache
+(core/caching.py) belongs to this deployment's own club.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Sum
+
+from . import slowlog
+from .clubs import club_database, using_club
+from .models import Bill, Club, Session, Shift
+
+SUMMARY_FIELDS = ('bills', 'revenue', 'table', 'bar', 'discount', 'active_sessions')
+
+
+def for_each_club(func, clubs=None):
+    """Runs func(code) for every club (default: all of settings.CLUBS) in parallel. Returns {code: result}."""
+    clubs = list(clubs or settings.CLUBS)
+    view = slowlog.current_view()
+
+    def run(code):
+        slowlog.set_view(view)
+        with using_club(code), slowlog.watch([club_database(code)]):
+            try:
+                return func(code)
+            finally:
+                connections.close_all()  # the worker thread's own connections
+                slowlog.clear_view()
+
+    with ThreadPoolExecutor(max_workers=len(clubs)) as pool:
+        return dict(zip(clubs, pool.map(run, clubs)))
+
+
+def club_summary(code, start, end):
+    """Totals of the bills closed in [start, end) in the current club's database."""
+    totals = Bill.objects.filter(closed_at__gte=start, closed_at__lt=end).aggregate(
+        bills=Count('pk'),
+        revenue=Sum('total_amount'),
+        time=Sum('time_amount'),
+        bar=Sum('items_amount'),
+        discount=Sum('discount_amount'),
+    )
+    club = Club.objects.filter(code=code).first()
+    active_shift = Shift.objects.filter(is_active=True).select_related('user').first()
+    return {
+        'code': code,
+        'name': club.name if club else code,
+        'bills': totals['bills'],
+        'revenue': totals['revenue'] or Decimal(0),
+        'table': (totals['time'] or Decimal(0)) - (totals['discount'] or Decimal(0)),
+        'bar': totals['bar'] or Decimal(0),
+        'discount': totals['discount'] or Decimal(0),
+        'active_sessions': Session.objects.filter(is_active=True).count(),
+        'shift_user': active_shift.user.username if active_shift else None,
+    }
+
+
+def network_summary(start, end):
+    """
+    club_summary() of every club plus their sum. A club whose database
+    cannot be reached is reported with its error instead of failing the page.
+    """
+    def summary(code):
+        try:
+            return club_summary(code, start, end)
+        except Exception as exc:
+            return {'code': code, 'name': code, 'error': str(exc)}
+
+    clubs = sorted(for_each_club(summary).values(), key=lambda row: row['name'])
+    total = {field: sum(row[field] for row in clubs if 'error' not in row) for field in SUMMARY_FIELDS}
+    return clubs, total
@@ -0,0 +1,118 @@
+"""
+Streaming CSV exports for accounting.
+
+Rows are read with QuerySet.iterator() straight from values_list(), so no
+model instances are built and memory stays flat no matter how many rows
+the range contains. The response starts downloading with the first chunk.
+The rows come from the read replica when one is usable (core/replica.py).
+"""
+import csv
+
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Bill, BillLine, SessionItem, Shift, StockMovement
+from .replica import reporting_queryset
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """csv.writer target that hands each line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def _bills():
+    qs = Bill.objects.order_by('closed_at').values_list(
+        'id', 'closed_at', 'shift_id', 'session_id',
+        'session__resource__name', 'session__mode', 'billed_minutes',
+        'time_amount', 'discount_amount', 'items_amount', 'total_amount'
+    )
+    header = ['ID', 'Закрыто', 'Смена', 'Сессия', 'Стол', 'Режим', 'Минут', 'Время', 'Скидка', 'Бар', 'Сумма']
+    return qs, header, 'closed_at'
+
+
+def _session_items():
+    qs = SessionItem.objects.order_by('session__bill__closed_at', 'id').values_list(
+        'id', 'session__bill__closed_at', 'session_id', 'session__bill__shift_id',
+        'product__name', 'quantity', 'price_at_order'
+    ).annotate(total=F('quantity') * F('price_at_order'))
+    header = ['ID', 'Закрыто', 'Сессия', 'Смена', 'Товар', 'Кол-во', 'Цена', 'Итого']
+    return qs, header, 'session__bill__closed_at'
+
+
+def _bill_lines():
+    qs = BillLine.objects.order_by('bill__closed_at', 'bill_id', 'position').values_list(
+        'bill_id', 'bill__closed_at', 'bill__shift_id', 'kind', 'description',
+        'quantity', 'unit_price', 'amount'
+    )
+    header = ['Счет', 'Закрыто', 'Смена', 'Тип', 'Описание', 'Кол-во', 'Цена', 'Сумма']
+    return qs, header, 'bill__closed_at'
+
+
+def _shifts():
+    qs = Shift.objects.order_by('start_time').values_list(
+        'id', 'user__username', 'start_time', 'end_time',
+        'start_cash', 'cash_balance', 'end_cash', 'is_active'
+    )
+    header = ['ID', 'Сотрудник', 'Начало', 'Конец', 'Касса (старт)', 'Движение', 'Касса (итог)', 'Активна']
+    return qs, header, 'start_time'
+
+
+def _stock_movements():
+    qs = StockMovement.objects.order_by('timestamp').values_list(
+        'id', 'timestamp', 'product__name', 'type', 'quantity', 'shift_id', 'comment'
+    )
+    header = ['ID', 'Дата и время', 'Товар', 'Тип', 'Количество', 'Смена', 'Комментарий']
+    return qs, header, 'timestamp'
+
+
+DATASETS = {
+    'bills': _bills,
+    'bill_lines': _bill_lines,
+    'session_items': _session_items,
+    'shifts': _shifts,
+    'stock_movements': _stock_movements,
+}
+
+
+def _format(value):
+    if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if value is None:
+        return ''
+    return value
+
+
+def _rows(header, queryset):
+    writer = csv.writer(Echo())
+    # BOM so Excel opens the Cyrillic headers correctly
+    yield '\ufeff' + writer.writerow(header)
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow([_format(value) for value in row])
+
+
+def export_queryset(dataset, start=None, end=None, pks=None, filter_field=None):
+    """
+    Returns the dataset's (queryset, header), optionally limited to a
+    [start, end) range on its date field or to a set of primary keys.
+    `filter_field` lets admin actions select by a related key instead of pk.
+    """
+    queryset, header, date_field = DATASETS[dataset]()
+    if start is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+    if pks is not None:
+        queryset = queryset.filter(**{f'{filter_field or "pk"}__in': pks})
+    return queryset, header
+
+
+def csv_response(filename, queryset, header):
+    # Rows are read while the response streams, after the view has returned
+    response = StreamingHttpResponse(_rows(header, reporting_queryset(queryset)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
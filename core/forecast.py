@@ -0,0 +1,137 @@
+"""
+Sales velocity and reorder forecasting.
+
+Sales history is read with one grouped query (product, day, units) and laid
+out as a products x days matrix, so velocity, weekday seasonality and the
+stock projection are computed for the whole catalog with NumPy array
+operations. Results are stored on Product by `manage.py refresh_forecast`,
+which is meant to run nightly.
+
+A product whose stock is not recorded (None) still gets its velocity, but
+no days-of-stock and no suggested order: an unknown stock is not an empty
+shelf, and ordering as if it were would overstock it.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Product, SessionItem
+
+HISTORY_DAYS = 56      # eight weeks give every weekday eight samples
+VELOCITY_DAYS = 28     # rolling window for the daily velocity
+LEAD_DAYS = 3          # from placing an order to the delivery
+COVER_DAYS = 7         # the delivery should last this long
+PROJECTION_DAYS = 365  # days-of-stock beyond this is reported as "no end"
+MIN_UNITS_FOR_SEASONALITY = 20  # below this a product uses the catalog-wide weekday profile
+
+
+def sales_matrix(today, days=HISTORY_DAYS):
+    """
+    Returns (product_ids, stock, reorder_level, sales) where sales[i, d] are
+    the units of product_ids[i] sold on day d, the last column being
+    yesterday. Sales count on the local date their session started.
+    An unrecorded stock is NaN.
+    """
+    start = today - timedelta(days=days)
+    products = np.array(
+        list(Product.objects.order_by('pk').values_list('pk', 'stock', 'reorder_level')),
+        dtype=float,
+    ).reshape(-1, 3)
+    product_ids = products[:, 0].astype(np.int64)
+    stock = products[:, 1]
+    reorder_level = np.nan_to_num(products[:, 2])
+
+    rows = list(
+        SessionItem.objects
+        .annotate(day=TruncDate('session__start_time', tzinfo=timezone.get_current_timezone()))
+        .filter(day__gte=start, day__lt=today)
+        .values('product_id', 'day')
+        .annotate(units=Sum('quantity'))
+        .values_list('product_id', 'day', 'units')
+    )
+    sales = np.zeros((len(product_ids), days))
+    if rows:
+        ids, dates, units = zip(*rows)
+        rows_idx = np.searchsorted(product_ids, np.array(ids, dtype=np.int64))
+        day_idx = (np.array(dates, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(int)
+        np.add.at(sales, (rows_idx, day_idx), np.array(units, dtype=float))
+    return product_ids, stock, reorder_level, sales
+
+
+def weekday_factors(sales, first_day):
+    """
+    Per-product demand multiplier for each weekday (Mon=0), 1.0 meaning an
+    average day. Products with little history get the catalog-wide profile.
+    """
+    weekdays = (np.arange(sales.shape[1]) + first_day.weekday()) % 7
+    onehot = np.eye(7)[weekdays]                       # days x 7
+    per_weekday = sales @ onehot / onehot.sum(axis=0)  # mean units per weekday
+    daily_mean = sales.mean(axis=1, keepdims=True)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        own = np.where(daily_mean > 0, per_weekday / daily_mean, 1.0)
+        catalog = per_weekday.sum(axis=0) / per_weekday.sum(axis=0).mean()
+    catalog = np.nan_to_num(catalog, nan=1.0)
+
+    enough = sales.sum(axis=1, keepdims=True) >= MIN_UNITS_FOR_SEASONALITY
+    return np.where(enough, own, catalog)
+
+
+def forecast(today=None):
+    """
+    Forecast for every product as a dict of arrays: product_ids, velocity
+    (units/day), days_left (NaN when stock outlasts PROJECTION_DAYS) and
+    suggested order quantities. Both of the latter are NaN for a product
+    without a recorded stock.
+    """
+    today = today or timezone.localdate()
+    product_ids, stock, reorder_level, sales = sales_matrix(today)
+    first_day = today - timedelta(days=sales.shape[1])
+
+    velocity = sales[:, -VELOCITY_DAYS:].mean(axis=1)
+    factors = weekday_factors(sales, first_day)
+
+    # Expected units for each of the coming days, today first
+    upcoming = (np.arange(PROJECTION_DAYS) + today.weekday()) % 7
+    demand = velocity[:, None] * factors[:, upcoming]
+
+    cumulative = np.cumsum(demand, axis=1)
+    runs_out = cumulative >= stock[:, None]  # never true for a NaN stock
+    days_left = np.where(runs_out.any(axis=1), runs_out.argmax(axis=1), np.nan)
+
+    # Enough for the lead time plus the cover period, on top of the threshold
+    needed = cumulative[:, LEAD_DAYS + COVER_DAYS - 1] + reorder_level
+    suggested = np.ceil(np.maximum(needed - stock, 0))  # np.maximum keeps NaN
+
+    return {
+        'product_ids': product_ids,
+        'velocity': velocity,
+        'days_left': days_left,
+        'suggested': suggested,
+    }
+
+
+def refresh_forecast(today=None):
+    """Stores the forecast on the products. Returns the number updated."""
+    result = forecast(today)
+    now = timezone.now()
+    products = Product.objects.in_bulk(result['product_ids'].tolist())
+    changed = []
+    for pk, velocity, days_left, suggested in zip(
+        result['product_ids'].tolist(), result['velocity'].tolist(),
+        result['days_left'].tolist(), result['suggested'].tolist(),
+    ):
+        product = products[pk]
+        product.sales_velocity = round(velocity, 2)
+        product.days_of_stock = None if math.isnan(days_left) else int(days_left)
+        product.suggested_order = None if math.isnan(suggested) else int(suggested)
+        product.forecast_at = now
+        changed.append(product)
+    Product.objects.bulk_update(
+        changed, ['sales_velocity', 'days_of_stock', 'suggested_order', 'forecast_at'], batch_size=500
+    )
+    return len(changed)
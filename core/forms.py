@@ -0,0 +1,58 @@
+from django import forms
+from django.utils.translation import gettext_lazy as _
+
+from .stock import BULK_TYPES, parse_intake_text, resolve_rows
+from .models import StockMovement, StockCount
+
+
+class BulkIntakeForm(forms.Form):
+    type = forms.ChoiceField(
+        choices=[c for c in StockMovement.MOVEMENT_TYPE if c[0] in BULK_TYPES],
+        initial='addition',
+        label=_("Тип движения")
+    )
+    csv_file = forms.FileField(
+        required=False,
+        label=_("CSV файл"),
+        help_text=_("Колонки: товар (название, штрихкод или ID); количество; комментарий")
+    )
+    rows = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 15, 'cols': 60}),
+        label=_("Строки"),
+        help_text=_("По одной позиции в строке: Название;Количество;Комментарий")
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        upload = cleaned.get('csv_file')
+        if upload:
+            try:
+                text = upload.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise forms.ValidationError(_("CSV файл должен быть в кодировке UTF-8."))
+        else:
+            text = cleaned.get('rows') or ''
+        cleaned['parsed_rows'] = parse_intake_text(text)
+        if not cleaned['parsed_rows']:
+            raise forms.ValidationError(_("Загрузите CSV файл или заполните строки."))
+        return cleaned
+
+
+class StockCountForm(forms.ModelForm):
+    entries = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 10, 'cols': 60}),
+        label=_("Добавить подсчет"),
+        help_text=_("По одной позиции в строке: Название или штрихкод;Количество. Повторный подсчет заменяет прежний.")
+    )
+
+    class Meta:
+        model = StockCount
+        fields = ('comment',)
+
+    def clean_entries(self):
+        rows = parse_intake_text(self.cleaned_data.get('entries') or '')
+        if not rows:
+            return []
+        return resolve_rows(rows, allow_zero=True)
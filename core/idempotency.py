@@ -0,0 +1,83 @@
+"""
+Idempotency keys for POS mutations.
+
+Forms carry a random key ({% idempotency_key %}), fetch() calls send it as
+an Idempotency-Key header. The first request with a key claims it by
+inserting an IdempotencyKey row and runs the view in the same transaction,
+so the claim, the view's writes and the stored response commit together.
+A repeat of the same key (a double tap, a retried request) fails the unique
+index, waiting on the database while the first one is still running, and
+gets the stored response back without running the view. Keys expire after
+KEY_TTL seconds.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_FIELD = 'idempotency_key'
+KEY_HEADER = 'Idempotency-Key'
+KEY_TTL = 10 * 60
+
+_KEPT_HEADERS = ('Content-Type', 'Location')
+
+
+def _digest(request, key):
+    return hashlib.sha256(f"{request.user.pk}:{request.path}:{key}".encode()).hexdigest()
+
+
+def _thaw(stored):
+    response = HttpResponse(bytes(stored.content), status=stored.status)
+    for header, value in stored.headers.items():
+        response[header] = value
+    response['Idempotent-Replay'] = 'true'
+    return response
+
+
+def _claim(digest):
+    """Inserts the key's row; False if another request holds it. Expired keys are dropped first."""
+    now = timezone.now()
+    IdempotencyKey.objects.filter(expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key=digest, expires_at=now + timedelta(seconds=KEY_TTL))
+    except IntegrityError:
+        return False
+    return True
+
+
+def idempotent(view):
+    """Runs `view` at most once per idempotency key; requests without a key run as usual."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.POST.get(KEY_FIELD) or request.headers.get(KEY_HEADER)
+        if request.method != 'POST' or not key:
+            return view(request, *args, **kwargs)
+
+        digest = _digest(request, key)
+        with transaction.atomic():
+            if not _claim(digest):
+                stored = IdempotencyKey.objects.filter(key=digest).first()
+                if stored is not None and stored.status is not None:
+                    return _thaw(stored)
+                # The holder gave the key back (an error response) meanwhile: claim it for this one
+                if stored is not None or not _claim(digest):
+                    return HttpResponse("Запрос уже выполняется", status=409)
+
+            # An exception rolls the claim back with the view's writes
+            response = view(request, *args, **kwargs)
+            if response.status_code >= 500 or getattr(response, 'streaming', False):
+                IdempotencyKey.objects.filter(key=digest).delete()
+            else:
+                IdempotencyKey.objects.filter(key=digest).update(
+                    status=response.status_code,
+                    content=response.content,
+                    headers={h: response[h] for h in _KEPT_HEADERS if response.has_header(h)},
+                )
+        return response
+    return wrapper
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.archive import archivable_shifts, archive_shift
+
+
+class Command(BaseCommand):
+    help = "Moves bills and sessions of old closed shifts into the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive shifts that ended more than this many days ago (default: ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the shifts that would be archived")
+
+    def handle(self, *args, days=None, dry_run=False, **options):
+        shifts = archivable_shifts(days)
+        total = 0
+        for shift in shifts:
+            if dry_run:
+                self.stdout.write(f"{shift} — {shift.bills.count()} счетов")
+                continue
+            moved = archive_shift(shift)
+            total += moved
+            self.stdout.write(f"{shift}: {moved} счетов в архиве")
+
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(f"Готово, перенесено счетов: {total}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.forecast import refresh_forecast
+
+
+class Command(BaseCommand):
+    help = "Recomputes sales velocity, days of stock left and suggested orders for all products (run nightly)"
+
+    def handle(self, *args, **options):
+        updated = refresh_forecast()
+        self.stdout.write(self.style.SUCCESS(f"Прогноз обновлен, товаров: {updated}"))
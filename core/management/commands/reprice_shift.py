@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Shift
+from core.tariffs import reprice_shift
+
+
+class Command(BaseCommand):
+    help = "Shows what a shift's table sessions would cost under the current tariffs (bills are not changed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('shift_id', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            shift = Shift.objects.get(pk=options['shift_id'])
+        except Shift.DoesNotExist:
+            raise CommandError(f"Смена #{options['shift_id']} не найдена")
+
+        billed = repriced = 0
+        for bill, new_total in reprice_shift(shift):
+            billed += bill.total_amount
+            repriced += new_total
+            if new_total != bill.total_amount:
+                self.stdout.write(f"Счет #{bill.pk} ({bill.session.resource.name}): {bill.total_amount} -> {new_total}")
+        self.stdout.write(self.style.SUCCESS(f"Выставлено: {billed} сом, по текущим тарифам: {repriced} сом"))
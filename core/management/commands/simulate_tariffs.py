@@ -0,0 +1,48 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import TariffRule
+from core.simulation import simulate
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-prices past table sessions under draft tariff plans (TariffRule.plan) "
+        "and compares the revenue by table and by start hour"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="YYYY-MM-DD, by default 90 days ago")
+        parser.add_argument('--to', dest='date_to', help="YYYY-MM-DD, inclusive, by default today")
+        parser.add_argument('--plan', dest='plans', action='append', default=[], help="Plan name, can be repeated")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            date_from = datetime.strptime(options['date_from'], '%Y-%m-%d').date() if options['date_from'] else today - timedelta(days=90)
+            date_to = datetime.strptime(options['date_to'], '%Y-%m-%d').date() if options['date_to'] else today
+        except ValueError:
+            raise CommandError("Даты указываются в формате ГГГГ-ММ-ДД")
+        plans = options['plans'] or sorted(set(TariffRule.objects.exclude(plan='').values_list('plan', flat=True)))
+        if not plans:
+            raise CommandError("Нет черновых тарифных планов: задайте поле «План» у тарифов")
+
+        start = timezone.make_aware(datetime.combine(date_from, time.min))
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        result = simulate(start, end, plans)
+
+        titles = ['Выставлено', 'Текущие тарифы', *plans]
+        self.stdout.write(f"Сессий: {result['sessions']} ({date_from} — {date_to})")
+        for heading, rows in (("Столы", result['resources']), ("Час начала", result['hours'])):
+            self.stdout.write("")
+            self.stdout.write(self._row(heading, titles))
+            for label, values in rows:
+                self.stdout.write(self._row(label, [values[column] for column in result['plans']]))
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(self._row("ИТОГО", [result['totals'][column] for column in result['plans']])))
+
+    @staticmethod
+    def _row(label, values):
+        return f"{label:<16}" + "".join(f"{value:>16}" if isinstance(value, str) else f"{value:>16.2f}" for value in values)
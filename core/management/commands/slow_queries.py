@@ -0,0 +1,57 @@
+import glob
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slowlog import fingerprint
+
+
+class Command(BaseCommand):
+    help = "Summarises the slow-query log by statement fingerprint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(settings.SLOW_QUERY_LOG),
+                            help="Log file; rotated copies (.1, .2, ...) are read too")
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--sort', choices=['total', 'count', 'max'], default='total')
+
+    def handle(self, *args, file, top, sort, **options):
+        groups = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0, 'views': set(), 'example': None})
+
+        for path in sorted(glob.glob(file + '*')):
+            with open(path, encoding='utf-8') as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    group = groups[fingerprint(record['sql'])]
+                    group['count'] += 1
+                    group['total'] += record['ms']
+                    if record['ms'] >= group['max']:
+                        group['max'] = record['ms']
+                        group['example'] = record
+                    if record.get('view'):
+                        group['views'].add(record['view'])
+
+        if not groups:
+            self.stdout.write("Медленных запросов нет.")
+            return
+
+        ranked = sorted(groups.items(), key=lambda item: item[1][sort], reverse=True)[:top]
+        for fp, group in ranked:
+            example = group['example']
+            self.stdout.write(self.style.WARNING(
+                f"{group['count']:>6}x  всего {group['total']:.0f} мс  "
+                f"сред. {group['total'] / group['count']:.1f} мс  макс. {group['max']:.1f} мс"
+            ))
+            self.stdout.write(f"  {fp[:300]}")
+            if group['views']:
+                self.stdout.write(f"  views: {', '.join(sorted(group['views']))}")
+            if example.get('frame'):
+                self.stdout.write(f"  frame: {example['frame']}")
+            if example.get('plan'):
+                self.stdout.write("  plan:\n    " + str(example['plan']).replace("\n", "\n    "))
+            self.stdout.write("")
@@ -0,0 +1,192 @@
+"""
+Prometheus metrics without extra dependencies.
+
+Every worker process keeps its own counters and histograms in memory and
+periodically writes a snapshot of them into the shared cache under an id
+made for each process start. /metrics renders every snapshot as its own
+series, labelled process="<id>", along with process_start_time_seconds, so
+a restarted worker is a new series instead of a drop in a summed one and
+rate() stays right (sum it over `process` in queries). Gauges read from the
+database at scrape time are appended, all in the Prometheus text format.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.utils import timezone
+
+FLUSH_INTERVAL = 5  # seconds between snapshots of one process
+PROCESS_TTL = 24 * 3600  # snapshots of processes that stopped flushing expire
+PROCS_KEY = 'metrics:procs'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HELP = {
+    'pos_requests_total': ('counter', "HTTP requests by view and status class"),
+    'pos_request_duration_seconds': ('histogram', "Request latency by view"),
+    'pos_db_queries_total': ('counter', "SQL statements executed, by view"),
+    'pos_print_jobs_total': ('counter', "Receipt print jobs by outcome"),
+    'pos_print_jobs_in_flight': ('gauge', "Receipts currently being sent to the printer"),
+    'pos_stock_conflicts_total': ('counter', "Stock changes refused because the stock did not allow them"),
+    'pos_cache_requests_total': ('counter', "Shared cache lookups by key and result"),
+    'pos_active_sessions': ('gauge', "Running sessions by mode"),
+    'pos_overtime_prepaid_tables': ('gauge', "Prepaid tables whose time is over"),
+    'process_start_time_seconds': ('gauge', "Start time of the worker process, seconds since the epoch"),
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_last_flush = 0.0
+
+# Who this process is; made again after a fork, since pids get reused
+_process = {'pid': None, 'id': None, 'started_at': None}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            # one slot per bucket, then sum and count
+            hist = _histograms[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def _proc_key(process_id):
+    return f'metrics:proc:{process_id}'
+
+
+def _identity():
+    pid = os.getpid()
+    if _process['pid'] != pid:
+        _process.update(pid=pid, id=f'{pid}-{uuid.uuid4().hex[:8]}', started_at=time.time())
+    return _process
+
+
+def flush(force=False):
+    """Publishes this process' snapshot into the shared cache (at most every FLUSH_INTERVAL)."""
+    global _last_flush
+    now = time.time()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+
+    from .caching import stats
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(hist) for key, hist in _histograms.items()}
+    for stat, hits in stats.items():
+        cache_key, result = stat.rsplit(':', 1)
+        counters[_key('pos_cache_requests_total', {'key': cache_key, 'result': result})] = hits
+
+    process = _identity()
+    snapshot = {'started_at': process['started_at'], 'counters': counters, 'histograms': histograms}
+    cache.set(_proc_key(process['id']), snapshot, PROCESS_TTL)
+
+    # The process registry is read-modify-write; a lost update is repaired by the next flush
+    procs = cache.get(PROCS_KEY) or {}
+    procs = {p: seen for p, seen in procs.items() if now - seen < PROCESS_TTL}
+    procs[process['id']] = now
+    cache.set(PROCS_KEY, procs, None)
+
+
+def _with_process(key, process_id):
+    name, labels = key
+    return name, tuple(sorted(labels + (('process', process_id),)))
+
+
+def _collect_processes():
+    """Series of every process that flushed within PROCESS_TTL, each labelled with its process."""
+    procs = cache.get(PROCS_KEY) or {}
+    snapshots = cache.get_many([_proc_key(process_id) for process_id in procs])
+    counters = {}
+    histograms = {}
+    for process_id in procs:
+        snapshot = snapshots.get(_proc_key(process_id))
+        if snapshot is None:
+            continue
+        counters[_key('process_start_time_seconds', {'process': process_id})] = snapshot['started_at']
+        for key, value in snapshot['counters'].items():
+            counters[_with_process(key, process_id)] = value
+        for key, hist in snapshot['histograms'].items():
+            histograms[_with_process(key, process_id)] = hist
+    return counters, histograms
+
+
+def _business_gauges():
+    from .models import Session
+
+    gauges = {}
+    for mode, _label in Session.MODE_CHOICES:
+        gauges[_key('pos_active_sessions', {'mode': mode})] = 0
+
+    now = timezone.now()
+    overtime = 0
+    running = Session.objects.filter(is_active=True).values_list('mode', 'start_time', 'prepaid_minutes')
+    for mode, start_time, prepaid_minutes in running:
+        gauges[_key('pos_active_sessions', {'mode': mode})] += 1
+        if mode == 'PREPAID' and prepaid_minutes and now > start_time + timezone.timedelta(minutes=prepaid_minutes):
+            overtime += 1
+    gauges[_key('pos_overtime_prepaid_tables', {})] = overtime
+    return gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(pairs, extra=()):
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render():
+    """All metrics of all processes in the Prometheus text exposition format."""
+    flush(force=True)
+    counters, histograms = _collect_processes()
+    counters.update(_business_gauges())
+
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append((labels, value))
+    for (name, labels), hist in histograms.items():
+        by_name[name].append((labels, hist))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind == 'histogram':
+                for bound, count in zip(LATENCY_BUCKETS, value):
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {count}')
+                lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {value[-1]}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
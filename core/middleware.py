@@ -0,0 +1,168 @@
+"""
+Request profiling and metrics.
+
+ProfilingMiddleware: a sampled request gets its wall time, SQL count/time,
+template render time and slowest statements recorded. They are sent back as
+a Server-Timing header and kept in a bounded in-process ring buffer shown on
+/perf/. With PERF_SAMPLE_RATE = 0 it only does one comparison per request.
+
+MetricsMiddleware: always-on latency and query counters for /metrics; it
+also tells the slow-query log which view is running.
+"""
+import heapq
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import Template as DjangoTemplate
+
+from . import metrics, slowlog
+
+SLOWEST_KEPT = 5
+
+_local = threading.local()
+
+# Most recent sampled requests of this worker process, newest last
+recent = deque(maxlen=getattr(settings, 'PERF_BUFFER_SIZE', 200))
+
+
+def current_profile():
+    return getattr(_local, 'profile', None)
+
+
+class RequestProfile:
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.total_ms = 0.0
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.slowest = []  # min-heap of (ms, sql)
+        self.view = None
+        self.status = None
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.sql_count += 1
+            self.sql_ms += ms
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, (ms, sql))
+            elif ms > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (ms, sql))
+
+    def finish(self, request, response):
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+        self.status = response.status_code
+        match = getattr(request, 'resolver_match', None)
+        self.view = match.view_name if match else None
+
+    def server_timing(self):
+        return ", ".join([
+            f"total;dur={self.total_ms:.1f}",
+            f'db;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"',
+            f"tpl;dur={self.template_ms:.1f}",
+        ])
+
+    def as_dict(self):
+        return {
+            'started_at': self.started_at,
+            'method': self.method,
+            'path': self.path,
+            'view': self.view,
+            'status': self.status,
+            'total_ms': round(self.total_ms, 1),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_ms, 1),
+            'template_ms': round(self.template_ms, 1),
+            'slowest': [
+                {'ms': round(ms, 2), 'sql': sql}
+                for ms, sql in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+def _patch_template_render():
+    """Times top-level template renders (render(), render_to_string()) of profiled requests."""
+    if getattr(DjangoTemplate.render, '_profiled', False):
+        return
+    original = DjangoTemplate.render
+
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        if profile is None:
+            return original(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            profile.template_ms += (time.perf_counter() - start) * 1000
+
+    render._profiled = True
+    DjangoTemplate.render = render
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0)
+        if self.sample_rate:
+            _patch_template_render()
+
+    def __call__(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile(request)
+        _local.profile = profile
+        try:
+            with connection.execute_wrapper(profile.sql_wrapper):
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+
+        profile.finish(request, response)
+        response['Server-Timing'] = profile.server_timing()
+        recent.append(profile.as_dict())
+        return response
+
+
+class MetricsMiddleware:
+    """Feeds request latency and SQL counts per URL name into core.metrics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count), slowlog.watch():
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        metrics.observe('pos_request_duration_seconds', elapsed, view=view)
+        metrics.inc('pos_requests_total', view=view, status=f'{response.status_code // 100}xx')
+        metrics.inc('pos_db_queries_total', queries[0], view=view)
+        metrics.flush()
+        slowlog.clear_view()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Lets slow queries logged during this request name their view
+        slowlog.set_view(request.resolver_match.view_name)
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.5 on 2026-10-19 13:54
+
+from django.db import migrations, models
+
+
+def backfill_usages(apps, schema_editor):
+    """One usage segment per historical session that had a table."""
+    Session = apps.get_model('core', 'Session')
+    ResourceUsage = apps.get_model('core', 'ResourceUsage')
+
+    sessions = Session.objects.filter(resource__isnull=False, usages__isnull=True)
+    batch = []
+    for session in sessions.iterator(chunk_size=2000):
+        batch.append(ResourceUsage(
+            session_id=session.pk,
+            resource_id=session.resource_id,
+            started_at=session.start_time,
+            ended_at=session.end_time,
+        ))
+        if len(batch) >= 2000:
+            ResourceUsage.objects.bulk_create(batch)
+            batch = []
+    ResourceUsage.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_sessionitem_is_active'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='resourceusage',
+            options={'verbose_name': 'Использование стола', 'verbose_name_plural': 'Использование столов'},
+        ),
+        migrations.AddIndex(
+            model_name='resourceusage',
+            index=models.Index(fields=['resource', 'started_at'], name='usage_resource_start_idx'),
+        ),
+        migrations.RunPython(backfill_usages, migrations.RunPython.noop),
+    ]
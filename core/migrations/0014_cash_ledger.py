@@ -0,0 +1,69 @@
+# Generated by Django 6.0.5 on 2026-10-19 13:55
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Books every historical bill once, into the shift whose drawer was open
+    when it was closed, as close_session() does. Shift windows may overlap;
+    then the session's own shift wins, else the earliest one.
+    """
+    Shift = apps.get_model('core', 'Shift')
+    Bill = apps.get_model('core', 'Bill')
+    CashLedgerEntry = apps.get_model('core', 'CashLedgerEntry')
+
+    shifts = list(Shift.objects.order_by('start_time'))
+    now = django.utils.timezone.now()
+    entries = []
+    for bill in Bill.objects.select_related('session').iterator(chunk_size=500):
+        open_drawers = [s.pk for s in shifts if s.start_time <= bill.closed_at <= (s.end_time or now)]
+        shift_id = bill.session.shift_id if bill.session.shift_id in open_drawers else next(iter(open_drawers), None)
+        if shift_id:
+            entries.append(CashLedgerEntry(shift_id=shift_id, kind='bill', amount=bill.total_amount, bill=bill))
+    CashLedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+    balances = defaultdict(Decimal)
+    for entry in entries:
+        balances[entry.shift_id] += entry.amount
+    for shift in shifts:
+        shift.cash_balance = balances[shift.pk]
+        shift.save(update_fields=['cash_balance'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_resourceusage_backfill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='cash_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Движение по кассе'),
+        ),
+        migrations.CreateModel(
+            name='CashLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bill', 'Оплата счета'), ('refund', 'Возврат'), ('cash_in', 'Внесение'), ('cash_out', 'Изъятие')], max_length=10, verbose_name='Операция')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма')),
+                ('comment', models.CharField(blank=True, max_length=255, null=True, verbose_name='Комментарий')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время')),
+                ('bill', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='core.bill', verbose_name='Счет')),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='core.shift', verbose_name='Смена')),
+            ],
+            options={
+                'verbose_name': 'Операция по кассе',
+                'verbose_name_plural': 'Кассовый журнал',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
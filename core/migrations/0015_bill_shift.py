@@ -0,0 +1,38 @@
+# Generated by Django 6.0.5 on 2026-10-19 13:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_bill_shift(apps, schema_editor):
+    """
+    Links historical bills to the shift they were paid in. The cash ledger
+    already knows that; bills without a ledger entry fall back to the
+    shift their session was opened in.
+    """
+    Bill = apps.get_model('core', 'Bill')
+    CashLedgerEntry = apps.get_model('core', 'CashLedgerEntry')
+    Session = apps.get_model('core', 'Session')
+
+    paid_in = CashLedgerEntry.objects.filter(bill=OuterRef('pk'), kind='bill').values('shift_id')[:1]
+    Bill.objects.filter(shift__isnull=True).update(shift=Subquery(paid_in))
+
+    opened_in = Session.objects.filter(pk=OuterRef('session_id')).values('shift_id')[:1]
+    Bill.objects.filter(shift__isnull=True).update(shift=Subquery(opened_in))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_cash_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bills', to='core.shift', verbose_name='Смена'),
+        ),
+        migrations.RunPython(backfill_bill_shift, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.5 on 2026-10-19 13:57
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_bill_shift'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Архивировано'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='report_snapshot',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Отчет (снимок)'),
+        ),
+        migrations.AlterField(
+            model_name='resourceusage',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usages', to='core.session', verbose_name='Сессия'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedBill',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID счета')),
+                ('session_id', models.BigIntegerField(verbose_name='ID сессии')),
+                ('resource_name', models.CharField(blank=True, max_length=50, verbose_name='Стол')),
+                ('mode', models.CharField(max_length=10, verbose_name='Вид')),
+                ('start_time', models.DateTimeField(verbose_name='Начато')),
+                ('end_time', models.DateTimeField(blank=True, null=True, verbose_name='Закончено')),
+                ('closed_at', models.DateTimeField(verbose_name='Закрыто в')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Общая сумма')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Детали')),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_bills', to='core.shift', verbose_name='Смена')),
+            ],
+            options={
+                'verbose_name': 'Архивный счет',
+                'verbose_name_plural': 'Архив счетов',
+                'ordering': ['-closed_at'],
+            },
+        ),
+    ]
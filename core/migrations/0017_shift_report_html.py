@@ -0,0 +1,18 @@
+# Generated by Django 6.0.5 on 2026-10-19 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='report_html',
+            field=models.TextField(blank=True, null=True, verbose_name='Отчет (HTML)'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_shift_report_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('open', 'Идет подсчет'), ('committed', 'Проведена')], default='open', max_length=10, verbose_name='Статус')),
+                ('comment', models.CharField(blank=True, max_length=255, null=True, verbose_name='Комментарий')),
+                ('opened_at', models.DateTimeField(auto_now_add=True, verbose_name='Начата')),
+                ('committed_at', models.DateTimeField(blank=True, null=True, verbose_name='Проведена в')),
+                ('shift', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_counts', to='core.shift', verbose_name='Смена')),
+            ],
+            options={
+                'verbose_name': 'Инвентаризация',
+                'verbose_name_plural': 'Инвентаризации',
+                'ordering': ['-opened_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockCountLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counted', models.IntegerField(verbose_name='Фактически')),
+                ('expected', models.IntegerField(default=0, verbose_name='По системе')),
+                ('counted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Посчитано в')),
+                ('count', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='core.stockcount', verbose_name='Инвентаризация')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='count_lines', to='core.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Строка инвентаризации',
+                'verbose_name_plural': 'Строки инвентаризации',
+                'unique_together': {('count', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_stock_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Штрихкод / SKU'),
+        ),
+    ]
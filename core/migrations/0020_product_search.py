@@ -0,0 +1,36 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:08
+
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    """pg_trgm GIN index serving Product.name ILIKE '%...%'; other databases search in memory."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS core_product_name_trgm "
+        "ON core_product USING gin (UPPER(name) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS core_product_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_product_barcode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_favorite',
+            field=models.BooleanField(default=False, verbose_name='Избранное'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Заканчивается'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_level',
+            field=models.IntegerField(blank=True, help_text='Оповещение, когда остаток опускается до этого значения. Пусто — без оповещений.', null=True, verbose_name='Минимальный остаток'),
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField(verbose_name='Остаток')),
+                ('reorder_level', models.IntegerField(verbose_name='Минимальный остаток')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время')),
+                ('resolved_at', models.DateTimeField(blank=True, null=True, verbose_name='Пополнено в')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='core.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Оповещение об остатке',
+                'verbose_name_plural': 'Оповещения об остатках',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['resolved_at', 'created_at'], name='stockalert_open_idx')],
+            },
+        ),
+    ]
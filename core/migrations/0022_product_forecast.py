@@ -0,0 +1,33 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='days_of_stock',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Хватит на (дней)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='forecast_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Прогноз от'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_velocity',
+            field=models.FloatField(blank=True, null=True, verbose_name='Продаж в день'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='suggested_order',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Рекомендуется заказать'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:15
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def close_extra_active_shifts(apps, schema_editor):
+    """Keeps the newest active shift open; older ones left open by the old race are closed."""
+    Shift = apps.get_model('core', 'Shift')
+    active = Shift.objects.filter(is_active=True).order_by('-start_time', '-pk')
+    newest = active.first()
+    if newest is not None:
+        active.exclude(pk=newest.pk).update(is_active=False, end_time=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_product_forecast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(close_extra_active_shifts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='shift',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='single_active_shift', violation_error_message='Системная ошибка: Уже есть активная смена. Закройте текущую смену перед открытием новой.'),
+        ),
+    ]
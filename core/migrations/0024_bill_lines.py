@@ -0,0 +1,118 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:20
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PAUSE_CREDIT_MINUTES = 5
+CENT = Decimal('0.01')
+
+
+def backfill_bill_lines(apps, schema_editor):
+    """
+    Gives existing bills their lines. Products come from the session items;
+    the time line is whatever the stored total leaves after them, as the old
+    screens showed it, so historical totals stay exactly as they were.
+    """
+    Bill = apps.get_model('core', 'Bill')
+    BillLine = apps.get_model('core', 'BillLine')
+    bills = Bill.objects.select_related('session').prefetch_related('session__items__product', 'session__pauses')
+
+    changed, lines = [], []
+    for bill in bills.iterator(chunk_size=500):
+        session = bill.session
+        position = 0
+        items_amount = Decimal(0)
+        item_lines = []
+        for item in session.items.all():
+            amount = (item.quantity * (item.price_at_order or Decimal(0))).quantize(CENT)
+            items_amount += amount
+            item_lines.append((item.product_id, item.product.name, item.quantity, item.price_at_order or 0, amount))
+
+        time_amount = bill.total_amount - items_amount
+        if session.mode == 'PREPAID':
+            minutes = Decimal(session.prepaid_minutes)
+        else:
+            end = session.end_time or bill.closed_at
+            played = max(0, (end - session.start_time).total_seconds() / 60)
+            credit = sum(
+                min(((p.resumed_at or end) - p.paused_at).total_seconds() / 60, PAUSE_CREDIT_MINUTES)
+                for p in session.pauses.all()
+            )
+            minutes = Decimal(max(0, played - credit)).quantize(CENT)
+        if session.resource_id or time_amount:
+            lines.append(BillLine(
+                bill_id=bill.pk, position=position, kind='time', description="Время",
+                quantity=minutes, unit_price=(time_amount / minutes).quantize(Decimal('0.0001')) if minutes else 0,
+                amount=time_amount,
+            ))
+            position += 1
+        for product_id, name, quantity, price, amount in item_lines:
+            lines.append(BillLine(
+                bill_id=bill.pk, position=position, kind='item', product_id=product_id,
+                description=name, quantity=quantity, unit_price=price, amount=amount,
+            ))
+            position += 1
+
+        bill.billed_minutes = minutes if session.resource_id else 0
+        bill.time_amount = time_amount
+        bill.items_amount = items_amount
+        changed.append(bill)
+
+        if len(changed) >= 500:
+            Bill.objects.bulk_update(changed, ['billed_minutes', 'time_amount', 'items_amount'])
+            BillLine.objects.bulk_create(lines)
+            changed, lines = [], []
+    Bill.objects.bulk_update(changed, ['billed_minutes', 'time_amount', 'items_amount'])
+    BillLine.objects.bulk_create(lines)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_single_active_shift'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='billed_minutes',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='Оплачено минут'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Скидка'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='items_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Бар'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='time_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Время'),
+        ),
+        migrations.CreateModel(
+            name='BillLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0, verbose_name='№')),
+                ('kind', models.CharField(choices=[('time', 'Время'), ('item', 'Товар'), ('discount', 'Скидка')], max_length=10, verbose_name='Тип')),
+                ('description', models.CharField(max_length=150, verbose_name='Описание')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Кол-во')),
+                ('unit_price', models.DecimalField(decimal_places=4, max_digits=10, verbose_name='Цена')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма')),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='core.bill', verbose_name='Счет')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Строка счета',
+                'verbose_name_plural': 'Строки счета',
+                'ordering': ['bill', 'position'],
+            },
+        ),
+        migrations.RunPython(backfill_bill_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:23
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_bill_lines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TariffRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_type', models.CharField(choices=[('billiard', 'Бильярд'), ('sony', 'Sony'), ('bar', 'Бар')], max_length=20, verbose_name='Вид стола')),
+                ('name', models.CharField(max_length=50, verbose_name='Название')),
+                ('weekdays', models.CharField(default='0123456', help_text='0 = Пн … 6 = Вс, например 56 — выходные. Ночной тариф относится к дню, в который начинается.', max_length=7, validators=[django.core.validators.RegexValidator('^[0-6]{1,7}$', 'Цифры от 0 (Пн) до 6 (Вс)')], verbose_name='Дни недели')),
+                ('start_time', models.TimeField(verbose_name='С')),
+                ('end_time', models.TimeField(help_text='Если раньше начала — тариф идет через полночь; если равно — весь день', verbose_name='До')),
+                ('price_per_hour', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена за час')),
+                ('priority', models.IntegerField(default=0, verbose_name='Приоритет')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+            ],
+            options={
+                'verbose_name': 'Тариф',
+                'verbose_name_plural': 'Тарифы',
+                'ordering': ['resource_type', '-priority', 'start_time'],
+            },
+        ),
+    ]
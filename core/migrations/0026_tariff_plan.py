@@ -0,0 +1,22 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_tariff_rule'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='tariffrule',
+            options={'ordering': ['plan', 'resource_type', '-priority', 'start_time'], 'verbose_name': 'Тариф', 'verbose_name_plural': 'Тарифы'},
+        ),
+        migrations.AddField(
+            model_name='tariffrule',
+            name='plan',
+            field=models.CharField(blank=True, default='', help_text='Пусто — действующий тариф. Название плана — черновик для сравнения (simulate_tariffs), в счетах не участвует.', max_length=50, verbose_name='План'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:28
+
+import core.clubs
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+CLUB_MODELS = ('Product', 'Resource', 'Session', 'Shift', 'StockMovement')
+
+
+def assign_local_club(apps, schema_editor):
+    """
+    Creates the club this database belongs to and gives it every existing
+    row: the deployment's own club on 'default', the club named by the alias
+    (club_<code>) on the databases head office migrates for other clubs.
+    """
+    alias = schema_editor.connection.alias
+    code = settings.CLUB_CODE if alias == 'default' else alias.removeprefix('club_')
+    Club = apps.get_model('core', 'Club')
+    Club.objects.using(alias).get_or_create(code=code, defaults={'name': code})
+    for name in CLUB_MODELS:
+        apps.get_model('core', name).objects.using(alias).filter(club__isnull=True).update(club_id=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_tariff_plan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Club',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(max_length=30, unique=True, verbose_name='Код')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+            ],
+            options={
+                'verbose_name': 'Клуб',
+                'verbose_name_plural': 'Клубы',
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='club',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='club',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='club',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='club',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='club',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.RunPython(assign_local_club, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='club',
+            field=models.ForeignKey(default=core.clubs.current_club_code, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AlterField(
+            model_name='resource',
+            name='club',
+            field=models.ForeignKey(default=core.clubs.current_club_code, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='club',
+            field=models.ForeignKey(default=core.clubs.current_club_code, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AlterField(
+            model_name='shift',
+            name='club',
+            field=models.ForeignKey(default=core.clubs.current_club_code, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='club',
+            field=models.ForeignKey(default=core.clubs.current_club_code, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.club', to_field='code', verbose_name='Клуб'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_club'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='prepaid_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Сумма предоплаты'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.5 on 2026-10-19 14:47
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def guess_overtime(apps, schema_editor):
+    """
+    Bills closed so far did not record the choice. A prepaid bill that
+    charged more minutes than were prepaid must have been closed with
+    overtime; one closed early with overtime cannot be told apart.
+    """
+    Bill = apps.get_model('core', 'Bill')
+    Bill.objects.filter(
+        session__mode='PREPAID', billed_minutes__gt=F('session__prepaid_minutes')
+    ).update(charge_overtime=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_session_prepaid_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='charge_overtime',
+            field=models.BooleanField(default=False, verbose_name='Со сверхурочным'),
+        ),
+        migrations.RunPython(guess_overtime, migrations.RunPython.noop),
+    ]
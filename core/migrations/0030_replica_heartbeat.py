@@ -0,0 +1,24 @@
+# Generated by Django 6.0.5 on 2026-10-19 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_bill_charge_overtime'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicaHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beat_at', models.DateTimeField(verbose_name='Отметка')),
+            ],
+            options={
+                'verbose_name': 'Отметка реплики',
+                'verbose_name_plural': 'Отметки реплики',
+            },
+        ),
+    ]
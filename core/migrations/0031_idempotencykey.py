@@ -0,0 +1,28 @@
+# Generated by Django 6.0.5 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_replica_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Код ответа')),
+                ('content', models.BinaryField(default=b'', verbose_name='Ответ')),
+                ('headers', models.JSONField(default=dict, verbose_name='Заголовки')),
+            ],
+            options={
+                'verbose_name': 'Ключ идемпотентности',
+                'verbose_name_plural': 'Ключи идемпотентности',
+            },
+        ),
+    ]
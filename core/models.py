@@ -1,11 +1,33 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, F
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
-from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import RegexValidator
 from datetime import timedelta
+from decimal import Decimal
+
+from .clubs import current_club_code
+
+
+class Club(models.Model):
+    """
+    A club of the network. Each club database holds its own row; rows of
+    other clubs only appear where data of several clubs is combined.
+    """
+    code = models.SlugField(max_length=30, unique=True, verbose_name=_("Код"))
+    name = models.CharField(max_length=100, verbose_name=_("Название"))
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = _("Клуб")
+        verbose_name_plural = _("Клубы")
+
 
 class Resource(models.Model):
     RESOURCE_TYPE = (
@@ -18,6 +40,15 @@ class Resource(models.Model):
     type = models.CharField(max_length=20, choices=RESOURCE_TYPE, verbose_name=_("Вид"))
     price_per_hour = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Цена за час"))
     is_active = models.BooleanField(default=True, verbose_name=_("Активен"))
+    # Stored as the club code, so rows stay attributable when club databases are combined
+    club = models.ForeignKey(
+        Club,
+        to_field='code',
+        on_delete=models.PROTECT,
+        default=current_club_code,
+        related_name='+',
+        verbose_name=_("Клуб")
+    )
 
     def __str__(self):
         return f"{self.name} ({self.type})"
@@ -30,14 +61,84 @@ class Resource(models.Model):
         verbose_name_plural = 'Столы'
 
 
+class TariffRule(models.Model):
+    """
+    A time-of-day rate for one kind of table: happy hour, weekend, night.
+    Outside every rule a table costs its own price_per_hour; where rules
+    overlap the higher priority wins. Compiled into a weekly interval table
+    by core/tariffs.py. Rules with a plan name are drafts: only the
+    what-if simulator (core/simulation.py) prices with them.
+    """
+    resource_type = models.CharField(max_length=20, choices=Resource.RESOURCE_TYPE, verbose_name=_("Вид стола"))
+    name = models.CharField(max_length=50, verbose_name=_("Название"))
+    weekdays = models.CharField(
+        max_length=7,
+        default='0123456',
+        validators=[RegexValidator(r'^[0-6]{1,7}$', _("Цифры от 0 (Пн) до 6 (Вс)"))],
+        verbose_name=_("Дни недели"),
+        help_text=_("0 = Пн … 6 = Вс, например 56 — выходные. Ночной тариф относится к дню, в который начинается.")
+    )
+    start_time = models.TimeField(verbose_name=_("С"))
+    end_time = models.TimeField(
+        verbose_name=_("До"),
+        help_text=_("Если раньше начала — тариф идет через полночь; если равно — весь день")
+    )
+    price_per_hour = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Цена за час"))
+    priority = models.IntegerField(default=0, verbose_name=_("Приоритет"))
+    is_active = models.BooleanField(default=True, verbose_name=_("Активен"))
+    plan = models.CharField(
+        max_length=50,
+        blank=True,
+        default='',
+        verbose_name=_("План"),
+        help_text=_("Пусто — действующий тариф. Название плана — черновик для сравнения (simulate_tariffs), в счетах не участвует.")
+    )
+
+    def __str__(self):
+        return f"{self.name} ({self.get_resource_type_display()})"
+
+    class Meta:
+        verbose_name = _("Тариф")
+        verbose_name_plural = _("Тарифы")
+        ordering = ['plan', 'resource_type', '-priority', 'start_time']
+
+
 class Product(models.Model):
     name = models.CharField(max_length=100,verbose_name=_("Название"))
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Цена продажи"))
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_("Цена закупа"))
     stock = models.IntegerField(null=True, blank=True,verbose_name=_("Кол-во товара"))
+    barcode = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name=_("Штрихкод / SKU"))
+    is_favorite = models.BooleanField(default=False, verbose_name=_("Избранное"))
+    reorder_level = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("Минимальный остаток"),
+        help_text=_("Оповещение, когда остаток опускается до этого значения. Пусто — без оповещений.")
+    )
+    # Current state, so only transitions raise or resolve an alert
+    is_low_stock = models.BooleanField(default=False, db_index=True, verbose_name=_("Заканчивается"))
+    # Written nightly by `manage.py refresh_forecast` (core/forecast.py)
+    sales_velocity = models.FloatField(null=True, blank=True, verbose_name=_("Продаж в день"))
+    days_of_stock = models.IntegerField(null=True, blank=True, verbose_name=_("Хватит на (дней)"))
+    suggested_order = models.IntegerField(null=True, blank=True, verbose_name=_("Рекомендуется заказать"))
+    forecast_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Прогноз от"))
+    club = models.ForeignKey(
+        Club,
+        to_field='code',
+        on_delete=models.PROTECT,
+        default=current_club_code,
+        related_name='+',
+        verbose_name=_("Клуб")
+    )
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # Empty codes are stored as NULL so they don't collide on the unique index
+        self.barcode = (self.barcode or '').strip() or None
+        super().save(*args, **kwargs)
     
     @property
     def margin(self):
@@ -84,6 +185,8 @@ class Session(models.Model):
     
     mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='OPEN',verbose_name=_("Вид"))
     prepaid_minutes = models.PositiveIntegerField(null=True, blank=True,verbose_name=_("Предоплата"))
+    # What the prepaid minutes cost at the tariff in force when they were sold
+    prepaid_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name=_("Сумма предоплаты"))
     shift = models.ForeignKey(
         'Shift', 
         on_delete=models.SET_NULL, 
@@ -92,6 +195,14 @@ class Session(models.Model):
         related_name='sessions',
         verbose_name=_("Смена")
     )
+    club = models.ForeignKey(
+        Club,
+        to_field='code',
+        on_delete=models.PROTECT,
+        default=current_club_code,
+        related_name='+',
+        verbose_name=_("Клуб")
+    )
 
     def __str__(self):
         res_name = self.resource.name if self.resource else "БАР"
@@ -99,29 +210,79 @@ class Session(models.Model):
         return f"{res_name} [{mode_display}] - ID: {self.pk}"
     
     def get_billable_minutes(self):
+        # Pause credit (max 5 minutes per pause) is shared with batch closing, see core/billing.py
+        from .billing import billable_minutes
         now = self.end_time if self.end_time else timezone.now()
-        total_mins = (now - self.start_time).total_seconds() / 60
-        
-        pause_discount = 0
-        # The limit you requested: 5 minutes
-        PAUSE_LIMIT = 5 
-
-        # 1. Finished pauses
-        for pause in self.pauses.filter(resumed_at__isnull=False):
-            # min(actual duration, 5 mins)
-            pause_discount += min(pause.duration_minutes, PAUSE_LIMIT)
-            
-        # 2. Currently active pause
-        active_pause = self.pauses.filter(resumed_at__isnull=True).first()
-        if active_pause:
-            current_pause_dur = (timezone.now() - active_pause.paused_at).total_seconds() / 60
-            # Even if they are still 'paused' in the UI, 
-            # we only give them a discount of max 5 mins.
-            pause_discount += min(current_pause_dur, PAUSE_LIMIT)
-            
-        return max(0, total_mins - pause_discount)
+        return billable_minutes(self.start_time, now, self.pauses.values_list('paused_at', 'resumed_at'))
     
     
+    def open_usage(self, resource, started_at=None):
+        """Starts a new usage segment of `resource` for this session."""
+        return ResourceUsage.objects.create(
+            session=self,
+            resource=resource,
+            started_at=started_at or timezone.now()
+        )
+
+    def close_usage(self, ended_at=None):
+        """Closes whatever usage segment is still open for this session."""
+        return self.usages.filter(ended_at__isnull=True).update(
+            ended_at=ended_at or timezone.now()
+        )
+
+    # State transitions. Each one is a single UPDATE guarded by the state it
+    # expects, so of two concurrent requests only one changes the row and the
+    # other sees 0 rows updated; no lock is held while Python computes.
+
+    def pause(self):
+        with transaction.atomic():
+            if not Session.objects.filter(pk=self.pk, is_active=True, is_paused=False).update(is_paused=True):
+                return False
+            SessionPause.objects.create(session=self)
+        self.is_paused = True
+        return True
+
+    def resume(self, at=None):
+        with transaction.atomic():
+            if not Session.objects.filter(pk=self.pk, is_active=True, is_paused=True).update(is_paused=False):
+                return False
+            self.pauses.filter(resumed_at__isnull=True).update(resumed_at=at or timezone.now())
+        self.is_paused = False
+        return True
+
+    def extend(self, minutes, amount=0):
+        """Sells `minutes` more for `amount`; a session without a prepaid amount keeps none."""
+        updated = Session.objects.filter(pk=self.pk, is_active=True).update(
+            prepaid_minutes=Coalesce(F('prepaid_minutes'), 0) + minutes,
+            prepaid_amount=F('prepaid_amount') + amount,
+        )
+        if updated:
+            self.refresh_from_db(fields=['prepaid_minutes', 'prepaid_amount'])
+        return bool(updated)
+
+    def finish(self, at):
+        """
+        Ends the session at `at` together with its open pause and table usage.
+        Must run inside the caller's transaction; False if it was already over.
+        """
+        if not Session.objects.filter(pk=self.pk, is_active=True).update(is_active=False, is_paused=False, end_time=at):
+            return False
+        self.pauses.filter(resumed_at__isnull=True).update(resumed_at=at)
+        self.close_usage(at)
+        self.is_active, self.is_paused, self.end_time = False, False, at
+        return True
+
+    def move_to(self, resource):
+        """
+        Moves a running session to another table.
+        The old usage segment is closed and a new one starts at the same moment.
+        """
+        now = timezone.now()
+        self.close_usage(now)
+        self.resource = resource
+        self.save(update_fields=['resource'])
+        self.open_usage(resource, now)
+
     def get_total_played_seconds(self):
         # 1. Total time since the very beginning
         end = self.end_time if self.end_time else timezone.now()
@@ -155,8 +316,10 @@ class ResourceUsage(models.Model):
     session = models.ForeignKey(
         Session,
         related_name='usages',
-        on_delete=models.CASCADE  # session deleted → usage deleted
-        ,verbose_name=_("Сессия")
+        on_delete=models.SET_NULL,  # archived sessions keep their utilisation history
+        null=True,
+        blank=True,
+        verbose_name=_("Сессия")
     )
     resource = models.ForeignKey(
         Resource,
@@ -167,8 +330,11 @@ class ResourceUsage(models.Model):
     ended_at = models.DateTimeField(null=True, blank=True,verbose_name=_("Закончено"))
 
     class Meta:
-        verbose_name = 'Использование товара'
-        verbose_name_plural = 'Использование товаров'
+        verbose_name = 'Использование стола'
+        verbose_name_plural = 'Использование столов'
+        indexes = [
+            models.Index(fields=['resource', 'started_at'], name='usage_resource_start_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -193,11 +359,74 @@ class Bill(models.Model):
         on_delete=models.PROTECT,verbose_name=_("Сессия")
     )
     total_amount = models.DecimalField(max_digits=10, decimal_places=2,verbose_name=_("Общая сумма"))
+    # Subtotals of the lines, written once at close: total = time - discount + items
+    billed_minutes = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name=_("Оплачено минут"))
+    time_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_("Время"))
+    items_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_("Бар"))
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_("Скидка"))
+    # Closed with charge_overtime: a prepaid session billed for all the time played
+    charge_overtime = models.BooleanField(default=False, verbose_name=_("Со сверхурочным"))
     closed_at = models.DateTimeField(auto_now_add=True,verbose_name=_("Закрыто в"))
+    shift = models.ForeignKey(
+        'Shift',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bills',
+        verbose_name=_("Смена")
+    )
     class Meta:
         verbose_name = 'Счет'
         verbose_name_plural = 'Счета'
 
+    @property
+    def table_amount(self):
+        """What the table time cost after the pause credit."""
+        return self.time_amount - self.discount_amount
+
+
+class BillLine(models.Model):
+    """
+    One line of a bill as it was priced at close: the table time, a product
+    or a discount. Lines are never edited, receipts and reports read them
+    instead of recomputing the session.
+    """
+    KIND_CHOICES = (
+        ('time', 'Время'),
+        ('item', 'Товар'),
+        ('discount', 'Скидка'),
+    )
+
+    bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name='lines', verbose_name=_("Счет"))
+    position = models.PositiveSmallIntegerField(default=0, verbose_name=_("№"))
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name=_("Тип"))
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_("Товар")
+    )
+    description = models.CharField(max_length=150, verbose_name=_("Описание"))
+    # Minutes for time and discount lines, units for products
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Кол-во"))
+    unit_price = models.DecimalField(max_digits=10, decimal_places=4, verbose_name=_("Цена"))
+    # Negative for discounts
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Сумма"))
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Bill lines are immutable")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.description}: {self.amount} сом"
+
+    class Meta:
+        verbose_name = _("Строка счета")
+        verbose_name_plural = _("Строки счета")
+        ordering = ['bill', 'position']
+
 class SessionItem(models.Model):
     # Change 'on_parent_delete' to 'on_delete'
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='items',verbose_name=_("Сессия"))
@@ -218,7 +447,7 @@ class SessionItem(models.Model):
             # 2. Subtract from Product stock
             if self.product.stock is not None:
                 self.product.stock -= self.quantity
-                self.product.save()
+                self.product.save(update_fields=['stock'])
         
         super().save(*args, **kwargs)
 
@@ -226,7 +455,7 @@ class SessionItem(models.Model):
         # 3. Return items to stock if the order is cancelled/deleted
         if self.product.stock is not None:
             self.product.stock += self.quantity
-            self.product.save()
+            self.product.save(update_fields=['stock'])
         
         super().delete(*args, **kwargs)
 
@@ -235,6 +464,21 @@ class SessionItem(models.Model):
         verbose_name_plural = 'Товары сессии'
         ordering = ['id']
 
+def _decode_report(data):
+    """JSON keeps decimals as strings; turn the money fields back into Decimal."""
+    def money(value):
+        return Decimal(value) if value is not None else Decimal(0)
+
+    report = {key: money(value) for key, value in data['report'].items()}
+    report['items_count'] = int(data['report']['items_count'])
+    products = [
+        dict(row, total_rev=money(row['total_rev']), total_cost=money(row['total_cost']))
+        for row in data['products']
+    ]
+    resources = [dict(row, total_earned=money(row['total_earned'])) for row in data['resources']]
+    return {'report': report, 'products': products, 'resources': resources}
+
+
 class Shift(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,verbose_name=_("Пользователь"))
     start_time = models.DateTimeField(auto_now_add=True,verbose_name=_("Начало(время)"))
@@ -242,17 +486,25 @@ class Shift(models.Model):
     start_cash = models.DecimalField(max_digits=10, decimal_places=2, default=0,verbose_name=_("Изначальная сумма"))
     end_cash = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,verbose_name=_("Итоговая сумма"))
     is_active = models.BooleanField(default=True,verbose_name=_("Активен"))
+    cash_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name=_("Движение по кассе"))
+    archived_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Архивировано"))
+    # Frozen output of get_report_data() for closed shifts. Cleared if a bill of the
+    # shift is edited, except for archived shifts where it is the only copy left.
+    report_snapshot = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name=_("Отчет (снимок)"))
+    report_html = models.TextField(null=True, blank=True, verbose_name=_("Отчет (HTML)"))
+    club = models.ForeignKey(
+        Club,
+        to_field='code',
+        on_delete=models.PROTECT,
+        default=current_club_code,
+        related_name='+',
+        verbose_name=_("Клуб")
+    )
 
     def total_revenue(self):
-        from .models import Bill
-        
-        end_boundary = self.end_time if self.end_time else timezone.now()
-        
-        # Change 'created_at__range' to 'closed_at__range'
-        revenue = Bill.objects.filter(
-            closed_at__range=(self.start_time, end_boundary)
-        ).aggregate(Sum('total_amount'))['total_amount__sum']
-        
+        if self.report_snapshot:
+            return self.get_report_data()['report']['total_revenue']
+        revenue = self.bills.aggregate(Sum('total_amount'))['total_amount__sum']
         return revenue or 0
 
 
@@ -261,41 +513,35 @@ class Shift(models.Model):
         local_start_time = timezone.localtime(self.start_time)
         return f"Смена {self.user.username} ({local_start_time.strftime('%d.%m %H:%M')})"
 
-    def clean(self):
-        # Check if another shift is already active
-        active_shifts = Shift.objects.filter(is_active=True)
-        if self.pk:
-            active_shifts = active_shifts.exclude(pk=self.pk)
-        
-        if self.is_active and active_shifts.exists():
-            raise ValidationError("Системная ошибка: Уже есть активная смена. Закройте текущую смену перед открытием новой.")
+    def close(self, end_cash, at=None):
+        """
+        Closes the shift if it is still open. Conditional UPDATE, so of two
+        concurrent closes only the first one is recorded.
+        """
+        at = at or timezone.now()
+        closed = Shift.objects.filter(pk=self.pk, is_active=True).update(
+            is_active=False, end_time=at, end_cash=end_cash
+        )
+        if closed:
+            self.is_active, self.end_time, self.end_cash = False, at, end_cash
+            self._drop_cached()
+        return bool(closed)
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-    
     def get_shift_report(self):
-        from .models import Bill, SessionItem
-        from django.db.models import Sum, F
-        from django.utils import timezone
-
-        end = self.end_time if self.end_time else timezone.now()
-        bills = Bill.objects.filter(closed_at__range=(self.start_time, end))
-
-        total_revenue = bills.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+        if self.report_snapshot:
+            return self.get_report_data()['report']
 
-        items = SessionItem.objects.filter(session__bill__in=bills)
+        # Bills are linked to the shift they were paid in, so this is an index lookup
+        total_revenue = self.total_revenue()
 
-        bar_revenue = 0
-        bar_cost = 0
-        total_items_sold = 0
-
-        for item in items:
-            bar_revenue += item.total_price()
-            # Fallback to 0 if cost_price is None
-            c_price = item.product.cost_price or 0
-            bar_cost += (c_price * item.quantity)
-            total_items_sold += item.quantity
+        items = SessionItem.objects.filter(session__bill__shift=self).aggregate(
+            bar_revenue=Sum(F('quantity') * F('price_at_order')),
+            bar_cost=Sum(F('quantity') * F('product__cost_price')),
+            items_count=Sum('quantity')
+        )
+        bar_revenue = items['bar_revenue'] or 0
+        bar_cost = items['bar_cost'] or 0
+        total_items_sold = items['items_count'] or 0
 
         bar_profit = bar_revenue - bar_cost
         time_revenue = total_revenue - bar_revenue
@@ -309,13 +555,98 @@ class Shift(models.Model):
             'bar_cost': bar_cost
         }
     
+    def get_report_data(self):
+        """
+        Everything the shift report shows: the totals from get_shift_report()
+        plus per-product and per-resource breakdowns.
+        A closed shift never changes, so it is computed once and then served
+        from the snapshot; only the active shift is computed live.
+        """
+        if self.report_snapshot:
+            return _decode_report(self.report_snapshot)
+
+        products = SessionItem.objects.filter(session__bill__shift=self).values('product__name').annotate(
+            total_qty=Sum('quantity'),
+            total_rev=Sum(F('quantity') * F('price_at_order')),
+            total_cost=Sum(F('quantity') * F('product__cost_price'))
+        ).order_by('product__name')
+
+        resources = self.bills.values('session__resource__name').annotate(
+            total_earned=Sum('total_amount')
+        ).order_by('session__resource__name')
+
+        data = {
+            'report': self.get_shift_report(),
+            'products': list(products),
+            'resources': list(resources),
+        }
+        if not self.is_active and self.pk:
+            self.report_snapshot = data
+            Shift.objects.filter(pk=self.pk).update(report_snapshot=data)
+        return data
+
+    def store_report_html(self, html):
+        """Keeps the rendered admin report of a closed shift next to its snapshot."""
+        if not self.is_active and self.pk:
+            self.report_html = html
+            Shift.objects.filter(pk=self.pk).update(report_html=html)
+
+    @classmethod
+    def invalidate_report(cls, shift_id):
+        """Drops the cached report of a closed shift after one of its bills changed."""
+        if shift_id:
+            cls.objects.filter(
+                pk=shift_id, is_active=False, archived_at__isnull=True
+            ).update(report_snapshot=None, report_html=None)
+
+    @property
+    def expected_cash(self):
+        """What should be in the drawer right now (start cash + ledger balance)."""
+        return self.start_cash + self.cash_balance
+
     @property
     def discrepancy(self):
         """Calculates if the cash drawer is short or over."""
         if self.end_cash is not None:
-            expected = self.start_cash + self.total_revenue()
-            return self.end_cash - expected
+            return self.end_cash - self.expected_cash
         return 0
+
+    def record_cash(self, kind, amount, bill=None, comment=None):
+        """
+        Appends a payment event to the shift ledger and moves the running balance.
+        Refunds and cash-outs always reduce the drawer, everything else adds to it.
+        """
+        amount = abs(Decimal(amount))
+        if kind in CashLedgerEntry.OUTGOING:
+            amount = -amount
+
+        with transaction.atomic():
+            entry = CashLedgerEntry.objects.create(
+                shift=self, kind=kind, amount=amount, bill=bill, comment=comment
+            )
+            Shift.objects.filter(pk=self.pk).update(cash_balance=F('cash_balance') + amount)
+        self.refresh_from_db(fields=['cash_balance'])
+        self._drop_cached()
+        return entry
+
+    def record_bills(self, bills):
+        """record_cash('bill', ...) for many bills: one bulk insert, one balance update."""
+        entries = [
+            CashLedgerEntry(shift=self, kind='bill', amount=abs(bill.total_amount), bill=bill)
+            for bill in bills
+        ]
+        total = sum((entry.amount for entry in entries), Decimal('0'))
+        with transaction.atomic():
+            CashLedgerEntry.objects.bulk_create(entries)
+            Shift.objects.filter(pk=self.pk).update(cash_balance=F('cash_balance') + total)
+        self.refresh_from_db(fields=['cash_balance'])
+        self._drop_cached()
+        return entries
+
+    def _drop_cached(self):
+        """For changes made with update(), which sends no signals to drop the cached active shift."""
+        from .caching import invalidate_active_shift
+        invalidate_active_shift()
     
     def get_shift_stock_summary(self):
         """
@@ -339,6 +670,52 @@ class Shift(models.Model):
     class Meta:
         verbose_name = 'Смена'
         verbose_name_plural = 'Смены'
+        constraints = [
+            # At most one open shift; the database enforces it, also between concurrent requests
+            models.UniqueConstraint(
+                fields=['is_active'],
+                condition=models.Q(is_active=True),
+                name='single_active_shift',
+                violation_error_message="Системная ошибка: Уже есть активная смена. Закройте текущую смену перед открытием новой.",
+            ),
+        ]
+
+
+class CashLedgerEntry(models.Model):
+    KIND_CHOICES = (
+        ('bill', 'Оплата счета'),
+        ('refund', 'Возврат'),
+        ('cash_in', 'Внесение'),
+        ('cash_out', 'Изъятие'),
+    )
+    OUTGOING = ('refund', 'cash_out')
+
+    shift = models.ForeignKey(
+        Shift,
+        on_delete=models.CASCADE,
+        related_name='ledger',
+        verbose_name=_("Смена")
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name=_("Операция"))
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Сумма"))
+    bill = models.ForeignKey(
+        'Bill',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name=_("Счет")
+    )
+    comment = models.CharField(max_length=255, blank=True, null=True, verbose_name=_("Комментарий"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Дата и время"))
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.amount} сом"
+
+    class Meta:
+        verbose_name = _("Операция по кассе")
+        verbose_name_plural = _("Кассовый журнал")
+        ordering = ['-created_at']
 
 
 class StockMovement(models.Model):
@@ -374,6 +751,14 @@ class StockMovement(models.Model):
         null=True, 
         verbose_name=_("Комментарий")
     )
+    club = models.ForeignKey(
+        Club,
+        to_field='code',
+        on_delete=models.PROTECT,
+        default=current_club_code,
+        related_name='+',
+        verbose_name=_("Клуб")
+    )
     timestamp = models.DateTimeField(
         auto_now_add=True, 
         verbose_name=_("Дата и время")
@@ -392,7 +777,7 @@ class StockMovement(models.Model):
                 # Overwrites the stock with the actual counted amount
                 self.product.stock = self.quantity 
             
-            self.product.save()
+            self.product.save(update_fields=['stock'])
         super().save(*args, **kwargs)
 
     class Meta:
@@ -400,6 +785,128 @@ class StockMovement(models.Model):
         verbose_name_plural = _("Движения товаров")
         ordering = ['-timestamp']
 
+class StockCount(models.Model):
+    """
+    One stocktake. Each line remembers the stock the system expected at the
+    moment the product was counted, so committing applies only the difference
+    and sales made while the count was running are kept.
+    """
+    STATUS_CHOICES = (
+        ('open', 'Идет подсчет'),
+        ('committed', 'Проведена'),
+    )
+
+    shift = models.ForeignKey(
+        Shift,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_counts',
+        verbose_name=_("Смена")
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open', verbose_name=_("Статус"))
+    comment = models.CharField(max_length=255, blank=True, null=True, verbose_name=_("Комментарий"))
+    opened_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Начата"))
+    committed_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Проведена в"))
+
+    def __str__(self):
+        return f"Инвентаризация #{self.pk}"
+
+    def get_variance(self):
+        """Totals over all lines in one aggregate query."""
+        delta = F('counted') - F('expected')
+        totals = self.lines.aggregate(
+            lines=models.Count('id'),
+            mismatched=models.Count('id', filter=~models.Q(counted=F('expected'))),
+            shortage=Sum(delta, filter=models.Q(counted__lt=F('expected'))),
+            surplus=Sum(delta, filter=models.Q(counted__gt=F('expected'))),
+            value=Sum(delta * F('product__cost_price'), output_field=models.DecimalField()),
+        )
+        return {
+            'lines': totals['lines'],
+            'mismatched': totals['mismatched'],
+            'shortage': totals['shortage'] or 0,
+            'surplus': totals['surplus'] or 0,
+            'value': totals['value'] or Decimal('0.00'),
+        }
+
+    class Meta:
+        verbose_name = _("Инвентаризация")
+        verbose_name_plural = _("Инвентаризации")
+        ordering = ['-opened_at']
+
+
+class StockCountLine(models.Model):
+    count = models.ForeignKey(StockCount, on_delete=models.CASCADE, related_name='lines', verbose_name=_("Инвентаризация"))
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='count_lines', verbose_name=_("Товар"))
+    counted = models.IntegerField(verbose_name=_("Фактически"))
+    expected = models.IntegerField(default=0, verbose_name=_("По системе"))
+    counted_at = models.DateTimeField(default=timezone.now, verbose_name=_("Посчитано в"))
+
+    @property
+    def variance(self):
+        return self.counted - self.expected
+
+    def save(self, *args, **kwargs):
+        # Every (re)count is compared with the stock of that moment
+        self.expected = Product.objects.filter(pk=self.product_id).values_list('stock', flat=True).first() or 0
+        self.counted_at = timezone.now()
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = _("Строка инвентаризации")
+        verbose_name_plural = _("Строки инвентаризации")
+        unique_together = ('count', 'product')
+
+
+class StockAlert(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_alerts', verbose_name=_("Товар"))
+    stock = models.IntegerField(verbose_name=_("Остаток"))
+    reorder_level = models.IntegerField(verbose_name=_("Минимальный остаток"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Дата и время"))
+    resolved_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Пополнено в"))
+
+    def __str__(self):
+        return f"{self.product}: осталось {self.stock}"
+
+    class Meta:
+        verbose_name = _("Оповещение об остатке")
+        verbose_name_plural = _("Оповещения об остатках")
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['resolved_at', 'created_at'], name='stockalert_open_idx')]
+
+
+class ArchivedBill(models.Model):
+    """
+    Compact cold-storage copy of a closed bill together with its session.
+    Keeps the original bill id, so old receipts can still be looked up.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name=_("ID счета"))
+    shift = models.ForeignKey(
+        Shift,
+        on_delete=models.PROTECT,
+        related_name='archived_bills',
+        verbose_name=_("Смена")
+    )
+    session_id = models.BigIntegerField(verbose_name=_("ID сессии"))
+    resource_name = models.CharField(max_length=50, blank=True, verbose_name=_("Стол"))
+    mode = models.CharField(max_length=10, verbose_name=_("Вид"))
+    start_time = models.DateTimeField(verbose_name=_("Начато"))
+    end_time = models.DateTimeField(null=True, blank=True, verbose_name=_("Закончено"))
+    closed_at = models.DateTimeField(verbose_name=_("Закрыто в"))
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Общая сумма"))
+    # Items, pauses and who opened the session, as plain JSON
+    payload = models.JSONField(encoder=DjangoJSONEncoder, default=dict, verbose_name=_("Детали"))
+
+    def __str__(self):
+        return f"Счет #{self.pk} ({self.resource_name or 'БАР'})"
+
+    class Meta:
+        verbose_name = _("Архивный счет")
+        verbose_name_plural = _("Архив счетов")
+        ordering = ['-closed_at']
+
+
 class SessionPause(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='pauses')
     paused_at = models.DateTimeField(auto_now_add=True)
@@ -414,4 +921,32 @@ class SessionPause(models.Model):
 
     class Meta:
         verbose_name = "Пауза сессии"
-        verbose_name_plural = "Паузы сессий"
\ No newline at end of file
+        verbose_name_plural = "Паузы сессий"
+
+class ReplicaHeartbeat(models.Model):
+    """
+    One row on the primary, stamped by every lag check of core/replica.py.
+    Replication applies writes in order, so the stamp the replica holds
+    tells how far behind it is for every table, not just the one stamped.
+    """
+    beat_at = models.DateTimeField(verbose_name=_("Отметка"))
+
+    class Meta:
+        verbose_name = _("Отметка реплики")
+        verbose_name_plural = _("Отметки реплики")
+
+
+class IdempotencyKey(models.Model):
+    """
+    A claimed idempotency key (core/idempotency.py) and the response it got.
+    The unique index makes the claim atomic across workers.
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name=_("Ключ"))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_("Действует до"))
+    status = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name=_("Код ответа"))
+    content = models.BinaryField(default=b'', verbose_name=_("Ответ"))
+    headers = models.JSONField(default=dict, verbose_name=_("Заголовки"))
+
+    class Meta:
+        verbose_name = _("Ключ идемпотентности")
+        verbose_name_plural = _("Ключи идемпотентности")
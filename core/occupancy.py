@@ -0,0 +1,100 @@
+"""
+Table utilisation heatmap built from ResourceUsage segments.
+
+Instead of sampling every minute, we sweep over the start/end points of the
+usage intervals: overlapping segments of one table are merged into "busy"
+stretches, and each stretch is spread over the 168 hour-of-week buckets.
+"""
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ResourceUsage
+
+HOURS_IN_WEEK = 7 * 24
+WEEK_SECONDS = HOURS_IN_WEEK * 3600
+
+
+def _local(dt):
+    # Bucketing is done in club time (Asia/Bishkek), as naive datetimes
+    return timezone.localtime(dt).replace(tzinfo=None)
+
+
+def _spread(start, end, buckets):
+    """Adds the seconds of [start, end) into their hour-of-week buckets."""
+    total = (end - start).total_seconds()
+    if total <= 0:
+        return
+
+    # Every full week touches each bucket for exactly one hour
+    weeks = int(total // WEEK_SECONDS)
+    if weeks:
+        for i in range(HOURS_IN_WEEK):
+            buckets[i] += weeks * 3600
+        start += timedelta(weeks=weeks)
+
+    # The rest is shorter than a week: at most 169 hour steps
+    cursor = start
+    while cursor < end:
+        next_hour = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        step_end = min(next_hour, end)
+        buckets[cursor.weekday() * 24 + cursor.hour] += (step_end - cursor).total_seconds()
+        cursor = step_end
+
+
+def _busy_stretches(events):
+    """
+    Sweep-line over (time, +1/-1) events of one table.
+    Yields the merged intervals where at least one usage was open.
+    """
+    events.sort(key=lambda e: (e[0], -e[1]))
+    depth = 0
+    opened_at = None
+    for moment, delta in events:
+        if depth == 0 and delta > 0:
+            opened_at = moment
+        depth += delta
+        if depth == 0:
+            yield opened_at, moment
+
+
+def utilisation_by_hour_of_week(start, end, resources=None):
+    """
+    Returns {resource_id: 7x24 matrix} with the share (0..1) of each
+    hour-of-week that the table was occupied between `start` and `end`.
+    Rows are weekdays (Monday first), columns are hours of the day.
+    """
+    now = timezone.now()
+    end = min(end, now)
+
+    usages = ResourceUsage.objects.filter(started_at__lt=end).filter(
+        Q(ended_at__isnull=True) | Q(ended_at__gt=start)
+    )
+    if resources is not None:
+        usages = usages.filter(resource__in=resources)
+
+    events = {}
+    rows = usages.order_by().values_list('resource_id', 'started_at', 'ended_at')
+    for resource_id, started_at, ended_at in rows.iterator(chunk_size=2000):
+        seg_start = max(started_at, start)
+        seg_end = min(ended_at or now, end)
+        if seg_end <= seg_start:
+            continue
+        bucket = events.setdefault(resource_id, [])
+        bucket.append((seg_start, 1))
+        bucket.append((seg_end, -1))
+
+    available = [0.0] * HOURS_IN_WEEK
+    _spread(_local(start), _local(end), available)
+
+    heatmap = {}
+    for resource_id, resource_events in events.items():
+        busy = [0.0] * HOURS_IN_WEEK
+        for seg_start, seg_end in _busy_stretches(resource_events):
+            _spread(_local(seg_start), _local(seg_end), busy)
+
+        shares = [busy[i] / available[i] if available[i] else 0 for i in range(HOURS_IN_WEEK)]
+        heatmap[resource_id] = [shares[day * 24:(day + 1) * 24] for day in range(7)]
+
+    return heatmap
@@ -0,0 +1,119 @@
+"""
+Read replica for reports.
+
+When settings.REPLICA_DATABASE is set, its alias 'replica' serves the heavy
+read-only report queries so they do not compete with the tills on the
+primary. Reading from the replica is opt-in: code wraps its report queries
+in reporting(), and everything else (all POS views and their writes) keeps
+using the primary as before.
+
+Inside reporting() ReplicaRouter sends reads to the replica unless
+- the replica is behind the primary by more than REPLICA_MAX_LAG_SECONDS,
+  measured with a heartbeat row and re-checked every LAG_CHECK_SECONDS,
+  or it cannot be reached;
+- the block has already written something: the rest of it reads the
+  primary, so it sees its own writes.
+
+Querysets evaluated after the block has ended (streamed CSV, rendered
+templates) are fixed to a database with reporting_queryset().
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+REPLICA = 'replica'
+LAG_CHECK_SECONDS = 5
+
+_state = threading.local()
+
+# This process' last lag check: when it ran and whether the replica was usable
+_lag = {'checked_at': None, 'usable': False}
+
+
+def replica_lag():
+    """
+    Seconds the replica is behind the primary; None if it is unreachable.
+    Every check stamps the primary's heartbeat. The replica is in sync while
+    it holds the stamp the primary had before this check, otherwise it is
+    behind by the age of the stamp it holds.
+    """
+    from .models import ReplicaHeartbeat
+
+    def stamp(alias):
+        return ReplicaHeartbeat.objects.using(alias).filter(pk=1).values_list('beat_at', flat=True).first()
+
+    now = timezone.now()
+    try:
+        replica = stamp(REPLICA)
+        primary = stamp('default')
+        ReplicaHeartbeat.objects.using('default').update_or_create(pk=1, defaults={'beat_at': now})
+    except DatabaseError:
+        return None
+    if primary is None or replica is None:
+        return float('inf')  # nothing to compare until a stamp has replicated
+    if replica >= primary:
+        return 0
+    return (now - replica).total_seconds()
+
+
+def replica_usable():
+    """Whether reports may read the replica now; the answer is kept for LAG_CHECK_SECONDS."""
+    if REPLICA not in settings.DATABASES:
+        return False
+    now = time.monotonic()
+    if _lag['checked_at'] is None or now - _lag['checked_at'] >= LAG_CHECK_SECONDS:
+        lag = replica_lag()
+        _lag['usable'] = lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+        _lag['checked_at'] = now
+    return _lag['usable']
+
+
+@contextmanager
+def reporting():
+    """Lets the reads of this thread go to the replica for the duration of the block."""
+    previous = getattr(_state, 'reporting', None), getattr(_state, 'wrote', False)
+    _state.reporting, _state.wrote = True, False
+    try:
+        yield
+    finally:
+        _state.reporting, _state.wrote = previous
+
+
+def reporting_queryset(queryset):
+    """`queryset` fixed to the database reporting() would read it from now."""
+    with reporting():
+        return queryset.using(queryset.db)
+
+
+class ReplicaRouter:
+    """
+    Reads inside reporting() go to the replica while it is usable; writes
+    never do, even for objects read from it. Both aliases hold the same
+    rows, so objects from either may be related to each other.
+    """
+
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'reporting', False) and not _state.wrote and replica_usable():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        if getattr(_state, 'reporting', False):
+            _state.wrote = True
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == REPLICA:
+            return 'default'  # saving an object that was read from the replica
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {'default', REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica follows the primary's schema through replication
+        return False if db == REPLICA else None
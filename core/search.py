@@ -0,0 +1,92 @@
+"""
+Product search for the session page.
+
+On PostgreSQL the name is matched with ILIKE, served by a pg_trgm GIN index
+(see migration 0020), and ranked by trigram similarity. Other databases use
+a per-process prefix index over the words of product names, rebuilt when the
+catalog version changes. Either way stock is read fresh for the matches only.
+"""
+import re
+from collections import defaultdict
+
+from django.db import connection
+
+from .caching import get_barcode_map, get_catalog_version
+from .models import Product
+
+RESULT_LIMIT = 10
+MAX_PREFIX = 12  # longer query words are matched on their first MAX_PREFIX chars
+
+_WORD = re.compile(r'\w+')
+
+# This process' prefix -> product ids index and the catalog version it reflects
+_index = {'version': None, 'prefixes': {}, 'names': {}}
+
+
+def _words(text):
+    return _WORD.findall(text.casefold())
+
+
+def _build_index():
+    prefixes = defaultdict(set)
+    names = {}
+    for pk, name in Product.objects.values_list('id', 'name'):
+        names[pk] = name
+        for word in _words(name):
+            for length in range(1, min(len(word), MAX_PREFIX) + 1):
+                prefixes[word[:length]].add(pk)
+    return prefixes, names
+
+
+def _prefix_search(query, limit):
+    version = get_catalog_version()
+    if _index['version'] != version:
+        _index['prefixes'], _index['names'] = _build_index()
+        _index['version'] = version
+
+    words = _words(query)
+    if not words:
+        return []
+    matches = None
+    for word in words:
+        ids = _index['prefixes'].get(word[:MAX_PREFIX], set())
+        matches = ids if matches is None else matches & ids
+        if not matches:
+            return []
+
+    # Names starting with the query first, then alphabetical
+    needle = query.casefold().strip()
+    names = _index['names']
+    return sorted(matches, key=lambda pk: (not names[pk].casefold().startswith(needle), names[pk].casefold()))[:limit]
+
+
+def _trigram_search(query, limit):
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    return list(
+        Product.objects.filter(name__icontains=query)
+        .annotate(similarity=TrigramSimilarity('name', query))
+        .order_by('-similarity', 'name')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def search_products(query, limit=RESULT_LIMIT):
+    """Top matching products as dicts with their current stock."""
+    query = query.strip()
+    if not query:
+        return []
+
+    barcode_match = get_barcode_map().get(query)
+    if barcode_match is not None:
+        ids = [barcode_match]
+    elif connection.vendor == 'postgresql':
+        ids = _trigram_search(query, limit)
+    else:
+        ids = _prefix_search(query, limit)
+
+    products = Product.objects.only('id', 'name', 'price', 'stock').in_bulk(ids)
+    return [
+        {'id': pk, 'name': products[pk].name, 'price': str(products[pk].price), 'stock': products[pk].stock}
+        for pk in ids if pk in products
+    ]
@@ -0,0 +1,62 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching
+from .stock import check_low_stock, sync_low_stock
+from .models import Bill, Product, Resource, SessionItem, Shift, TariffRule
+
+
+@receiver(pre_save, sender=Bill)
+def bill_saving(sender, instance, **kwargs):
+    # A bill moved to another shift in the admin changes the old shift's report too
+    instance._previous_shift_id = (
+        Bill.objects.filter(pk=instance.pk).values_list('shift_id', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Bill)
+def bill_changed(sender, instance, **kwargs):
+    Shift.invalidate_report(instance.shift_id)
+    previous = getattr(instance, '_previous_shift_id', None)
+    if previous != instance.shift_id:
+        Shift.invalidate_report(previous)
+
+
+@receiver([post_save, post_delete], sender=SessionItem)
+def session_item_changed(sender, instance, **kwargs):
+    # Items of a running session are not billed yet, so no report can hold them.
+    # The POS views load the session anyway; others may not, and then the bill tells.
+    if SessionItem.session.field.is_cached(instance) and instance.session.is_active:
+        return
+    # Only items of an already billed session affect a closed shift's report
+    shift_id = Bill.objects.filter(session_id=instance.session_id).values_list('shift_id', flat=True).first()
+    Shift.invalidate_report(shift_id)
+
+
+@receiver([post_save, post_delete], sender=Shift)
+def shift_changed(sender, instance, **kwargs):
+    caching.invalidate_active_shift()
+
+
+@receiver([post_save, post_delete], sender=Resource)
+def resource_changed(sender, instance, **kwargs):
+    caching.invalidate_resources()
+
+
+@receiver([post_save, post_delete], sender=TariffRule)
+def tariff_changed(sender, instance, **kwargs):
+    caching.invalidate_tariffs()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, update_fields=None, **kwargs):
+    if kwargs['signal'] is post_save:
+        # Every single-product stock change ends in a save; bulk UPDATEs sync themselves
+        if instance.get_deferred_fields() & {'stock', 'reorder_level', 'is_low_stock'}:
+            sync_low_stock([instance.pk])
+        else:
+            check_low_stock(instance)
+    # Selling or restocking only touches `stock`, which the catalog doesn't hold
+    if update_fields is not None and set(update_fields) == {'stock'}:
+        return
+    caching.invalidate_catalog()
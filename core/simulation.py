@@ -0,0 +1,203 @@
+"""
+What-if pricing of past table sessions under draft tariff plans.
+
+Closed sessions of a date range are loaded with their pauses in one joined
+query and laid out as NumPy arrays: the start minute of the week, the billed
+length and the pause credit windows. A tariff table becomes a running total
+of money over the week, so the price of any interval is G(end) - G(start),
+found for all sessions at once with searchsorted. Each plan costs a few
+array passes, whatever the number of sessions.
+
+Sessions already moved to the archive (core/archive.py) are not included.
+"""
+from datetime import datetime
+
+import numpy as np
+from django.utils import timezone
+
+from .billing import PAUSE_CREDIT_MINUTES
+from .models import Resource, Session
+from .tariffs import FLAT, WEEK_MINUTES, compile_plan
+
+# 1970-01-01 was a Thursday: the first Monday starts 4 days into the epoch
+EPOCH_MONDAY_MINUTES = 4 * 24 * 60
+
+
+def load_sessions(start, end):
+    """
+    Closed, billed table sessions that started in [start, end), as arrays.
+    Returns a dict with per-session arrays (resource id, start minute of the
+    week, billed length in minutes, local start hour, billed table revenue)
+    and per-credit-window arrays (session index, start minute of the week,
+    length).
+    """
+    rows = list(
+        Session.objects.filter(
+            is_active=False, resource__isnull=False, bill__isnull=False, end_time__isnull=False,
+            start_time__gte=start, start_time__lt=end,
+        )
+        .order_by('pk')
+        .values_list(
+            'pk', 'resource_id', 'start_time', 'end_time', 'mode', 'prepaid_minutes',
+            'bill__charge_overtime', 'bill__time_amount', 'bill__discount_amount',
+            'pauses__paused_at', 'pauses__resumed_at',
+        )
+    )
+    if not rows:
+        return None
+
+    # One row per pause (or one row for a session without pauses)
+    pks = np.array([row[0] for row in rows], dtype=np.int64)
+    _, first, session_of_row = np.unique(pks, return_index=True, return_inverse=True)
+    sessions = [rows[i] for i in first]
+
+    resource_ids = np.array([row[1] for row in sessions], dtype=np.int64)
+    starts = _epoch_minutes([row[2] for row in sessions])
+    ends = _epoch_minutes([row[3] for row in sessions])
+    prepaid = np.array([row[5] or 0 for row in sessions], dtype=float)
+    # Prepaid sessions closed without overtime were billed for the prepaid time only
+    fixed = np.array([row[4] == 'PREPAID' and not row[6] for row in sessions])
+    lengths = np.where(fixed, prepaid, np.maximum(ends - starts, 0))
+    billed = np.array([float(row[7] - row[8]) for row in sessions])
+
+    offsets = _utc_offsets(starts)
+    local_starts = starts + offsets
+    week_starts = np.mod(local_starts - EPOCH_MONDAY_MINUTES, WEEK_MINUTES)
+    hours = np.floor_divide(np.mod(local_starts, 24 * 60), 60).astype(int)
+
+    # Credit windows: the first PAUSE_CREDIT_MINUTES of each pause, inside the session
+    has_pause = np.array([row[9] is not None for row in rows])
+    pause_rows = np.flatnonzero(has_pause)
+    credit_session = session_of_row[pause_rows]
+    paused_at = _epoch_minutes([rows[i][9] for i in pause_rows])
+    resumed_at = _epoch_minutes([rows[i][10] or rows[i][3] for i in pause_rows])
+    credit_end = np.minimum.reduce([resumed_at, paused_at + PAUSE_CREDIT_MINUTES, ends[credit_session]])
+    keep = (credit_end > paused_at) & ~fixed[credit_session]
+    credit_session = credit_session[keep]
+    credit_start = paused_at[keep]
+    credit_length = credit_end[keep] - credit_start
+    credit_week_starts = np.mod(credit_start + offsets[credit_session] - EPOCH_MONDAY_MINUTES, WEEK_MINUTES)
+
+    return {
+        'resource_ids': resource_ids,
+        'week_starts': week_starts,
+        'lengths': lengths,
+        'hours': hours,
+        'billed': billed,
+        'credit_session': credit_session,
+        'credit_week_starts': credit_week_starts,
+        'credit_lengths': credit_length,
+    }
+
+
+def _epoch_minutes(moments):
+    return np.array([moment.timestamp() / 60 for moment in moments], dtype=float)
+
+
+def _utc_offsets(epoch_minutes):
+    """Club-time UTC offset in minutes for each moment, looked up once per distinct hour."""
+    hours, inverse = np.unique(np.floor_divide(epoch_minutes, 60), return_inverse=True)
+    tz = timezone.get_current_timezone()
+    offsets = np.array([
+        datetime.fromtimestamp(hour * 3600, tz).utcoffset().total_seconds() / 60
+        for hour in hours.tolist()
+    ])
+    return offsets[inverse]
+
+
+class WeeklyPrefix:
+    """
+    Running totals of a TariffTable over one week: money of the rule-priced
+    minutes and the count of minutes left at the table's own price.
+    """
+
+    def __init__(self, table):
+        self.starts = np.array(table.starts, dtype=float)
+        widths = np.diff(np.append(self.starts, WEEK_MINUTES))
+        self.per_minute = np.array([0 if rate is None else float(rate) / 60 for rate in table.rates])
+        self.is_base = np.array([rate is None for rate in table.rates], dtype=float)
+        self.money = np.concatenate([[0], np.cumsum(self.per_minute * widths)])
+        self.base_minutes = np.concatenate([[0], np.cumsum(self.is_base * widths)])
+
+    def _at(self, t):
+        weeks, within = np.divmod(t, WEEK_MINUTES)
+        k = np.searchsorted(self.starts, within, side='right') - 1
+        offset = within - self.starts[k]
+        money = weeks * self.money[-1] + self.money[k] + self.per_minute[k] * offset
+        base = weeks * self.base_minutes[-1] + self.base_minutes[k] + self.is_base[k] * offset
+        return money, base
+
+    def price(self, week_starts, lengths, base_per_minute):
+        """Money for intervals starting at `week_starts` and lasting `lengths` minutes."""
+        money_start, base_start = self._at(week_starts)
+        money_end, base_end = self._at(week_starts + lengths)
+        return (money_end - money_start) + (base_end - base_start) * base_per_minute
+
+
+def price_plan(data, tables, resources):
+    """
+    Table revenue of every session under `tables` (resource type -> table).
+    `resources` maps resource id to (type, price_per_hour).
+    """
+    ids = data['resource_ids']
+    base_per_minute = np.array([float(resources[pk][1]) / 60 for pk in ids.tolist()])
+    types = np.array([resources[pk][0] for pk in ids.tolist()])
+    credit_session = data['credit_session']
+
+    revenue = np.zeros(len(ids))
+    for kind in np.unique(types).tolist():
+        prefix = WeeklyPrefix(tables.get(kind, FLAT))
+        mask = types == kind
+        revenue[mask] = prefix.price(data['week_starts'][mask], data['lengths'][mask], base_per_minute[mask])
+
+        credit_mask = mask[credit_session]
+        sessions = credit_session[credit_mask]
+        credit = prefix.price(
+            data['credit_week_starts'][credit_mask], data['credit_lengths'][credit_mask], base_per_minute[sessions]
+        )
+        np.subtract.at(revenue, sessions, credit)
+    return revenue
+
+
+def simulate(start, end, plans):
+    """
+    Table revenue of the sessions started in [start, end): as billed, under
+    the tariffs in force ('') and under each plan in `plans`.
+    Returns {'sessions', 'plans', 'totals', 'resources', 'hours'} where the
+    breakdowns are lists of (label, {'billed': x, plan: y, ...}).
+    """
+    data = load_sessions(start, end)
+    columns = ['billed', '', *plans]
+    if data is None:
+        return {'sessions': 0, 'plans': columns, 'totals': dict.fromkeys(columns, 0), 'resources': [], 'hours': []}
+
+    resources, names = {}, {}
+    for pk, kind, price, name in Resource.objects.filter(
+        pk__in=np.unique(data['resource_ids']).tolist()
+    ).values_list('pk', 'type', 'price_per_hour', 'name'):
+        resources[pk] = (kind, price)
+        names[pk] = name
+    revenue = {'billed': data['billed']}
+    for plan in ['', *plans]:
+        revenue[plan] = price_plan(data, compile_plan(plan), resources)
+
+    resource_index, resource_of_session = np.unique(data['resource_ids'], return_inverse=True)
+    by_resource = {column: np.bincount(resource_of_session, revenue[column], len(resource_index)) for column in columns}
+    by_hour = {column: np.bincount(data['hours'], revenue[column], 24) for column in columns}
+
+    def rounded(values):
+        return {column: round(float(values[column]), 2) for column in columns}
+
+    return {
+        'sessions': len(data['lengths']),
+        'plans': columns,
+        'totals': rounded({column: revenue[column].sum() for column in columns}),
+        'resources': [
+            (names[pk], rounded({column: by_resource[column][i] for column in columns}))
+            for i, pk in enumerate(resource_index.tolist())
+        ],
+        'hours': [
+            (f"{hour:02d}:00", rounded({column: by_hour[column][hour] for column in columns}))
+            for hour in range(24) if any(by_hour[column][hour] for column in columns)
+        ],
+    }
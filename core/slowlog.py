@@ -0,0 +1,182 @@
+"""
+Slow-query log.
+
+MetricsMiddleware runs every request inside watch(), which times each
+statement on every database alias (default, replica, clubs) with execute
+wrappers pushed for the request and popped after it. The club fan-out
+(core/consolidated.py) watches its worker threads' connections the same way.
+Statements slower than SLOW_QUERY_MS are written to the `core.slowlog` logger
+as one JSON line with their SQL, parameters, view and calling frame. The
+EXPLAIN plan (EXPLAIN ANALYZE for SELECTs on Postgres) is captured by a
+background thread, so the request that ran the query does not wait for it.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('core.slowlog')
+
+_context = threading.local()
+_queue = queue.Queue(maxsize=200)
+_worker = None
+_worker_lock = threading.Lock()
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+PROJECT_ROOT = str(settings.BASE_DIR)
+# Our own instrumentation frames never explain where a query came from
+SKIP_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'middleware.py'),
+}
+
+
+def set_view(view_name):
+    """Called by the middleware once the URL is resolved."""
+    _context.view = view_name
+
+
+def clear_view():
+    _context.view = None
+
+
+def current_view():
+    return getattr(_context, 'view', None)
+
+
+def _calling_frame():
+    """Innermost project frame (not Django, not our middleware) that led to the query."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename in SKIP_FILES or 'site-packages' in filename:
+            continue
+        if filename.startswith(PROJECT_ROOT):
+            return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+def _wrapper(alias):
+    def wrapper(execute, sql, params, many, context):
+        if getattr(_context, 'explaining', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            if ms >= settings.SLOW_QUERY_MS:
+                _report({
+                    'ts': timezone.now().isoformat(),
+                    'ms': round(ms, 2),
+                    'db': alias,
+                    'sql': sql,
+                    'params': [repr(p)[:200] for p in params] if params and not many else None,
+                    'many': many,
+                    'view': getattr(_context, 'view', None),
+                    'frame': _calling_frame(),
+                    '_params': params if not many else None,
+                })
+    return wrapper
+
+
+def _report(record):
+    _ensure_worker()
+    try:
+        _queue.put_nowait(record)
+    except queue.Full:
+        # Never make the request wait for the log; keep the entry, skip the plan
+        record['plan'] = 'skipped: explain queue full'
+        record.pop('_params', None)
+        logger.warning(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def _explain(record):
+    sql = record['sql']
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    if record['many'] or verb not in EXPLAINABLE:
+        return None
+    is_select = verb in ('SELECT', 'WITH')
+
+    connection = connections[record['db']]
+    if connection.vendor == 'postgresql':
+        # ANALYZE runs the statement again, only do that for reads
+        prefix = 'EXPLAIN (ANALYZE, FORMAT TEXT) ' if is_select else 'EXPLAIN '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, record['_params'])
+        return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+
+
+def _work():
+    _context.explaining = True
+    while True:
+        record = _queue.get()
+        try:
+            try:
+                record['plan'] = _explain(record)
+            except Exception as exc:
+                record['plan'] = f'error: {exc}'
+            finally:
+                connections[record['db']].close_if_unusable_or_obsolete()
+            record.pop('_params', None)
+            logger.warning(json.dumps(record, ensure_ascii=False, default=str))
+        finally:
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='slowlog-explain', daemon=True)
+            _worker.start()
+
+
+@contextmanager
+def watch(aliases=None):
+    """Logs the slow statements run by this thread inside the block, on `aliases` (default: all)."""
+    if getattr(settings, 'SLOW_QUERY_MS', 0) <= 0:
+        yield
+        return
+    with ExitStack() as stack:
+        for alias in aliases or connections:
+            # Wrappers live on this thread's connection objects, which connect lazily
+            stack.enter_context(connections[alias].execute_wrapper(_wrapper(alias)))
+        yield
+
+
+def drain():
+    """Waits until every queued statement has been explained and logged."""
+    _queue.join()
+
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint(sql):
+    """Normalises literals and placeholder lists so equal statements group together."""
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
@@ -0,0 +1,274 @@
+"""
+Bulk stock operations: deliveries/write-offs and stocktakes, plus the
+low-stock state that every stock change feeds.
+
+StockMovement.save() re-reads and saves its Product for every row, which is
+fine for one correction but not for a 60-line delivery. Here all rows are
+validated first, the movements are written with bulk_create and stock is
+moved with aggregated UPDATEs, all inside one transaction.
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Product, StockAlert, StockCount, StockCountLine, StockMovement
+
+BULK_TYPES = ('addition', 'waste')
+
+# The reorder list suggests refilling to this many times the threshold
+REORDER_TARGET_FACTOR = 2
+
+
+def parse_intake_text(text):
+    """
+    Reads "product;quantity[;comment]" lines, product being a name, barcode or id (CSV with ',' or ';').
+    A first line whose quantity is not a number is marked as a possible header,
+    resolve_rows() tells a header from a bad row.
+    Returns a list of {'line', 'product', 'quantity', 'comment', 'header'} dicts.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    try:
+        dialect = csv.Sniffer().sniff(text.splitlines()[0], delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    rows = []
+    for line_no, cells in enumerate(csv.reader(io.StringIO(text), dialect), start=1):
+        cells = [c.strip() for c in cells]
+        if not any(cells):
+            continue
+        rows.append({
+            'line': line_no,
+            'product': cells[0],
+            'quantity': cells[1] if len(cells) > 1 else '',
+            'comment': cells[2] if len(cells) > 2 else '',
+            'header': line_no == 1 and len(cells) > 1 and not cells[1].lstrip('-').isdigit(),
+        })
+    return rows
+
+
+def _find_products(keys):
+    """
+    Maps each key (exact product name, barcode, or numeric id) to its Product.
+    Returns (found, ambiguous), the latter being names shared by several products.
+    """
+    by_name = defaultdict(list)
+    for product in Product.objects.filter(name__in=keys):
+        by_name[product.name].append(product)
+    found = {name: products[0] for name, products in by_name.items() if len(products) == 1}
+    rest = [key for key in keys if key not in found]
+    if rest:
+        found.update({p.barcode: p for p in Product.objects.filter(barcode__in=rest)})
+    ids = {key: int(key) for key in keys if key not in found and key.isdigit()}
+    if ids:
+        by_id = Product.objects.in_bulk(ids.values())
+        for key, pk in ids.items():
+            if pk in by_id:
+                found[key] = by_id[pk]
+    ambiguous = {name for name, products in by_name.items() if len(products) > 1 and name not in found}
+    return found, ambiguous
+
+
+def resolve_rows(rows, allow_zero=False):
+    """
+    Turns parsed rows into (product, quantity, comment) triples.
+    A possible header is skipped unless it names a product, then it is a bad row.
+    Raises ValidationError listing every bad row.
+    """
+    products, ambiguous = _find_products({row['product'] for row in rows})
+    rows = [
+        row for row in rows
+        if not (row.get('header') and row['product'] not in products and row['product'] not in ambiguous)
+    ]
+    if not rows:
+        raise ValidationError("Нет строк для оформления.")
+
+    errors = []
+    resolved = []
+    for row in rows:
+        if row['product'] in ambiguous:
+            errors.append(f"Строка {row['line']}: несколько товаров называются «{row['product']}», укажите штрихкод или ID.")
+            continue
+        product = products.get(row['product'])
+        if product is None:
+            errors.append(f"Строка {row['line']}: товар «{row['product']}» не найден.")
+            continue
+        try:
+            quantity = int(row['quantity'])
+        except (TypeError, ValueError):
+            quantity = -1
+        if quantity < 0 or (quantity == 0 and not allow_zero):
+            errors.append(f"Строка {row['line']}: неверное количество «{row['quantity']}».")
+            continue
+        resolved.append((product, quantity, row.get('comment') or None))
+    if errors:
+        raise ValidationError(errors)
+    return resolved
+
+
+def bulk_intake(rows, shift, movement_type='addition'):
+    """
+    Books many stock movements at once; nothing is written if a row is bad.
+    Returns (movements created, products touched).
+    """
+    if movement_type not in BULK_TYPES:
+        raise ValidationError("Массово можно оформить только приход или списание.")
+
+    movements = [
+        StockMovement(product=product, shift=shift, quantity=quantity, type=movement_type, comment=comment)
+        for product, quantity, comment in resolve_rows(rows)
+    ]
+
+    sign = 1 if movement_type == 'addition' else -1
+    deltas = defaultdict(int)
+    for movement in movements:
+        deltas[movement.product_id] += sign * movement.quantity
+
+    with transaction.atomic():
+        # bulk_create skips StockMovement.save(), stock is moved below in one go
+        StockMovement.objects.bulk_create(movements, batch_size=500)
+        for product_id, delta in deltas.items():
+            Product.objects.filter(pk=product_id).update(stock=Coalesce(F('stock'), 0) + delta)
+        sync_low_stock(deltas)
+
+    return len(movements), len(deltas)
+
+
+def record_counts(count, entries):
+    """
+    Stores counted quantities of an open stocktake, a later count of the same
+    product replaces the earlier one. `entries` are (product, quantity, _) triples.
+    Expected stock is read for all products in one query.
+    """
+    if count.status != 'open':
+        raise ValidationError("Инвентаризация уже проведена.")
+    counted = {product.pk: quantity for product, quantity, _comment in entries}
+    stock = dict(Product.objects.filter(pk__in=counted).values_list('pk', 'stock'))
+    existing = {line.product_id: line for line in count.lines.filter(product_id__in=counted)}
+    now = timezone.now()
+
+    new_lines, changed = [], []
+    for product_id, quantity in counted.items():
+        line = existing.get(product_id)
+        if line is None:
+            line = StockCountLine(count=count, product_id=product_id)
+            new_lines.append(line)
+        else:
+            changed.append(line)
+        line.counted = quantity
+        line.expected = stock.get(product_id) or 0
+        line.counted_at = now
+
+    with transaction.atomic():
+        StockCountLine.objects.bulk_create(new_lines)
+        StockCountLine.objects.bulk_update(changed, ['counted', 'expected', 'counted_at'])
+    return len(counted)
+
+
+def commit_stock_count(count, shift):
+    """
+    Applies every line's variance (counted - expected) to the current stock
+    with a single UPDATE, and writes a correction movement per mismatched
+    line for the history. Returns the number of corrected products.
+    """
+    with transaction.atomic():
+        count = StockCount.objects.select_for_update().get(pk=count.pk)
+        if count.status != 'open':
+            raise ValidationError("Инвентаризация уже проведена.")
+
+        lines = list(count.lines.exclude(counted=F('expected')).select_related('product'))
+        if lines:
+            Product.objects.filter(pk__in=[line.product_id for line in lines]).update(
+                stock=Coalesce(F('stock'), 0) + Case(
+                    *[When(pk=line.product_id, then=Value(line.variance)) for line in lines],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+            # Audit trail only: bulk_create skips StockMovement.save(), stock is already moved
+            StockMovement.objects.bulk_create([
+                StockMovement(
+                    product_id=line.product_id,
+                    shift=shift,
+                    quantity=line.counted,
+                    type='correction',
+                    comment=f"{count}: было {line.expected}, посчитано {line.counted} ({line.variance:+d})",
+                )
+                for line in lines
+            ])
+            sync_low_stock([line.product_id for line in lines])
+
+        count.status = 'committed'
+        count.committed_at = timezone.now()
+        count.save(update_fields=['status', 'committed_at'])
+    return len(lines)
+
+
+def _is_low(stock, reorder_level):
+    return reorder_level is not None and (stock or 0) <= reorder_level
+
+
+def _set_low_stock(product_id, stock, reorder_level, low):
+    """
+    Flips the flag only if it still has the other value, so concurrent
+    changes raise or resolve at most one alert per transition.
+    """
+    if not Product.objects.filter(pk=product_id, is_low_stock=not low).update(is_low_stock=low):
+        return
+    if low:
+        StockAlert.objects.create(product_id=product_id, stock=stock or 0, reorder_level=reorder_level)
+    else:
+        StockAlert.objects.filter(product_id=product_id, resolved_at=None).update(resolved_at=timezone.now())
+
+
+def check_low_stock(product):
+    """
+    Called after a product's stock was saved. Uses the instance's own values,
+    so the usual case (no threshold, or no state change) costs no query.
+    """
+    low = _is_low(product.stock, product.reorder_level)
+    if low != product.is_low_stock:
+        _set_low_stock(product.pk, product.stock, product.reorder_level, low)
+        product.is_low_stock = low
+
+
+def sync_low_stock(product_ids):
+    """Same as check_low_stock for products changed by a queryset UPDATE."""
+    rows = Product.objects.filter(pk__in=list(product_ids)).values_list('pk', 'stock', 'reorder_level', 'is_low_stock')
+    for pk, stock, reorder_level, is_low_stock in rows:
+        low = _is_low(stock, reorder_level)
+        if low != is_low_stock:
+            _set_low_stock(pk, stock, reorder_level, low)
+
+
+def reorder_list(day):
+    """
+    Products to reorder for `day` (a local date): everything low right now
+    plus whatever raised an alert that day, with sales of the day and the
+    quantity that brings stock back to twice its threshold. One query.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = start + timedelta(days=1)
+    alerted = StockAlert.objects.filter(product=OuterRef('pk'), created_at__gte=start, created_at__lt=end)
+    stock = Coalesce(F('stock'), 0)
+    return (
+        Product.objects
+        .filter(Q(is_low_stock=True) | Exists(alerted))
+        .annotate(
+            sold=Coalesce(Sum('sessionitem__quantity', filter=Q(
+                sessionitem__session__start_time__gte=start,
+                sessionitem__session__start_time__lt=end,
+            )), 0),
+            to_order=Greatest(Coalesce(F('reorder_level'), 0) * REORDER_TARGET_FACTOR - stock, 0),
+        )
+        .order_by('-is_low_stock', 'name')
+    )
@@ -0,0 +1,175 @@
+"""
+Time-of-day table pricing.
+
+The active TariffRules of a resource type are compiled into a weekly
+interval table: the sorted minutes of the week (Monday 00:00 = 0) at which
+the rate changes, and the rate in force from each of them. Pricing a played
+interval finds its first segment with a bisect and then steps once per
+tariff boundary it crosses. Compiled tables live in process memory and are
+rebuilt when the tariff version changes, like the barcode map.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .caching import get_tariff_version
+from .models import Bill, SessionPause, TariffRule
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+
+# This process' compiled tables by resource type and the tariff version they reflect
+_tables = {'version': None, 'tables': {}}
+
+
+class TariffTable:
+    """
+    starts[i] is the minute of the week from which rates[i] (per hour) and
+    names[i] apply, until starts[i + 1]. A rate of None means the table's own
+    price. starts[0] is always 0.
+    """
+    __slots__ = ('starts', 'rates', 'names')
+
+    def __init__(self, starts, rates, names):
+        self.starts = starts
+        self.rates = rates
+        self.names = names
+
+    def segment_at(self, minute):
+        return bisect_right(self.starts, minute) - 1
+
+    def split(self, start, end):
+        """Yields (minutes, rate, name) for each tariff segment the interval start-end crosses."""
+        position = minute_of_week(start)
+        remaining = (end - start).total_seconds() / 60
+        while remaining > 1e-9:
+            i = self.segment_at(position)
+            boundary = self.starts[i + 1] if i + 1 < len(self.starts) else WEEK_MINUTES
+            step = min(remaining, boundary - position)
+            yield step, self.rates[i], self.names[i]
+            remaining -= step
+            position = boundary % WEEK_MINUTES
+
+
+FLAT = TariffTable([0], [None], [''])
+
+
+def minute_of_week(moment):
+    local = timezone.localtime(moment)
+    return (
+        local.weekday() * DAY_MINUTES + local.hour * 60 + local.minute
+        + (local.second + local.microsecond / 1e6) / 60
+    )
+
+
+def _spans(rule):
+    """The rule's [start, end) minutes of the week; a span past Sunday midnight wraps to Monday."""
+    begin = rule.start_time.hour * 60 + rule.start_time.minute
+    end = rule.end_time.hour * 60 + rule.end_time.minute
+    length = (end - begin) % DAY_MINUTES or DAY_MINUTES
+    for day in sorted(set(rule.weekdays)):
+        start = int(day) * DAY_MINUTES + begin
+        stop = start + length
+        if stop <= WEEK_MINUTES:
+            yield start, stop
+        else:
+            yield start, WEEK_MINUTES
+            yield 0, stop - WEEK_MINUTES
+
+
+def compile_table(rules):
+    """Weekly TariffTable for `rules`; the highest priority (then the newest) rule wins an overlap."""
+    spans = [(start, stop, rule) for rule in rules for start, stop in _spans(rule)]
+    if not spans:
+        return FLAT
+    bounds = sorted({0, WEEK_MINUTES, *(s for s, _, _ in spans), *(e for _, e, _ in spans)})
+
+    starts, rates, names = [], [], []
+    for low, high in zip(bounds, bounds[1:]):
+        best = max(
+            (rule for start, stop, rule in spans if start <= low and high <= stop),
+            key=lambda rule: (rule.priority, rule.pk or 0),
+            default=None,
+        )
+        rate, name = (best.price_per_hour, best.name) if best else (None, '')
+        if starts and rates[-1] == rate and names[-1] == name:
+            continue
+        starts.append(low)
+        rates.append(rate)
+        names.append(name)
+    return TariffTable(starts, rates, names)
+
+
+def compile_plan(plan=''):
+    """Compiled tables of a tariff plan by resource type; '' is the plan in force."""
+    rules = defaultdict(list)
+    for rule in TariffRule.objects.filter(is_active=True, plan=plan):
+        rules[rule.resource_type].append(rule)
+    return {kind: compile_table(kind_rules) for kind, kind_rules in rules.items()}
+
+
+def get_table(resource_type):
+    """Compiled table of `resource_type`. All types are recompiled together after any rule change."""
+    version = get_tariff_version()
+    if _tables['version'] != version:
+        _tables['tables'] = compile_plan()
+        _tables['version'] = version
+    return _tables['tables'].get(resource_type, FLAT)
+
+
+def rate_at(resource, moment=None):
+    """Hourly price of `resource` at `moment` (default now)."""
+    table = get_table(resource.type)
+    rate = table.rates[table.segment_at(minute_of_week(moment or timezone.now()))]
+    return resource.price_per_hour if rate is None else rate
+
+
+def prepaid_amount(resource, minutes, moment=None):
+    """Price of `minutes` sold in advance: the till converts money to minutes at the rate in force."""
+    return (Decimal(str(rate_at(resource, moment))) * minutes / 60).quantize(Decimal('0.01'))
+
+
+def tally(table, intervals, base_rate):
+    """
+    Minutes per (tariff name, hourly rate) over (start, end) intervals, in
+    the order the tariffs were first met.
+    """
+    minutes = {}
+    for start, end in intervals:
+        if end <= start:
+            continue
+        for length, rate, name in table.split(start, end):
+            key = (name, Decimal(str(base_rate if rate is None else rate)))
+            minutes[key] = minutes.get(key, 0) + length
+    return minutes
+
+
+def reprice_shift(shift):
+    """
+    What the shift's closed table sessions would cost under the current
+    tariffs, next to what was billed. Bills are not changed: their lines are
+    what the guest paid. Three queries for the whole shift.
+    Returns (bill, new_total) pairs.
+    """
+    from .billing import bill_lines, bill_totals
+
+    bills = list(
+        Bill.objects.filter(shift=shift, session__resource__isnull=False)
+        .select_related('session__resource')
+        .order_by('closed_at')
+    )
+    pauses = defaultdict(list)
+    for session_id, paused_at, resumed_at in SessionPause.objects.filter(
+        session__bill__shift=shift
+    ).values_list('session_id', 'paused_at', 'resumed_at'):
+        pauses[session_id].append((paused_at, resumed_at))
+
+    result = []
+    for bill in bills:
+        session = bill.session
+        end = session.end_time or bill.closed_at
+        totals = bill_totals(bill_lines(session, end, pauses[session.pk], [], charge_overtime=bill.charge_overtime))
+        result.append((bill, totals['total_amount'] + bill.items_amount))
+    return result
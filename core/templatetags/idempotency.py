@@ -0,0 +1,14 @@
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from core.idempotency import KEY_FIELD
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_key():
+    """Hidden field with a fresh key: every render of a form is one intended action."""
+    return format_html('<input type="hidden" name="{}" value="{}">', KEY_FIELD, uuid.uuid4().hex)
@@ -1,3 +1,1232 @@
-from django.test import TestCase
+import csv
+import importlib
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from io import StringIO
+from unittest import mock
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, billing, exports, forecast, metrics, middleware, replica, search, simulation, slowlog, tariffs
+from .caching import ACTIVE_SHIFT_KEY, get_active_shift
+from .clubs import ClubRouter, using_club
+from .consolidated import network_summary
+from .occupancy import utilisation_by_hour_of_week
+from .replica import REPLICA, ReplicaRouter, replica_lag, replica_usable, reporting
+from .stock import bulk_intake, commit_stock_count, parse_intake_text, record_counts, reorder_list
+from .models import ArchivedBill, Bill, Club, CashLedgerEntry, IdempotencyKey, Product, ReplicaHeartbeat, Resource, ResourceUsage, Session, SessionItem, SessionPause, Shift, StockAlert, StockCount, StockMovement, TariffRule
+
+
+def _create_club(test):
+    cache.clear()
+    Club.objects.get_or_create(code=settings.CLUB_CODE, defaults={'name': 'Test'})
+    test.user = User.objects.create_superuser('boss', 'boss@example.com', 'pw')
+    test.shift = Shift.objects.create(user=test.user, start_cash=Decimal('1000'))
+    test.table = Resource.objects.create(name='T1', type='billiard', price_per_hour=600)
+    test.session = Session.objects.create(resource=test.table, shift=test.shift, created_by=test.user)
+    Session.objects.filter(pk=test.session.pk).update(start_time=timezone.now() - timedelta(minutes=30))
+    test.session.refresh_from_db()
+
+
+class SessionTransitionTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+
+    def test_double_close_bills_once(self):
+        url = reverse('core:close_session', args=[self.session.pk])
+        self.client.post(url)
+        first = Session.objects.get(pk=self.session.pk)
+        self.client.post(url)
+
+        self.assertEqual(Bill.objects.filter(session=self.session).count(), 1)
+        self.assertEqual(CashLedgerEntry.objects.filter(kind='bill').count(), 1)
+        self.assertEqual(Session.objects.get(pk=self.session.pk).end_time, first.end_time)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.cash_balance, Bill.objects.get().total_amount)
+
+    def test_stale_instance_cannot_close_again(self):
+        stale = Session.objects.get(pk=self.session.pk)
+        self.assertIsNotNone(billing.close_session(self.session, self.shift))
+        self.assertIsNone(billing.close_session(stale, self.shift))
+        self.assertEqual(Bill.objects.count(), 1)
+
+    def test_close_all_then_close_one(self):
+        self.assertEqual(len(billing.close_all_sessions(self.shift)), 1)
+        self.assertIsNone(billing.close_session(self.session, self.shift))
+        self.assertEqual(Bill.objects.count(), 1)
+
+    def test_double_pause_creates_one_pause(self):
+        url = reverse('core:toggle_pause', args=[self.session.pk])
+        self.client.post(url, {'action': 'pause'})
+        self.client.post(url, {'action': 'pause'})
+        self.assertEqual(SessionPause.objects.filter(session=self.session).count(), 1)
+
+        self.client.post(url, {'action': 'resume'})
+        self.client.post(url, {'action': 'resume'})
+        self.assertFalse(Session.objects.get(pk=self.session.pk).is_paused)
+        self.assertFalse(SessionPause.objects.filter(resumed_at__isnull=True).exists())
+
+    def test_closed_session_cannot_be_paused_or_extended(self):
+        billing.close_session(self.session, self.shift)
+        self.assertFalse(self.session.pause())
+        self.assertFalse(self.session.extend(30))
+        self.assertFalse(SessionPause.objects.exists())
+
+
+    def test_closed_session_takes_no_items(self):
+        product = Product.objects.create(name='Cola', price=100, stock=10)
+        url = reverse('core:add_item_to_session', args=[self.session.pk])
+        self.client.post(url, {'product_id': product.pk})
+        bill = billing.close_session(self.session, self.shift)
+        self.client.post(url, {'product_id': product.pk})
+
+        self.assertEqual(bill.items_amount, Decimal('100'))
+        self.assertEqual(SessionItem.objects.get(session=self.session).quantity, 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 9)
+
+class ParallelCloseTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        _create_club(self)
+
+    def test_parallel_closes_bill_exactly_once(self):
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def close():
+            try:
+                session = Session.objects.get(pk=self.session.pk)
+                barrier.wait()
+                results.append(billing.close_session(session, self.shift))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=close) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.THREADS)
+        self.assertEqual(sum(bill is not None for bill in results), 1)
+        self.assertEqual(Bill.objects.count(), 1)
+        self.assertEqual(CashLedgerEntry.objects.filter(kind='bill').count(), 1)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.cash_balance, Bill.objects.get().total_amount)
+
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.product = Product.objects.create(name='Cola', price=100, cost_price=60, stock=10)
+        SessionItem.objects.create(session=self.session, product=self.product, quantity=2, price_at_order=100)
+        self.session.pause()
+        self.bill = billing.close_session(self.session, self.shift)
+        self.shift.close(Decimal('1000'), at=timezone.now() - timedelta(days=100))
+
+    def test_archived_bill_keeps_lines_and_items(self):
+        lines = list(self.bill.lines.values_list('kind', 'description', 'quantity', 'unit_price', 'amount'))
+        self.assertEqual(archive.archive_shift(self.shift), 1)
+
+        self.assertFalse(Bill.objects.exists())
+        self.assertFalse(Session.objects.exists())
+        archived = ArchivedBill.objects.get()
+        self.assertEqual(archived.pk, self.bill.pk)
+        self.assertEqual(archived.total_amount, self.bill.total_amount)
+        payload = archived.payload
+        self.assertEqual(
+            [(l['kind'], l['description'], Decimal(l['quantity']), Decimal(l['unit_price']), Decimal(l['amount']))
+             for l in payload['lines']],
+            lines,
+        )
+        self.assertEqual(payload['items'], [{'product': 'Cola', 'quantity': 2, 'price_at_order': '100.00'}])
+        self.assertEqual(len(payload['pauses']), 1)
+        self.assertEqual(Decimal(payload['items_amount']), Decimal('200'))
+
+    def test_report_totals_survive_archiving(self):
+        report = self.shift.get_shift_report()
+        archive.archive_shift(self.shift)
+        shift = Shift.objects.get(pk=self.shift.pk)
+        self.assertEqual(shift.get_shift_report(), report)
+        self.assertEqual(shift.get_report_data()['products'][0]['total_qty'], 2)
+
+    def test_only_old_closed_shifts_are_archived_once(self):
+        young = Shift.objects.create(user=self.user, start_cash=0)
+        young.close(Decimal('0'))
+        active = Shift.objects.create(user=self.user, start_cash=0)
+        self.assertEqual(list(archive.archivable_shifts(90)), [self.shift])
+        self.assertNotIn(active, archive.archivable_shifts(0))
+
+        out = StringIO()
+        call_command('archive_shifts', days=90, stdout=out)
+        call_command('archive_shifts', days=90, stdout=out)
+        self.assertIn("перенесено счетов: 1", out.getvalue())
+        self.assertIn("перенесено счетов: 0", out.getvalue())
+        self.assertEqual(ArchivedBill.objects.count(), 1)
+        self.assertIsNone(Shift.objects.get(pk=young.pk).archived_at)
+
+class SingleActiveShiftTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+
+    def test_second_shift_is_refused(self):
+        response = self.client.post(reverse('core:start_shift'), {'start_cash': '500'})
+        self.assertRedirects(response, reverse('core:dashboard'), fetch_redirect_response=False)
+        self.assertEqual(Shift.objects.filter(is_active=True).count(), 1)
+
+    def test_close_then_start(self):
+        billing.close_session(self.session, self.shift)
+        self.client.post(reverse('core:close_shift'), {'end_cash': '1000'})
+        self.assertFalse(self.shift.close(Decimal('0')))
+        self.client.post(reverse('core:start_shift'), {'start_cash': '500'})
+        self.assertEqual(Shift.objects.get(is_active=True).start_cash, Decimal('500'))
+
+
+    def test_cached_shift_is_dropped_after_commit(self):
+        self.assertEqual(get_active_shift(), self.shift)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.shift.record_cash('cash_in', 50)
+                # Still cached: a request now would re-cache the uncommitted balance
+                self.assertIsNotNone(cache.get(ACTIVE_SHIFT_KEY))
+        self.assertIsNone(cache.get(ACTIVE_SHIFT_KEY))
+        self.assertEqual(get_active_shift().cash_balance, Decimal('50'))
+
+    def test_close_shift_reads_the_drawer_from_the_database(self):
+        billing.close_session(self.session, self.shift)
+        cache.set(ACTIVE_SHIFT_KEY, Shift.objects.get(pk=self.shift.pk))
+        self.shift.record_cash('cash_in', 50)  # on_commit never runs in a TestCase
+
+        response = self.client.get(reverse('core:close_shift'))
+        self.shift.refresh_from_db()
+        self.assertEqual(response.context['expected_cash'], self.shift.expected_cash)
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(name='Cola', price=100, stock=10)
+        self.url = reverse('core:add_item_to_session', args=[self.session.pk])
+
+    def test_replayed_key_adds_once(self):
+        data = {'product_id': self.product.pk, 'idempotency_key': 'tap-1'}
+        first = self.client.post(self.url, data)
+        with CaptureQueriesContext(connection) as queries:
+            replay = self.client.post(self.url, data)
+
+        # Only the key is looked up; the view itself does not run
+        self.assertFalse([q for q in queries if '"core_' in q['sql'] and '"core_idempotencykey"' not in q['sql']])
+        self.assertEqual(replay['Idempotent-Replay'], 'true')
+
+        self.assertEqual(replay.status_code, first.status_code)
+        self.assertEqual(replay['Location'], first['Location'])
+        self.assertEqual(SessionItem.objects.get(session=self.session).quantity, 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+    def test_new_key_adds_again(self):
+        self.client.post(self.url, {'product_id': self.product.pk, 'idempotency_key': 'tap-1'})
+        self.client.post(self.url, {'product_id': self.product.pk, 'idempotency_key': 'tap-2'})
+        self.assertEqual(SessionItem.objects.get(session=self.session).quantity, 2)
+
+    def test_expired_key_runs_again(self):
+        data = {'product_id': self.product.pk, 'idempotency_key': 'tap-1'}
+        self.client.post(self.url, data)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.client.post(self.url, data)
+        self.assertEqual(SessionItem.objects.get(session=self.session).quantity, 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+class ParallelIdempotencyTests(TransactionTestCase):
+    THREADS = 4
+
+    def setUp(self):
+        _create_club(self)
+        self.product = Product.objects.create(name='Cola', price=100, stock=10)
+        self.url = reverse('core:add_item_to_session', args=[self.session.pk])
+
+    def test_parallel_taps_add_once(self):
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def tap():
+            try:
+                client = Client()
+                client.force_login(self.user)
+                barrier.wait()
+                response = client.post(self.url, {'product_id': self.product.pk, 'idempotency_key': 'tap-1'})
+                statuses.append((response.status_code, response.has_header('Idempotent-Replay')))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=tap) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [(302, False)] + [(302, True)] * (self.THREADS - 1))
+        self.assertEqual(SessionItem.objects.get(session=self.session).quantity, 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 9)
+
+
+class BillLineTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+        product = Product.objects.create(name='Cola', price=100, stock=10)
+        SessionItem.objects.create(session=self.session, product=product, quantity=2)
+        now = timezone.now()
+        SessionPause.objects.create(session=self.session)
+        SessionPause.objects.filter(session=self.session).update(
+            paused_at=now - timedelta(minutes=20), resumed_at=now - timedelta(minutes=10)
+        )
+
+    def test_close_stores_lines_and_subtotals(self):
+        self.client.post(reverse('core:close_session', args=[self.session.pk]))
+        bill = Bill.objects.get()
+
+        self.assertEqual([line.kind for line in bill.lines.all()], ['time', 'discount', 'item'])
+        self.assertEqual(sum(line.amount for line in bill.lines.all()), bill.total_amount)
+        self.assertEqual(bill.discount_amount, Decimal('50.00'))
+        self.assertEqual(bill.items_amount, Decimal('200.00'))
+        self.assertEqual(bill.total_amount, bill.table_amount + bill.items_amount)
+
+        response = self.client.get(reverse('core:bill_summary', args=[self.session.pk]))
+        self.assertContains(response, 'Пауза (бесплатно)')
+        response = self.client.get(reverse('admin:core_bill_change', args=[bill.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+class TariffTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        TariffRule.objects.create(
+            resource_type='billiard', name='Счастливые часы', start_time=time(12), end_time=time(14), price_per_hour=300
+        )
+        TariffRule.objects.create(
+            resource_type='billiard', name='Ночь', weekdays='6', start_time=time(22), end_time=time(2), price_per_hour=900
+        )
+
+    def _lines(self, start, end, pauses=()):
+        self.session.start_time = timezone.make_aware(start)
+        lines = billing.bill_lines(self.session, timezone.make_aware(end), [
+            (timezone.make_aware(paused_at), timezone.make_aware(resumed_at)) for paused_at, resumed_at in pauses
+        ], [])
+        return [(line.kind, line.quantity, line.amount) for line in lines]
+
+    def test_session_is_split_at_tariff_boundaries(self):
+        # Monday 11:00-13:00: one hour at the table's price, one in happy hour
+        self.assertEqual(self._lines(datetime(2026, 10, 19, 11), datetime(2026, 10, 19, 13)), [
+            ('time', Decimal('60.00'), Decimal('600.00')),
+            ('time', Decimal('60.00'), Decimal('300.00')),
+        ])
+
+    def test_night_rate_wraps_into_monday(self):
+        lines = self._lines(datetime(2026, 10, 25, 23), datetime(2026, 10, 26, 1))
+        self.assertEqual(lines, [('time', Decimal('120.00'), Decimal('1800.00'))])
+
+    def test_pause_credit_uses_the_rate_it_fell_under(self):
+        lines = self._lines(
+            datetime(2026, 10, 19, 11), datetime(2026, 10, 19, 13),
+            pauses=[(datetime(2026, 10, 19, 12, 30), datetime(2026, 10, 19, 12, 40))],
+        )
+        self.assertEqual(lines[-1], ('discount', Decimal('5.00'), Decimal('-25.00')))
+
+    def test_prepaid_time_costs_what_was_taken(self):
+        # An hour sold at 11:30 at the table's price, then half an hour sold in happy hour
+        Session.objects.filter(pk=self.session.pk).update(
+            mode='PREPAID', prepaid_minutes=60,
+            prepaid_amount=tariffs.prepaid_amount(self.table, 60, timezone.make_aware(datetime(2026, 10, 19, 11, 30))),
+        )
+        self.session.refresh_from_db()
+        self.session.extend(30, tariffs.prepaid_amount(self.table, 30, timezone.make_aware(datetime(2026, 10, 19, 12, 15))))
+        lines = self._lines(datetime(2026, 10, 19, 11, 30), datetime(2026, 10, 19, 13))
+        self.assertEqual(lines, [('time', Decimal('90.00'), Decimal('750.00'))])
+
+    def test_overtime_choice_is_kept_on_the_bill(self):
+        # Closed early (30 of 60 prepaid minutes played) but charged for the time played
+        Session.objects.filter(pk=self.session.pk).update(mode='PREPAID', prepaid_minutes=60)
+        self.session.refresh_from_db()
+        bill = billing.close_session(self.session, self.shift, charge_overtime=True)
+        self.assertTrue(bill.charge_overtime)
+        self.assertLess(bill.billed_minutes, 60)
+        [(repriced, total)] = tariffs.reprice_shift(self.shift)
+        self.assertEqual(total, bill.total_amount)
+
+    def test_rule_change_recompiles(self):
+        self.assertEqual(tariffs.rate_at(self.table, timezone.make_aware(datetime(2026, 10, 19, 13))), 300)
+        TariffRule.objects.filter(name='Счастливые часы').get().delete()
+        self.assertEqual(tariffs.rate_at(self.table, timezone.make_aware(datetime(2026, 10, 19, 13))), 600)
+
+    def test_simulation_matches_billing(self):
+        SessionPause.objects.create(session=self.session, paused_at=timezone.now())
+        SessionPause.objects.filter(session=self.session).update(paused_at=timezone.now() - timedelta(minutes=10))
+        bill = billing.close_session(self.session, self.shift)
+        TariffRule.objects.create(
+            resource_type='billiard', name='Дешево', start_time=time(0), end_time=time(0), price_per_hour=300, plan='draft'
+        )
+
+        result = simulation.simulate(self.session.start_time, timezone.now(), ['draft'])
+        self.assertEqual(result['sessions'], 1)
+        self.assertAlmostEqual(result['totals'][''], float(bill.table_amount), places=1)
+        self.assertAlmostEqual(result['totals']['draft'], float(bill.billed_minutes) * 5, places=1)
+
+
+def _copy_default_to(alias):
+    """Copies the default test database, schema and rows, into `alias`' SQLite file."""
+    connection.ensure_connection()
+    target = sqlite3.connect(connections.settings[alias]['NAME'])
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
+
+
+class SQLiteAliasesTestCase(TransactionTestCase):
+    """
+    Adds the SQLite aliases of `sqlite_aliases` (alias -> file) in a temporary
+    directory, and `unreachable_aliases` whose file cannot be opened.
+    """
+    sqlite_aliases = {}
+    unreachable_aliases = ()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        configs = {
+            alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.tmp.name, name)}
+            for alias, name in cls.sqlite_aliases.items()
+        }
+        for alias in cls.unreachable_aliases:
+            # As a mirror the test case never flushes it
+            configs[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.tmp.name, 'missing', f'{alias}.sqlite3'),
+                'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+            }
+        # configure_settings() fills in the defaults and insists on seeing 'default'
+        configs = connections.configure_settings({DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS], **configs})
+        for alias in cls._extra_aliases():
+            connections.settings[alias] = configs[alias]
+        # The runner picked the test databases before these existed, so they are allowed here
+        cls.databases = {*cls.databases, *cls._extra_aliases()}
+        super().setUpClass()
+
+    @classmethod
+    def _extra_aliases(cls):
+        return [*cls.sqlite_aliases, *cls.unreachable_aliases]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls._extra_aliases():
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.tmp.cleanup()
+
+
+class ClubTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+
+    def test_rows_belong_to_the_deployment_club(self):
+        self.assertEqual(self.table.club_id, settings.CLUB_CODE)
+        self.assertEqual(self.session.club_id, settings.CLUB_CODE)
+
+    @override_settings(CLUBS={'main': 'default', 'north': 'club_north'})
+    def test_router_follows_the_selected_club(self):
+        router = ClubRouter()
+        self.assertIsNone(router.db_for_read(Session))
+        with using_club('north'):
+            self.assertEqual(router.db_for_read(Session), 'club_north')
+            self.assertEqual(router.db_for_write(Product), 'club_north')
+            self.assertIsNone(router.db_for_read(User))
+        self.assertIsNone(router.db_for_write(Session))
+        with self.assertRaises(KeyError):
+            with using_club('south'):
+                pass
+
+
+class NetworkSummaryTests(SQLiteAliasesTestCase):
+    sqlite_aliases = {'club_north': 'north.sqlite3'}
+    unreachable_aliases = ('club_south',)
+
+    def setUp(self):
+        _create_club(self)
+        Club.objects.filter(code=settings.CLUB_CODE).update(name='Main')
+        self.bill = billing.close_session(self.session, self.shift)
+        # North is a copy of this club with its own name and a different bill
+        amounts = Bill.objects.filter(pk=self.bill.pk).values('total_amount', 'time_amount', 'items_amount', 'discount_amount').get()
+        Club.objects.create(code='north', name='North')
+        Bill.objects.update(total_amount=500, time_amount=600, items_amount=0, discount_amount=100)
+        _copy_default_to('club_north')
+        Club.objects.filter(code='north').delete()
+        Bill.objects.update(**amounts)
+
+    def test_merged_totals_and_unreachable_club(self):
+        clubs = {settings.CLUB_CODE: 'default', 'north': 'club_north', 'south': 'club_south'}
+        now = timezone.now()
+        with override_settings(CLUBS=clubs):
+            rows, total = network_summary(now - timedelta(days=1), now + timedelta(days=1))
+
+        self.assertEqual([row['name'] for row in rows], ['Main', 'North', 'south'])
+        main, north, south = rows
+        self.assertEqual((north['bills'], north['revenue'], north['table'], north['discount']),
+                         (1, Decimal('500'), Decimal('500'), Decimal('100')))
+        self.assertEqual((main['bills'], main['revenue']), (1, self.bill.total_amount))
+        self.assertIn('unable to open database file', south['error'])
+        self.assertNotIn('revenue', south)
+
+        self.assertEqual(total['bills'], 2)
+        self.assertEqual(total['revenue'], self.bill.total_amount + 500)
+        self.assertEqual(total['discount'], self.bill.discount_amount + 100)
+
+
+class ReplicaTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+
+    def test_reports_stay_on_the_primary_without_a_replica(self):
+        with reporting():
+            self.assertIsNone(ReplicaRouter().db_for_read(Product))
+            self.assertEqual(Session.objects.get(pk=self.session.pk)._state.db, 'default')
+
+    def test_objects_read_from_the_replica_are_saved_to_the_primary(self):
+        self.table._state.db = REPLICA
+        self.assertEqual(ReplicaRouter().db_for_write(Resource, instance=self.table), 'default')
+        self.table.name = 'T1 VIP'
+        self.table.save()
+        self.assertEqual(Resource.objects.get(pk=self.table.pk).name, 'T1 VIP')
+
+
+class ReplicaLagTests(SQLiteAliasesTestCase):
+    sqlite_aliases = {REPLICA: 'replica.sqlite3'}
+
+    def setUp(self):
+        _create_club(self)
+        self.product = Product.objects.create(name='Cola', price=100, stock=10)
+        replica._lag['checked_at'] = None
+
+    def test_in_sync(self):
+        _copy_default_to(REPLICA)
+        self.assertEqual(replica_lag(), float('inf'))  # no stamp on either side yet
+        _copy_default_to(REPLICA)
+        self.assertEqual(replica_lag(), 0)
+        self.assertTrue(replica_usable())
+        with reporting():
+            self.assertEqual(Product.objects.get(pk=self.product.pk)._state.db, REPLICA)
+
+    def test_stale(self):
+        ReplicaHeartbeat.objects.create(pk=1, beat_at=timezone.now() - timedelta(hours=1))
+        _copy_default_to(REPLICA)
+        self.assertEqual(replica_lag(), 0)  # holds the stamp the primary had
+        # Only the stock changed since the copy, the heartbeat still shows the replica behind
+        Product.objects.filter(pk=self.product.pk).update(stock=9)
+        self.assertGreater(replica_lag(), 3600)
+        self.assertFalse(replica_usable())
+        with reporting():
+            self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 9)
+
+
+class MissingReplicaTests(SQLiteAliasesTestCase):
+    unreachable_aliases = (REPLICA,)
+
+    def setUp(self):
+        _create_club(self)
+        replica._lag['checked_at'] = None
+
+    def test_unreachable_replica_is_not_used(self):
+        self.assertIsNone(replica_lag())
+        self.assertFalse(replica_usable())
+        with reporting():
+            self.assertEqual(Session.objects.get(pk=self.session.pk)._state.db, 'default')
+
+
+@override_settings(SLOW_QUERY_MS=0.000001)
+class SlowLogTests(SQLiteAliasesTestCase):
+    sqlite_aliases = {'club_north': 'north.sqlite3'}
+
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+
+    def test_wrapper_is_pushed_per_request(self):
+        with self.assertLogs('core.slowlog', 'WARNING') as logs:
+            for _ in range(3):
+                # CONN_MAX_AGE=0: a new connection for every request
+                connection.close()
+                logged = len(logs.records)
+                self.client.get(reverse('core:dashboard'))
+                self.assertEqual(connection.execute_wrappers, [])
+                slowlog.drain()
+                self.assertGreater(len(logs.records), logged)
+        self.assertIn('"view": "core:dashboard"', logs.output[-1])
+
+    def test_every_database_is_watched(self):
+        _copy_default_to('club_north')
+        with override_settings(CLUBS={settings.CLUB_CODE: 'default', 'north': 'club_north'}):
+            with self.assertLogs('core.slowlog', 'WARNING') as logs:
+                self.client.get(reverse('core:network_report'))
+                slowlog.drain()
+        north = [line for line in logs.output if '"db": "club_north"' in line]
+        self.assertTrue(north)
+        self.assertIn('"view": "core:network_report"', north[0])
+        self.assertEqual(connections['club_north'].execute_wrappers, [])
+
+
+class ReportInvalidationTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(name='Cola', price=100, stock=10)
+
+    def test_items_of_a_running_session_skip_the_bill_lookup(self):
+        url = reverse('core:add_item_to_session', args=[self.session.pk])
+        self.client.post(url, {'product_id': self.product.pk})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'product_id': self.product.pk})
+        self.assertFalse([q for q in queries if 'FROM "core_bill"' in q['sql']])
+
+    def test_moving_a_bill_clears_both_shift_reports(self):
+        bill = billing.close_session(self.session, self.shift)
+        self.shift.close(Decimal('0'))
+        other = Shift.objects.create(user=self.user, start_cash=0)
+        other.close(Decimal('0'))
+        for shift in (self.shift, other):
+            shift.get_report_data()  # stores the snapshot
+        self.assertEqual(Shift.objects.filter(report_snapshot__isnull=False).count(), 2)
+
+        bill.shift = other
+        bill.save()
+        self.assertFalse(Shift.objects.filter(report_snapshot__isnull=False).exists())
+
+
+class CashLedgerTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.bill = billing.close_session(self.session, self.shift)
+
+    def test_expected_cash_follows_the_ledger(self):
+        self.shift.record_cash('refund', 50)
+        self.shift.record_cash('cash_out', -200)  # the sign is the kind's, not the caller's
+        self.shift.record_cash('cash_in', 30)
+
+        expected = Decimal('1000') + self.bill.total_amount - 50 - 200 + 30
+        self.assertEqual(self.shift.expected_cash, expected)
+        self.assertEqual(Shift.objects.get(pk=self.shift.pk).cash_balance, self.shift.ledger.aggregate(s=Sum('amount'))['s'])
+        self.shift.close(expected - 10)
+        self.assertEqual(self.shift.discrepancy, Decimal('-10'))
+
+    def _migration(self, name):
+        return importlib.import_module(f'core.migrations.{name}')
+
+    def test_backfill_books_overlapping_shifts_once(self):
+        self.shift.close(Decimal('0'))
+        overlapping = Shift.objects.create(user=self.user, start_cash=0)
+        Shift.objects.filter(pk=overlapping.pk).update(start_time=self.shift.start_time - timedelta(hours=1))
+        overlapping.close(Decimal('0'))
+        CashLedgerEntry.objects.all().delete()
+
+        self._migration('0014_cash_ledger').backfill_ledger(django_apps, None)
+        entry = CashLedgerEntry.objects.get()
+        self.assertEqual((entry.shift_id, entry.amount), (self.shift.pk, self.bill.total_amount))
+        self.assertEqual(Shift.objects.get(pk=overlapping.pk).cash_balance, 0)
+
+    def test_backfill_books_the_drawer_open_at_close(self):
+        # The session was opened in a shift that had ended before its bill was closed
+        earlier = Shift.objects.create(user=self.user, start_cash=0, is_active=False)
+        Shift.objects.filter(pk=earlier.pk).update(
+            start_time=self.shift.start_time - timedelta(hours=8),
+            end_time=self.shift.start_time - timedelta(minutes=1),
+        )
+        Session.objects.filter(pk=self.session.pk).update(shift=earlier)
+        CashLedgerEntry.objects.all().delete()
+
+        self._migration('0014_cash_ledger').backfill_ledger(django_apps, None)
+        self.assertEqual(CashLedgerEntry.objects.get().shift_id, self.shift.pk)
+        self.assertEqual(Shift.objects.get(pk=earlier.pk).cash_balance, 0)
+
+class OccupancyTests(TestCase):
+    # A past week, Monday to Monday, club time
+    WEEK = datetime(2025, 10, 20)
+
+    def setUp(self):
+        _create_club(self)
+        self.session.usages.all().delete()
+        self.other = Resource.objects.create(name='T2', type='billiard', price_per_hour=600)
+
+    def _at(self, days=0, hours=0, minutes=0):
+        return timezone.make_aware(self.WEEK + timedelta(days=days, hours=hours, minutes=minutes))
+
+    def _use(self, resource, start, end):
+        ResourceUsage.objects.create(resource=resource, started_at=start, ended_at=end)
+
+    def _heatmap(self, weeks=1):
+        return utilisation_by_hour_of_week(self._at(), self._at(days=7 * weeks))
+
+    def test_overlapping_segments_are_counted_once(self):
+        self._use(self.table, self._at(hours=10), self._at(hours=11))
+        self._use(self.table, self._at(hours=10, minutes=30), self._at(hours=11, minutes=30))
+        monday = self._heatmap()[self.table.pk][0]
+        self.assertEqual(monday[10], 1)
+        self.assertEqual(monday[11], 0.5)
+        self.assertEqual(sum(map(sum, self._heatmap()[self.table.pk])), 1.5)
+
+    def test_segment_across_the_week_boundary(self):
+        # Sunday 23:30 to Monday 00:30, inside a two-week range
+        self._use(self.table, self._at(days=6, hours=23, minutes=30), self._at(days=7, minutes=30))
+        matrix = self._heatmap(weeks=2)[self.table.pk]
+        self.assertEqual(matrix[6][23], 0.25)
+        self.assertEqual(matrix[0][0], 0.25)
+
+    def test_range_longer_than_a_week(self):
+        # Eight days busy out of a fourteen-day range: Mondays twice, every other hour once
+        self._use(self.table, self._at(), self._at(days=8))
+        matrix = self._heatmap(weeks=2)[self.table.pk]
+        self.assertEqual(matrix[0], [1] * 24)
+        for day in matrix[1:]:
+            self.assertEqual(day, [0.5] * 24)
+
+    def test_moved_session_is_split_between_tables(self):
+        now = timezone.now()
+        self.session.open_usage(self.table, now - timedelta(minutes=40))
+        self.session.move_to(self.other)
+
+        # Over exactly one week every hour-of-week is available for 3600 s
+        heatmap = utilisation_by_hour_of_week(timezone.now() - timedelta(weeks=1), timezone.now())
+        busy = {pk: sum(map(sum, matrix)) * 3600 for pk, matrix in heatmap.items()}
+        self.assertAlmostEqual(busy[self.table.pk], 40 * 60, delta=5)
+        self.assertAlmostEqual(busy.get(self.other.pk, 0), 0, delta=5)
+
+
+class StockCountTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.cola = Product.objects.create(name='Cola', price=100, cost_price=50, stock=10)
+        self.chips = Product.objects.create(name='Chips', price=80, cost_price=20, stock=5)
+        self.water = Product.objects.create(name='Water', price=50, cost_price=10, stock=3)
+        self.count = StockCount.objects.create(shift=self.shift)
+        record_counts(self.count, [(self.cola, 8, ''), (self.chips, 7, ''), (self.water, 3, '')])
+
+    def test_variance(self):
+        self.assertEqual(self.count.get_variance(), {
+            'lines': 3, 'mismatched': 2, 'shortage': -2, 'surplus': 2, 'value': Decimal('-60'),
+        })
+
+    def test_commit_corrects_stock_in_one_update(self):
+        Product.objects.filter(pk=self.cola.pk).update(stock=9)  # sold one after the count
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(commit_stock_count(self.count, self.shift), 2)
+        stock_updates = [q for q in queries if q['sql'].startswith('UPDATE "core_product" SET "stock"')]
+        self.assertEqual(len(stock_updates), 1)
+
+        stock = dict(Product.objects.values_list('name', 'stock'))
+        self.assertEqual(stock, {'Cola': 7, 'Chips': 7, 'Water': 3})
+        corrections = StockMovement.objects.filter(type='correction').order_by('product__name')
+        self.assertEqual([(m.product.name, m.quantity) for m in corrections], [('Chips', 7), ('Cola', 8)])
+        with self.assertRaises(ValidationError):
+            commit_stock_count(self.count, self.shift)
+
+    def test_admin_reports_a_count_committed_meanwhile(self):
+        self.client.force_login(self.user)
+
+        def committed_meanwhile(count, shift):
+            StockCount.objects.filter(pk=count.pk).update(status='committed')
+            return commit_stock_count(count, shift)
+
+        with mock.patch('core.admin.commit_stock_count', committed_meanwhile):
+            response = self.client.post(reverse('admin:core_stockcount_changelist'), {
+                'action': 'commit_counts', '_selected_action': [self.count.pk],
+            }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Инвентаризация уже проведена.")
+        self.assertFalse(StockMovement.objects.filter(type='correction').exists())
+
+
+class ForecastTests(TestCase):
+    TODAY = date(2025, 11, 3)  # a Monday; the history starts eight weeks before
+
+    def setUp(self):
+        _create_club(self)
+        self.cola = Product.objects.create(name='Cola', price=100, stock=10, reorder_level=4)
+        self.chips = Product.objects.create(name='Chips', price=80, stock=5, reorder_level=6)
+        self.water = Product.objects.create(name='Water', price=50, stock=None)
+        for days_ago in range(1, forecast.VELOCITY_DAYS + 1):
+            self._sell(self.cola, days_ago, 2)
+        self._sell(self.water, 1, 3)
+
+    def _sell(self, product, days_ago, units):
+        session = Session.objects.create(resource=self.table, shift=self.shift, created_by=self.user, is_active=False)
+        day = self.TODAY - timedelta(days=days_ago)
+        Session.objects.filter(pk=session.pk).update(start_time=timezone.make_aware(datetime.combine(day, time(12))))
+        # bulk_create leaves the stock alone, the products keep the levels set above
+        SessionItem.objects.bulk_create([
+            SessionItem(session=session, product=product, quantity=units, price_at_order=product.price),
+        ])
+
+    def test_sales_matrix(self):
+        product_ids, stock, reorder_level, sales = forecast.sales_matrix(self.TODAY)
+        self.assertEqual(product_ids.tolist(), [self.cola.pk, self.chips.pk, self.water.pk])
+        np.testing.assert_array_equal(stock, [10, 5, np.nan])
+        np.testing.assert_array_equal(reorder_level, [4, 6, 0])
+        self.assertEqual(sales.shape, (3, forecast.HISTORY_DAYS))
+        self.assertEqual(sales[0, :-forecast.VELOCITY_DAYS].sum(), 0)
+        self.assertTrue((sales[0, -forecast.VELOCITY_DAYS:] == 2).all())
+        self.assertEqual(sales[1].sum(), 0)
+        self.assertEqual(sales[2, -1], 3)
+        self.assertEqual(sales[2].sum(), 3)
+
+    def test_weekday_factors(self):
+        sales = np.zeros((3, 14))
+        sales[0, [0, 7]] = 10  # 20 units, all on Mondays: its own profile
+        sales[1, 1] = 1        # too little history: the catalog profile
+        factors = forecast.weekday_factors(sales, date(2025, 9, 8))
+        np.testing.assert_allclose(factors[0], [7, 0, 0, 0, 0, 0, 0])
+        np.testing.assert_allclose(factors[1], [10 / 1.5, 0.5 / 1.5, 0, 0, 0, 0, 0])
+        np.testing.assert_allclose(factors[2], factors[1])
+
+    def test_forecast(self):
+        result = forecast.forecast(self.TODAY)
+        np.testing.assert_allclose(result['velocity'], [2, 0, 3 / forecast.VELOCITY_DAYS])
+        # Cola sells 2 a day from 10, so the fifth day empties it; 10 days of demand plus the threshold
+        np.testing.assert_array_equal(result['days_left'], [4, np.nan, np.nan])
+        np.testing.assert_array_equal(result['suggested'], [20 + 4 - 10, 1, np.nan])
+
+    def test_refresh_stores_unknown_stock_as_no_forecast(self):
+        self.assertEqual(forecast.refresh_forecast(self.TODAY), 3)
+        rows = {
+            p.name: (p.sales_velocity, p.days_of_stock, p.suggested_order)
+            for p in Product.objects.all()
+        }
+        self.assertEqual(rows, {
+            'Cola': (2.0, 4, 14),
+            'Chips': (0.0, None, 1),
+            'Water': (0.11, None, None),
+        })
+
+
+class BulkIntakeTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.cola = Product.objects.create(name='Cola', price=100, stock=10, barcode='4600001')
+        self.chips = Product.objects.create(name='Chips', price=80, stock=None)
+
+    def test_intake_with_header(self):
+        rows = parse_intake_text("Товар;Количество;Комментарий\nCola;5;поставка\n\n4600001;2\nChips;3")
+        self.assertEqual(bulk_intake(rows, self.shift), (3, 2))
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {'Cola': 17, 'Chips': 3})
+        movements = StockMovement.objects.order_by('pk')
+        self.assertEqual([(m.product.name, m.quantity, m.comment) for m in movements],
+                         [('Cola', 5, 'поставка'), ('Cola', 2, None), ('Chips', 3, None)])
+
+        bulk_intake(parse_intake_text(f"{self.cola.pk},4"), self.shift, 'waste')
+        self.assertEqual(Product.objects.get(pk=self.cola.pk).stock, 13)
+
+    def test_bad_quantity_on_the_first_line_is_an_error(self):
+        with self.assertRaises(ValidationError) as raised:
+            bulk_intake(parse_intake_text("Cola;abc\nChips;2"), self.shift)
+        self.assertEqual(raised.exception.messages, ["Строка 1: неверное количество «abc»."])
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.chips.pk).stock, None)
+
+    def test_shared_name_is_an_error(self):
+        Product.objects.create(name='Cola', price=120, stock=0)
+        with self.assertRaises(ValidationError) as raised:
+            bulk_intake(parse_intake_text("Chips;1\nCola;2\nNope;1"), self.shift)
+        self.assertEqual(raised.exception.messages, [
+            "Строка 2: несколько товаров называются «Cola», укажите штрихкод или ID.",
+            "Строка 3: товар «Nope» не найден.",
+        ])
+        # The barcode still picks one of them
+        self.assertEqual(bulk_intake(parse_intake_text("4600001;2"), self.shift), (1, 1))
+        self.assertEqual(Product.objects.get(pk=self.cola.pk).stock, 12)
+
+
+class BarcodeScanTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+        self.cola = Product.objects.create(name='Cola', price=100, stock=10, barcode='4600001')
+        self.url = reverse('core:scan_barcode', args=[self.session.pk])
+
+    def test_hit(self):
+        response = self.client.post(self.url, {'code': ' 4600001 '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'ok': True, 'product': 'Cola', 'quantity': 1, 'item_total': '100.00', 'stock': 9,
+        })
+        # The map is built once per catalog version, a second scan does not look the code up
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'code': '4600001'})
+        self.assertFalse([q for q in queries if '"barcode" IS NULL' in q['sql']])
+        self.assertEqual(SessionItem.objects.get(session=self.session).quantity, 2)
+
+    def test_unknown_code(self):
+        response = self.client.post(self.url, {'code': '999'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'ok': False, 'error': "Штрихкод 999 не найден"})
+        self.assertFalse(SessionItem.objects.exists())
+
+    def test_map_follows_barcode_edit(self):
+        self.assertEqual(self.client.post(self.url, {'code': '4600001'}).status_code, 200)
+        self.cola.barcode = '4600002'
+        self.cola.save()
+        self.assertEqual(self.client.post(self.url, {'code': '4600001'}).status_code, 404)
+        self.assertEqual(self.client.post(self.url, {'code': '4600002'}).status_code, 200)
+
+    def test_blank_barcode_is_null(self):
+        first = Product.objects.create(name='Chips', price=80, stock=5, barcode='  ')
+        second = Product.objects.create(name='Water', price=50, stock=5, barcode='')
+        self.assertEqual(Product.objects.filter(pk__in=[first.pk, second.pk], barcode=None).count(), 2)
+        self.assertEqual(self.client.post(self.url, {'code': ''}).status_code, 404)
+
+
+class LowStockTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.cola = Product.objects.create(name='Cola', price=100, stock=10, reorder_level=3)
+        self.chips = Product.objects.create(name='Chips', price=80, stock=8, reorder_level=5)
+        self.water = Product.objects.create(name='Water', price=50, stock=2)  # no threshold
+
+    def test_flag_flips_on_the_crossing_only(self):
+        SessionItem.objects.create(session=self.session, product=self.cola, quantity=6)
+        self.assertFalse(StockAlert.objects.exists())
+        for _ in range(2):
+            SessionItem.objects.create(session=self.session, product=self.cola, quantity=1)
+
+        alert = StockAlert.objects.get()
+        self.assertEqual((alert.product_id, alert.stock, alert.reorder_level, alert.resolved_at),
+                         (self.cola.pk, 3, 3, None))
+        self.assertTrue(Product.objects.get(pk=self.cola.pk).is_low_stock)
+
+        self.cola.stock = 10
+        self.cola.save()
+        self.assertIsNotNone(StockAlert.objects.get().resolved_at)
+        self.assertFalse(Product.objects.get(pk=self.cola.pk).is_low_stock)
+
+    def test_bulk_paths_sync(self):
+        bulk_intake(parse_intake_text("Chips;4"), self.shift, 'waste')
+        self.assertTrue(Product.objects.get(pk=self.chips.pk).is_low_stock)
+        self.assertEqual(StockAlert.objects.filter(product=self.chips, resolved_at=None).count(), 1)
+
+        bulk_intake(parse_intake_text("Chips;10"), self.shift)
+        self.assertFalse(Product.objects.get(pk=self.chips.pk).is_low_stock)
+        self.assertFalse(StockAlert.objects.filter(resolved_at=None).exists())
+
+        count = StockCount.objects.create(shift=self.shift)
+        record_counts(count, [(self.chips, 1, '')])
+        commit_stock_count(count, self.shift)
+        self.assertTrue(Product.objects.get(pk=self.chips.pk).is_low_stock)
+        self.assertEqual(StockAlert.objects.filter(product=self.chips).count(), 2)
+        self.assertEqual(StockAlert.objects.filter(product=self.chips, resolved_at=None).count(), 1)
+
+    def test_reorder_list(self):
+        today = timezone.localdate()
+        Session.objects.filter(pk=self.session.pk).update(
+            start_time=timezone.make_aware(datetime.combine(today, time(12)))
+        )
+        self.session.refresh_from_db()
+        SessionItem.objects.create(session=self.session, product=self.cola, quantity=8)  # low: 2 left
+        bulk_intake(parse_intake_text("Chips;4"), self.shift, 'waste')  # alerted today...
+        bulk_intake(parse_intake_text("Chips;6"), self.shift)             # ...and refilled
+
+        rows = [(p.name, p.is_low_stock, p.sold, p.to_order) for p in reorder_list(today)]
+        self.assertEqual(rows, [('Cola', True, 8, 4), ('Chips', False, 0, 0)])
+        self.assertEqual(list(reorder_list(today - timedelta(days=1))), [self.cola])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+        cola = Product.objects.create(name='Cola', price=100, stock=10)
+        bulk_intake(parse_intake_text("Cola;5"), self.shift)
+        SessionItem.objects.create(session=self.session, product=cola, quantity=2)
+        self.bill = billing.close_session(self.session, self.shift)
+
+        # The same again ten days ago, all of it outside the exported range
+        old = timezone.now() - timedelta(days=10)
+        old_shift = Shift.objects.create(user=self.user, start_cash=0, is_active=False)
+        old_session = Session.objects.create(resource=self.table, shift=old_shift, created_by=self.user)
+        SessionItem.objects.create(session=old_session, product=cola, quantity=1)
+        old_bill = billing.close_session(old_session, old_shift)
+        bulk_intake(parse_intake_text("Cola;3"), old_shift)
+        Shift.objects.filter(pk=old_shift.pk).update(start_time=old)
+        Bill.objects.filter(pk=old_bill.pk).update(closed_at=old)
+        StockMovement.objects.filter(shift=old_shift).update(timestamp=old)
+
+    def _export(self, dataset):
+        today = timezone.localdate().isoformat()
+        response = self.client.get(reverse('core:export_csv', args=[dataset]), {'from': today, 'to': today})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'],
+                         f'attachment; filename="{dataset}_{today.replace("-", "")}_{today.replace("-", "")}.csv"')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(StringIO(content[1:])))
+
+    def test_datasets_in_range(self):
+        expected = {
+            'bills': 1,
+            'bill_lines': self.bill.lines.count(),
+            'session_items': 1,
+            'shifts': 1,
+            'stock_movements': 1,
+        }
+        self.assertEqual(set(expected), set(exports.DATASETS))
+        for dataset, count in expected.items():
+            with self.subTest(dataset=dataset):
+                header, *rows = self._export(dataset)
+                self.assertEqual(header, exports.DATASETS[dataset]()[1])
+                self.assertEqual(len(rows), count)
+
+        header, row = self._export('bills')
+        self.assertEqual((row[0], row[-1]), (str(self.bill.pk), str(self.bill.total_amount)))
+
+    def test_unknown_dataset(self):
+        self.assertEqual(self.client.get(reverse('core:export_csv', args=['users'])).status_code, 404)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        metrics._counters.clear()
+        metrics._histograms.clear()
+        self.process = metrics._identity()['id']
+
+    def _lines(self):
+        return metrics.render().splitlines()
+
+    def test_text_format(self):
+        metrics.inc('pos_requests_total', view='core:dashboard', status='2xx')
+        metrics.inc('pos_requests_total', 2, view='core:dashboard', status='2xx')
+        lines = self._lines()
+        at = lines.index('# TYPE pos_requests_total counter')
+        self.assertEqual(lines[at - 1], '# HELP pos_requests_total HTTP requests by view and status class')
+        self.assertEqual(
+            lines[at + 1],
+            f'pos_requests_total{{process="{self.process}",status="2xx",view="core:dashboard"}} 3',
+        )
+        self.assertIn('pos_active_sessions{mode="OPEN"} 1', lines)
+        self.assertIn(f'process_start_time_seconds{{process="{self.process}"}} '
+                      f'{metrics._number(metrics._identity()["started_at"])}', lines)
+
+    def test_histogram_buckets(self):
+        for seconds in (0.02, 3):
+            metrics.observe('pos_request_duration_seconds', seconds, view='v')
+        labels = f'process="{self.process}",view="v"'
+        lines = self._lines()
+        for bound, count in (('0.01', 0), ('0.025', 1), ('2.5', 1), ('5', 2), ('+Inf', 2)):
+            self.assertIn(f'pos_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}', lines)
+        self.assertIn(f'pos_request_duration_seconds_sum{{{labels}}} 3.02', lines)
+        self.assertIn(f'pos_request_duration_seconds_count{{{labels}}} 2', lines)
+
+    def test_every_process_is_its_own_series(self):
+        now = timezone.now().timestamp()
+        key = metrics._key('pos_print_jobs_total', {'status': 'ok'})
+        cache.set(metrics.PROCS_KEY, {'101-a': now, '102-b': now, '103-gone': now})
+        cache.set(metrics._proc_key('101-a'), {'started_at': 1000.0, 'counters': {key: 4}, 'histograms': {}})
+        cache.set(metrics._proc_key('102-b'), {'started_at': 2000.0, 'counters': {key: 1}, 'histograms': {}})
+        lines = self._lines()
+        self.assertIn('pos_print_jobs_total{process="101-a",status="ok"} 4', lines)
+        self.assertIn('pos_print_jobs_total{process="102-b",status="ok"} 1', lines)
+        self.assertIn('process_start_time_seconds{process="102-b"} 2000', lines)
+        self.assertFalse([line for line in lines if '103-gone' in line])
+
+    def test_restart_is_a_new_series(self):
+        metrics.inc('pos_print_jobs_total', status='ok')
+        metrics.flush(force=True)
+        metrics._process['pid'] = None  # as if the worker had been replaced
+        metrics._counters.clear()
+        lines = self._lines()
+        restarted = metrics._identity()['id']
+        self.assertNotEqual(restarted, self.process)
+        self.assertIn(f'pos_print_jobs_total{{process="{self.process}",status="ok"}} 1', lines)
+        self.assertFalse([line for line in lines if line.startswith(f'pos_print_jobs_total{{process="{restarted}"')])
+
+    def test_allowed_ips_only(self):
+        url = reverse('core:metrics')
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            response = self.client.get(url, REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(b'# TYPE pos_active_sessions gauge', response.content)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_server_timing_on_a_sampled_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:dashboard'))
+        total, db, tpl = response['Server-Timing'].split(', ')
+        self.assertRegex(total, r'^total;dur=\d+\.\d$')
+        self.assertRegex(db, rf'^db;dur=\d+\.\d;desc="{len(queries)} queries"$')
+        self.assertRegex(tpl, r'^tpl;dur=\d+\.\d$')
+        self.assertGreater(float(tpl.split('=')[1]), 0)
+
+        profile = middleware.recent[-1]
+        self.assertEqual((profile['path'], profile['view'], profile['status']), ('/', 'core:dashboard', 200))
+        self.assertEqual(profile['sql_count'], len(queries))
+        self.assertLessEqual(len(profile['slowest']), middleware.SLOWEST_KEPT)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_no_header_without_sampling(self):
+        response = self.client.get(reverse('core:dashboard'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_buffer_is_bounded(self):
+        self.assertEqual(middleware.recent.maxlen, settings.PERF_BUFFER_SIZE)
+        with mock.patch.object(middleware, 'recent', deque(maxlen=3)) as recent:
+            for _ in range(5):
+                self.client.get(reverse('core:perf'))
+            self.assertEqual(len(recent), 3)
+            self.assertEqual({r['view'] for r in recent}, {'core:perf'})
+
+    def test_perf_page_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('core:perf')).status_code, 200)
+        User.objects.create_user('till', 'till@example.com', 'pw')
+        self.client.force_login(User.objects.get(username='till'))
+        response = self.client.get(reverse('core:perf'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('admin:login'), response['Location'])
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        self.client.force_login(self.user)
+        for name in ('Pepsi Cola', 'Cola Zero', 'Coca Cola', 'Chips Lays', 'Cola Light'):
+            Product.objects.create(name=name, price=100, stock=10)
+
+    def _search(self, query):
+        response = self.client.get(reverse('core:product_search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.json()['results']]
+
+    def test_word_prefix(self):
+        self.assertEqual(self._search('lay'), ['Chips Lays'])
+        self.assertEqual(self._search('ola'), [])  # prefixes of words only
+        self.assertEqual(self._search('  '), [])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self._search('col ze'), ['Cola Zero'])
+        self.assertEqual(self._search('pep cola'), ['Pepsi Cola'])
+        self.assertEqual(self._search('chips cola'), [])
+
+    def test_names_starting_with_the_query_first(self):
+        self.assertEqual(self._search('co'), ['Coca Cola', 'Cola Light', 'Cola Zero', 'Pepsi Cola'])
+        self.assertEqual(self._search('cola'), ['Cola Light', 'Cola Zero', 'Coca Cola', 'Pepsi Cola'])
+
+    def test_result_limit(self):
+        for n in range(search.RESULT_LIMIT + 2):
+            Product.objects.create(name=f'Water {n:02d}', price=50, stock=1)
+        names = self._search('water')
+        self.assertEqual(len(names), search.RESULT_LIMIT)
+        self.assertEqual(names[0], 'Water 00')
+
+    def test_barcode(self):
+        zero = Product.objects.get(name='Cola Zero')
+        zero.barcode = '4600001'
+        zero.save()
+        self.assertEqual(self._search('4600001'), ['Cola Zero'])
+
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(self._search('chips'), ['Chips Lays'])
+        chips = Product.objects.get(name='Chips Lays')
+        chips.name = 'Nachos'
+        chips.save()
+        self.assertEqual(self._search('chips'), [])
+        self.assertEqual(self._search('nach'), ['Nachos'])
+
+    def test_stock_is_read_fresh(self):
+        self._search('pepsi')
+        Product.objects.filter(name='Pepsi Cola').update(stock=3)  # no catalog change
+        response = self.client.get(reverse('core:product_search'), {'q': 'pepsi'})
+        self.assertEqual(response.json()['results'][0]['stock'], 3)
+
+
+class BillShiftTests(TestCase):
+    def setUp(self):
+        _create_club(self)
+        # The session was opened in an earlier shift and is paid into this one
+        self.earlier = Shift.objects.create(user=self.user, start_cash=0, is_active=False)
+        Session.objects.filter(pk=self.session.pk).update(shift=self.earlier)
+        self.session.refresh_from_db()
+
+    def _migration(self, name):
+        return importlib.import_module(f'core.migrations.{name}')
+
+    def test_close_session_books_the_drawer_shift(self):
+        bill = billing.close_session(self.session, self.shift)
+        self.assertEqual(Bill.objects.get(pk=bill.pk).shift_id, self.shift.pk)
+
+    def test_close_all_sessions_sets_the_shift_on_bulk_bills(self):
+        t2 = Resource.objects.create(name='T2', type='billiard', price_per_hour=600)
+        Session.objects.create(resource=t2, shift=self.shift, created_by=self.user)
+        bills = billing.close_all_sessions(self.shift)
+        self.assertEqual(len(bills), 2)
+        self.assertEqual(set(Bill.objects.values_list('shift_id', flat=True)), {self.shift.pk})
+        self.assertEqual(
+            set(CashLedgerEntry.objects.filter(kind='bill').values_list('bill_id', 'shift_id')),
+            {(bill.pk, self.shift.pk) for bill in bills},
+        )
+
+    def test_backfill_takes_the_ledger_then_the_session(self):
+        paid = billing.close_session(self.session, self.shift)
+        t2 = Resource.objects.create(name='T2', type='billiard', price_per_hour=600)
+        unpaid = billing.close_session(
+            Session.objects.create(resource=t2, shift=self.earlier, created_by=self.user), None
+        )
+        Bill.objects.update(shift=None)
+
+        self._migration('0015_bill_shift').backfill_bill_shift(django_apps, None)
+        self.assertEqual(Bill.objects.get(pk=paid.pk).shift_id, self.shift.pk)  # from the ledger
+        self.assertEqual(Bill.objects.get(pk=unpaid.pk).shift_id, self.earlier.pk)  # from the session
+
+    def test_report_follows_the_bill_shift_not_the_time_window(self):
+        bill = billing.close_session(self.session, self.shift)
+        # Closed long before this shift started, still paid into it
+        Bill.objects.filter(pk=bill.pk).update(closed_at=self.shift.start_time - timedelta(days=1))
+        # Closed while this shift was open, but paid into another one
+        t2 = Resource.objects.create(name='T2', type='billiard', price_per_hour=600)
+        session = Session.objects.create(resource=t2, shift=self.shift, created_by=self.user)
+        Session.objects.filter(pk=session.pk).update(start_time=timezone.now() - timedelta(hours=1))
+        session.refresh_from_db()
+        other = billing.close_session(session, self.earlier)
+        self.assertGreater(other.total_amount, 0)
+
+        report = self.shift.get_shift_report()
+        self.assertEqual(report['total_revenue'], bill.total_amount)
+        self.assertEqual(self.earlier.get_shift_report()['total_revenue'], other.total_amount)
@@ -11,8 +11,11 @@ urlpatterns = [
     path('session/start/<int:resource_id>/', views.start_session, name='start_session'),
     path('session/<int:pk>/', views.session_detail, name='session_detail'),
     path('session/close/<int:pk>/', views.close_session, name='close_session'),
+    path('sessions/close-all/', views.close_all_sessions_view, name='close_all_sessions'),
     path('session/<int:pk>/bill/', views.bill_summary, name='bill_summary'),
     path('session/<int:session_pk>/add-item/', views.add_item_to_session, name='add_item_to_session'),
+    path('session/<int:session_pk>/scan/', views.scan_barcode, name='scan_barcode'),
+    path('products/search/', views.product_search, name='product_search'),
     path('item/remove/<int:item_id>/', views.remove_item_from_session, name='remove_item_from_session'),
     path('session/extend/<int:pk>/', views.extend_session, name='extend_session'),
     path('dashboard/api/', views.dashboard_api, name='dashboard_api'),
@@ -20,4 +23,11 @@ urlpatterns = [
     path('shift/close/', views.close_shift, name='close_shift'),
     path('session/<int:session_id>/print/', views.print_session_bill, name='print_session_bill'),
     path('session/<int:session_id>/pause/', views.toggle_pause, name='toggle_pause'),
+    path('session/<int:pk>/move/', views.move_session, name='move_session'),
+    path('reports/utilisation/', views.utilisation, name='utilisation'),
+    path('reports/clubs/', views.network_report, name='network_report'),
+    path('reports/reorder/', views.reorder_report, name='reorder'),
+    path('reports/export/<str:dataset>/', views.export_csv, name='export_csv'),
+    path('perf/', views.perf_report, name='perf'),
+    path('metrics', views.metrics_endpoint, name='metrics'),
 ]
\ No newline at end of file
@@ -4,13 +4,14 @@ import traceback
 from datetime import datetime
 from decimal import Decimal
 
-def print_receipt_58mm(session, items, grand_total, finish_time, duration_min):
+def print_receipt_58mm(session, bill, lines, finish_time):
     """
     Full printing function for Windows native Django.
-    Includes Pause Duration tracking and 5-minute cap logic.
+    Prints the bill lines as priced by core/billing.py (pause credit
+    included), so the receipt always matches the stored bill.
+    Returns True if the job reached the spooler.
     """
     printer_name = "xprinter"
-    PAUSE_LIMIT = 5 # Business rule: max 5 mins discount per pause
     
     # 1. Handle Timezone & Time Calculations
     try:
@@ -28,19 +29,9 @@ def print_receipt_58mm(session, items, grand_total, finish_time, duration_min):
         start_time_local = session.start_time
         current_time_local = datetime.now()
 
-    # 2. Calculate Total Discounted Pause Time
-    total_pause_mins = 0
-    pauses = session.pauses.all()
-    for pause in pauses:
-        if pause.resumed_at:
-            # min(actual duration, 5 mins)
-            diff = (pause.resumed_at - pause.paused_at).total_seconds() / 60
-            total_pause_mins += min(diff, PAUSE_LIMIT)
-        elif not session.is_active:
-            # If session closed while on pause
-            ref_time = session.end_time if session.end_time else datetime.now()
-            diff = (ref_time - pause.paused_at).total_seconds() / 60
-            total_pause_mins += min(diff, PAUSE_LIMIT)
+    # 2. Pause credit and products come straight from the bill lines
+    total_pause_mins = sum(line.quantity for line in lines if line.kind == 'discount')
+    item_lines = [line for line in lines if line.kind == 'item']
 
     try:
         # --- 3. Build ESC/POS Data ---
@@ -86,17 +77,16 @@ def print_receipt_58mm(session, items, grand_total, finish_time, duration_min):
             if total_pause_mins > 0:
                 raw_data += f"Пауза:   {int(total_pause_mins)} мин. (скидка)\n".encode('cp866')
             
-            raw_data += f"Чистое время: {duration_min} мин.\n".encode('cp866')
+            raw_data += f"Чистое время: {int(bill.billed_minutes)} мин.\n".encode('cp866')
+            raw_data += f"{'Стол':<20}{round(bill.table_amount):>10}\n".encode('cp866')
 
         # ITEMS TABLE (Products/Drinks)
-        for item in items:
-            t_price = item.total_price() if callable(item.total_price) else item.total_price
-            quantity = getattr(item, 'quantity', 1)
+        for line in item_lines:
             # Truncate name to fit 58mm paper (approx 30-32 chars per line)
-            name = item.product.name[:16]
+            name = line.description[:16]
             
-            item_line_left = f"{name} x{quantity}"
-            price_str = f"{round(t_price):>10}"
+            item_line_left = f"{name} x{int(line.quantity)}"
+            price_str = f"{round(line.amount):>10}"
             raw_data += f"{item_line_left:<20}{price_str}\n".encode('cp866')
 
         raw_data += (("-" * 30) + "\n").encode('cp866')
@@ -104,7 +94,7 @@ def print_receipt_58mm(session, items, grand_total, finish_time, duration_min):
         # TOTAL (Right Align + Bold)
         raw_data += b'\x1b\x61\x02'
         raw_data += b'\x1b\x45\x01' 
-        raw_data += f"К ОПЛАТЕ: {int(grand_total)} СОМ\n".encode('cp866')
+        raw_data += f"К ОПЛАТЕ: {int(bill.total_amount)} СОМ\n".encode('cp866')
         raw_data += b'\x1b\x45\x00' 
         
         # FOOTER (Center Align)
@@ -130,4 +120,7 @@ def print_receipt_58mm(session, items, grand_total, finish_time, duration_min):
 
     except Exception:
         print("Printing failed:")
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+        return False
+
+    return True
\ No newline at end of file
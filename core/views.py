@@ -1,39 +1,50 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Resource, Product, Session, SessionItem, Bill, Shift, SessionPause
+from .models import Resource, Product, Session, SessionItem, Bill, Shift, SessionPause, StockAlert
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.utils import timezone 
 from django.contrib import messages
-from decimal import Decimal
-from django.http import JsonResponse
+from decimal import Decimal, InvalidOperation
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from datetime import datetime, timedelta
 from .utils import print_receipt_58mm
+from .occupancy import utilisation_by_hour_of_week
+from . import exports
+from .caching import get_active_shift, get_resources, get_catalog, get_tiles_version, get_barcode_map
+from . import middleware as perf
+from . import metrics
+from .search import search_products
+from .stock import reorder_list
+from . import billing, tariffs
+from .idempotency import idempotent
+from .consolidated import network_summary
 # Create your views here.
 
+# Until favourites are marked, small catalogs are shown in full
+MENU_FALLBACK_SIZE = 30
 
 
 def print_session_bill(request, session_id):
     session = get_object_or_404(Session, id=session_id)
-    items = session.items.all()
-    
-    # Считаем товары
-    items_total = sum(item.total_price() if callable(item.total_price) else item.total_price for item in items)
-    
-    # Определяем время окончания (текущее или из базы)
-    finish_time = session.end_time if session.end_time else timezone.now()
-    
-    duration_min = 0
-    if session.start_time:
-        duration = finish_time - session.start_time
-        duration_min = int(max(0, duration.total_seconds() / 60))
-        price_per_minute = session.resource.price_per_hour / 60
-        time_cost = Decimal(duration_min) * price_per_minute
+    bill = Bill.objects.filter(session=session).first()
+    if bill:
+        lines = list(bill.lines.all())
     else:
-        time_cost = Decimal('0')
+        # Still running: print what it would cost if closed now
+        bill, lines = billing.preview_bill(session)
 
-    grand_total = int(items_total + time_cost)
-    
-    # Передаем всё в функцию печати (добавили duration_min и finish_time)
-    print_receipt_58mm(session, items, grand_total, finish_time, duration_min)
+    finish_time = session.end_time if session.end_time else timezone.now()
+
+    # Передаем всё в функцию печати: строки счета уже посчитаны
+    metrics.inc('pos_print_jobs_in_flight')
+    try:
+        printed = print_receipt_58mm(session, bill, lines, finish_time)
+    finally:
+        metrics.inc('pos_print_jobs_in_flight', -1)
+    metrics.inc('pos_print_jobs_total', status='ok' if printed else 'failed')
     
     # ЛОГИКА РЕДИРЕКТА:
     if not session.is_active or session.end_time:
@@ -44,16 +55,31 @@ def print_session_bill(request, session_id):
         return redirect('core:session_detail', pk=session.id)
 
 
+def _open_stock_alerts():
+    return list(
+        StockAlert.objects.filter(resolved_at=None).select_related('product').only(
+            'id', 'stock', 'reorder_level', 'created_at', 'product__name', 'product__stock'
+        )
+    )
+
+
+def _active_sessions_by_resource():
+    """All running table sessions in one query, keyed by resource id."""
+    sessions = Session.objects.filter(is_active=True, resource__isnull=False)
+    return {s.resource_id: s for s in sessions}
+
+
 @login_required
 def dashboard(request):
-    active_shift = Shift.objects.filter(is_active=True).first()
-    resources = Resource.objects.all()
+    active_shift = get_active_shift()
+    resources = get_resources()
     now = timezone.now()
     resources_with_sessions = []
     if not active_shift:
         return redirect('core:start_shift')
+    sessions = _active_sessions_by_resource()
     for r in resources:
-        session = r.current_session()
+        session = sessions.get(r.pk)
         is_overtime = False
         if session and session.mode == 'PREPAID' and session.prepaid_minutes:
             limit_time = session.start_time + timezone.timedelta(minutes=session.prepaid_minutes)
@@ -65,7 +91,13 @@ def dashboard(request):
             'is_overtime': is_overtime
         })
 
-    return render(request, 'core/dashboard.html', {'resources_with_sessions': resources_with_sessions})
+    return render(request, 'core/dashboard.html', {
+        'resources_with_sessions': resources_with_sessions,
+        'active_shift': active_shift,
+        'tiles_version': get_tiles_version(),
+        'stock_alerts': _open_stock_alerts(),
+        'has_active_sessions': bool(sessions) or Session.objects.filter(is_active=True).exists(),
+    })
 
 @login_required
 def resource_details(request, pk):
@@ -75,16 +107,18 @@ def resource_details(request, pk):
     
     return render(request, 'core/resource_details.html', {
         'resource': resource,
+        'current_rate': tariffs.rate_at(resource),
         'active_session': active_session # Changed to single object for easier template logic
     })
 
 
 @login_required
 @require_POST
+@idempotent
 def start_session(request, resource_id):
     if request.method == 'POST':
         resource = get_object_or_404(Resource, id=resource_id)
-        active_shift = Shift.objects.filter(is_active=True).first()
+        active_shift = get_active_shift()
         if not active_shift:
             messages.error(request, "Нельзя открыть стол без открытой смены!")
             return redirect('core:start_shift')
@@ -116,9 +150,11 @@ def start_session(request, resource_id):
             shift=active_shift,
             mode=mode,
             prepaid_minutes=prepaid_mins,
+            prepaid_amount=tariffs.prepaid_amount(resource, prepaid_mins) if prepaid_mins else None,
             is_active=True,
             start_time=timezone.now()
         )
+        new_session.open_usage(resource, new_session.start_time)
 
         messages.success(request, f"Session started for {resource.name}")
         return redirect('core:session_detail', pk=new_session.pk)
@@ -126,6 +162,7 @@ def start_session(request, resource_id):
     return redirect('core:dashboard')
 
 
+@idempotent
 def extend_session(request, pk):
     if request.method == "POST":
         session = get_object_or_404(Session, pk=pk, is_active=True)
@@ -134,9 +171,11 @@ def extend_session(request, pk):
         try:
             extra_minutes = int(extra_minutes)
             if extra_minutes > 0:
-                session.prepaid_minutes += extra_minutes
-                session.save()
-                messages.success(request, f"Сессия продлена на {extra_minutes} мин.")
+                amount = tariffs.prepaid_amount(session.resource, extra_minutes) if session.resource else 0
+                if session.extend(extra_minutes, amount):
+                    messages.success(request, f"Сессия продлена на {extra_minutes} мин.")
+                else:
+                    messages.error(request, "Сессия уже закрыта.")
             else:
                 messages.error(request, "Введите корректное количество минут.")
         except (ValueError, TypeError):
@@ -147,6 +186,7 @@ def extend_session(request, pk):
 
 
 @login_required
+@idempotent
 def remove_item_from_session(request, item_id):
     if request.method == "POST":
         item = get_object_or_404(SessionItem, id=item_id)
@@ -167,7 +207,7 @@ def remove_item_from_session(request, item_id):
 
             # 2. Always return exactly 1 to the stock
             product.stock += 1
-            product.save()
+            product.save(update_fields=['stock'])
 
             messages.success(request, message_text)
         else:
@@ -186,22 +226,16 @@ def session_detail(request, pk):
     billable_minutes_float = session.get_billable_minutes()
     duration_minutes_display = int(billable_minutes_float)
     
-    price_per_hour = Decimal(str(session.resource.price_per_hour))
-    price_per_minute = price_per_hour / Decimal(60)
     played_seconds = session.get_total_played_seconds() # Assuming you have this method
     # 2. Determine Cost based on Mode
     active_pause = session.pauses.filter(resumed_at__isnull=True).first()
     if active_pause:
         pause_duration = (now - active_pause.paused_at).total_seconds() / 60
         if pause_duration > 5:
-            active_pause.resumed_at = active_pause.paused_at + timezone.timedelta(minutes=5)
-            active_pause.save()
-            session.is_paused = False
-            session.save()
-            messages.info(request, "Пауза превысила 5 минут и была автоматически завершена.")
+            if session.resume(at=active_pause.paused_at + timezone.timedelta(minutes=5)):
+                messages.info(request, "Пауза превысила 5 минут и была автоматически завершена.")
 
     if session.mode == 'PREPAID' and session.prepaid_minutes:
-        billable_minutes = Decimal(session.prepaid_minutes)
         # For prepaid, overtime starts after (prepaid_mins + pause_credit)
         # But usually, clubs just stop the clock. Let's keep it simple:
         limit_time = session.start_time + timezone.timedelta(minutes=session.prepaid_minutes)
@@ -209,15 +243,16 @@ def session_detail(request, pk):
         is_expired = now >= limit_time
         overtime_minutes = max(0, duration_minutes_display - session.prepaid_minutes)
     else:
-        billable_minutes = Decimal(billable_minutes_float)
         remaining_seconds = 0
         is_expired = False
         overtime_minutes = 0
 
-    time_cost = billable_minutes * price_per_minute
+    # Priced exactly like the bill will be, tariffs and pause credit included
+    preview = billing.preview_bill(session, now)[0]
+    time_cost = preview.table_amount
     session_items = session.items.all().order_by('id')
-    product_total = sum(item.total_price() for item in session_items)
-    grand_total = time_cost + Decimal(product_total)
+    product_total = preview.items_amount
+    grand_total = preview.total_amount
 
     # To show the countdown/timer for the current pause in HTML
     
@@ -230,7 +265,9 @@ def session_detail(request, pk):
         "time_cost": round(time_cost, 2),
         "product_total": round(product_total, 2),
         "grand_total": round(grand_total, 2),
-        "products": Product.objects.all().order_by('name'),
+        "current_rate": tariffs.rate_at(session.resource, now) if session.resource else 0,
+        "products": _menu_products(),
+        "free_resources": Resource.objects.filter(is_active=True).exclude(sessions__is_active=True).order_by('name'),
         "remaining_seconds": int(remaining_seconds),
         "is_expired": is_expired,
         "overtime_minutes": overtime_minutes,
@@ -242,101 +279,144 @@ def session_detail(request, pk):
 def bill_summary(request, pk):
     session = get_object_or_404(Session, pk=pk)
     bill = get_object_or_404(Bill, session=session)
-    
-    # Calculate products based on existing items
-    session_items = session.items.all()
-    product_total = sum(item.total_price() for item in session_items)
-    
-    # Time cost is whatever is left in the total bill
-    time_cost = bill.total_amount - Decimal(product_total)
-    
-    # Billable minutes for display
-    duration_minutes = session.get_billable_minutes()
 
     return render(request, "core/bill_summary.html", {
         "session": session,
-        "duration_minutes": int(duration_minutes), 
-        "time_cost": round(time_cost, 2),
-        "session_items": session_items,
-        "grand_total": bill.total_amount,
+        "bill": bill,
+        "lines": bill.lines.all(),
     })
 
 @require_POST
 @login_required
+@idempotent
 def close_session(request, pk):
     session = get_object_or_404(Session, pk=pk)
     
     if session.is_active:
-        # 1. Handle Pauses
-        active_pause = session.pauses.filter(resumed_at__isnull=True).last()
-        if active_pause:
-            active_pause.resumed_at = timezone.now()
-            active_pause.save()
-
-        # 2. Fix the End Time (Stop the clock)
-        session.end_time = timezone.now()
-        session.is_active = False # Mark as finished
-        session.save()
-
-        # 3. Calculate Final Billable Data
-        billable_minutes = session.get_billable_minutes()
-        if session.mode == 'PREPAID' and request.POST.get('charge_overtime') != 'true':
-            billable_minutes = Decimal(session.prepaid_minutes)
-
-        price_per_min = Decimal(str(session.resource.price_per_hour)) / Decimal(60)
-        time_cost = Decimal(billable_minutes) * price_per_min
-        product_total = sum(item.total_price() for item in session.items.all())
-        final_total = time_cost + Decimal(product_total)
-
-        # 4. Create or Update the Bill
-        Bill.objects.update_or_create(
-            session=session,
-            defaults={'total_amount': round(final_total, 2)}
-        )
+        # The payment belongs to the shift that is open right now.
+        # A second click or terminal finds the session already closed and gets None.
+        drawer_shift = get_active_shift() or session.shift
+        billing.close_session(session, drawer_shift, charge_overtime=request.POST.get('charge_overtime') == 'true')
 
     # Redirect to summary
     return redirect('core:bill_summary', pk=session.pk)
 
+
 @require_POST
 @login_required
+@idempotent
+def close_all_sessions_view(request):
+    active_shift = get_active_shift()
+    if not active_shift:
+        messages.warning(request, "У вас нет активной смены.")
+        return redirect('core:dashboard')
+
+    bills = billing.close_all_sessions(active_shift, charge_overtime=request.POST.get('charge_overtime') == 'true')
+    total = sum((bill.total_amount for bill in bills), Decimal('0'))
+    messages.success(request, f"Закрыто столов: {len(bills)}, на сумму {total} сом")
+    return redirect('core:close_shift')
+
+@require_POST
+@login_required
+@idempotent
 def add_item_to_session(request, session_pk):
     session = get_object_or_404(Session, pk=session_pk)
     product = get_object_or_404(Product, id=request.POST.get('product_id'))
 
     if product.stock < 1:
+        metrics.inc('pos_stock_conflicts_total', reason='out_of_stock')
         messages.error(request, f"Товар '{product.name}' закончился!")
         return redirect('core:session_detail', pk=session.pk)
 
-    item, created = SessionItem.objects.get_or_create(
-        session=session,
-        product=product,
-        defaults={
-            'price_at_order': product.price,
-            'quantity': 0
-        }
-    )
-    
-    if item.price_at_order is None:
-        item.price_at_order = product.price
-        
-    item.quantity += 1
-    item.save()
-
-    product.stock -= 1
-    product.save()
+    if _add_product(session, product) is None:
+        messages.error(request, "Сессия уже закрыта")
+        return redirect('core:session_detail', pk=session.pk)
 
     messages.success(request, f"Добавлено: {product.name}")
     return redirect('core:session_detail', pk=session.pk)
 
 
+def _add_product(session, product):
+    """
+    Puts one unit of `product` on the session's tab and takes it from stock.
+    Returns None if the session has been closed: the session row is locked
+    first, so a concurrent close either waits for this item or has already
+    ended the session.
+    """
+    with transaction.atomic():
+        if not Session.objects.select_for_update().filter(pk=session.pk, is_active=True).exists():
+            return None
+        item, created = SessionItem.objects.get_or_create(
+            session=session,
+            product=product,
+            defaults={
+                'price_at_order': product.price,
+                'quantity': 0
+            }
+        )
+        item.session = session  # spares the item signal a lookup
+
+        if item.price_at_order is None:
+            item.price_at_order = product.price
+
+        item.quantity += 1
+        item.save()
+
+        product.stock -= 1
+        product.save(update_fields=['stock'])
+    return item
+
+
+@require_POST
+@login_required
+@idempotent
+def scan_barcode(request, session_pk):
+    """Scanner input: adds the product with this barcode to the session, answers in JSON."""
+    code = request.POST.get('code', '').strip()
+    product_id = get_barcode_map().get(code)
+    if product_id is None:
+        return JsonResponse({'ok': False, 'error': f"Штрихкод {code} не найден"}, status=404)
+
+    session = get_object_or_404(Session, pk=session_pk)
+    if not session.is_active:
+        return JsonResponse({'ok': False, 'error': "Сессия уже закрыта"}, status=409)
+
+    product = get_object_or_404(Product, pk=product_id)
+    if product.stock is None or product.stock < 1:
+        metrics.inc('pos_stock_conflicts_total', reason='out_of_stock')
+        return JsonResponse({'ok': False, 'error': f"Товар '{product.name}' закончился!"}, status=409)
+
+    item = _add_product(session, product)
+    if item is None:
+        return JsonResponse({'ok': False, 'error': "Сессия уже закрыта"}, status=409)
+    return JsonResponse({
+        'ok': True,
+        'product': product.name,
+        'quantity': item.quantity,
+        'item_total': str(item.total_price()),
+        'stock': product.stock,
+    })
+
+
+def _menu_products():
+    catalog = get_catalog()
+    return [p for p in catalog if p.is_favorite] or catalog[:MENU_FALLBACK_SIZE]
+
+
+@login_required
+def product_search(request):
+    return JsonResponse({'results': search_products(request.GET.get('q', ''))})
+
+
 @login_required
 def dashboard_api(request):
-    resources = Resource.objects.all()
+    resources = get_resources()
     now = timezone.now()
     data = []
 
+    sessions = _active_sessions_by_resource()
     for r in resources:
-        session = r.current_session()
+        session = sessions.get(r.pk)
         is_overtime = False
         if session and session.mode == 'PREPAID' and session.prepaid_minutes:
             limit_time = session.start_time + timezone.timedelta(minutes=session.prepaid_minutes)
@@ -348,24 +428,41 @@ def dashboard_api(request):
             'is_overtime': is_overtime,
         })
 
-    return JsonResponse({'resources': data})
+    alerts = [
+        {'id': a.id, 'product': a.product.name, 'stock': a.product.stock, 'reorder_level': a.reorder_level}
+        for a in _open_stock_alerts()
+    ]
+    return JsonResponse({'resources': data, 'stock_alerts': alerts})
 
 
 @login_required
+@idempotent
 def start_shift(request):
     if request.method == "POST":
-        amount = request.POST.get('start_cash', 0)
-        Shift.objects.create(
-            user=request.user,
-            start_cash=amount,
-            is_active=True
-        )
+        try:
+            amount = Decimal(request.POST.get('start_cash') or 0)
+        except InvalidOperation:
+            messages.error(request, "Введите корректную сумму в кассе.")
+            return render(request, 'core/start_shift.html')
+        try:
+            with transaction.atomic():
+                Shift.objects.create(
+                    user=request.user,
+                    start_cash=amount,
+                    is_active=True
+                )
+        except IntegrityError:
+            # single_active_shift: someone else opened a shift first
+            messages.error(request, "Уже есть активная смена. Закройте текущую смену перед открытием новой.")
+            return redirect('core:dashboard')
         messages.success(request, "Смена открыта!")
         return redirect('core:dashboard')
     return render(request, 'core/start_shift.html')
 
 @login_required
+@idempotent
 def close_shift(request):
+    # Straight from the database: the expected cash must include the last bills
     active_shift = Shift.objects.filter(is_active=True).first()
     
     if not active_shift:
@@ -374,18 +471,23 @@ def close_shift(request):
 
     # BLOCKER: Check if any session is still running
     if Session.objects.filter(is_active=True).exists():
-        messages.error(request, "Нельзя закрыть смену! Есть открытые столы. Сначала завершите все активные сессии.")
+        messages.error(request, "Нельзя закрыть смену! Есть открытые столы. Сначала завершите все активные сессии (кнопка «Закрыть все столы»).")
         return redirect('core:dashboard')
 
     report = active_shift.get_shift_report()
-    expected_cash = active_shift.start_cash + report['total_revenue']
+    expected_cash = active_shift.expected_cash
 
     if request.method == "POST":
-        active_shift.end_time = timezone.now()
         # Save what the staff actually counted
-        active_shift.end_cash = request.POST.get('end_cash')
-        active_shift.is_active = False
-        active_shift.save()
+        try:
+            end_cash = Decimal(request.POST.get('end_cash'))
+        except (InvalidOperation, TypeError):
+            messages.error(request, "Введите корректную сумму в кассе.")
+            return redirect('core:close_shift')
+
+        if not active_shift.close(end_cash):
+            messages.warning(request, "Смена уже закрыта.")
+            return redirect('/')
         
         messages.success(request, f"Смена успешно закрыта. Ожидалось: {expected_cash}, Введено: {active_shift.end_cash}")
         return redirect('/')
@@ -397,20 +499,137 @@ def close_shift(request):
     })
 
 @login_required
+@idempotent
 def toggle_pause(request, session_id):
     session = get_object_or_404(Session, id=session_id, is_active=True)
     
-    if not session.is_paused:
-        # Pause the session
-        session.is_paused = True
-        SessionPause.objects.create(session=session)
+    # The form says what the user saw, so a double-click doesn't toggle twice
+    action = request.POST.get('action') or ('resume' if session.is_paused else 'pause')
+    if action == 'pause':
+        session.pause()
     else:
-        # Resume the session
-        session.is_paused = False
-        pause = session.pauses.filter(resumed_at__isnull=True).last()
-        if pause:
-            pause.resumed_at = timezone.now()
-            pause.save()
-            
-    session.save()
-    return redirect('core:session_detail', pk=session.id)
\ No newline at end of file
+        session.resume()
+    return redirect('core:session_detail', pk=session.id)
+
+@require_POST
+@login_required
+@idempotent
+def move_session(request, pk):
+    session = get_object_or_404(Session, pk=pk, is_active=True)
+    target = get_object_or_404(Resource, pk=request.POST.get('resource_id'), is_active=True)
+
+    if target.pk == session.resource_id:
+        return redirect('core:session_detail', pk=session.pk)
+
+    if Session.objects.filter(resource=target, is_active=True).exists():
+        messages.error(request, f"Стол {target.name} уже занят.")
+        return redirect('core:session_detail', pk=session.pk)
+
+    session.move_to(target)
+    messages.success(request, f"Сессия перенесена на {target.name}")
+    return redirect('core:session_detail', pk=session.pk)
+
+
+def _date_range(request, default_days):
+    """
+    Reads ?from=YYYY-MM-DD&to=YYYY-MM-DD (both inclusive, club time).
+    Returns the dates plus the aware [start, end) datetimes covering them.
+    """
+    today = timezone.localdate()
+    try:
+        date_from = datetime.strptime(request.GET.get('from', ''), '%Y-%m-%d').date()
+    except ValueError:
+        date_from = today - timedelta(days=default_days)
+    try:
+        date_to = datetime.strptime(request.GET.get('to', ''), '%Y-%m-%d').date()
+    except ValueError:
+        date_to = today
+
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(date_from, datetime.min.time()), tz)
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time()), tz)
+    return date_from, date_to, start, end
+
+
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+
+@staff_member_required
+def utilisation(request):
+    """Hour-of-week occupancy heatmap for every table."""
+    date_from, date_to, start, end = _date_range(request, default_days=28)
+    heatmap = utilisation_by_hour_of_week(start, end)
+    rows = []
+    for resource in Resource.objects.all().order_by('name'):
+        matrix = heatmap.get(resource.pk, [[0] * 24 for _ in range(7)])
+        rows.append({
+            'resource': resource,
+            'days': [
+                (weekday, [round(share * 100) for share in day])
+                for weekday, day in zip(WEEKDAYS, matrix)
+            ],
+        })
+
+    return render(request, 'core/utilisation.html', {
+        'rows': rows,
+        'hours': range(24),
+        'date_from': date_from,
+        'date_to': date_to,
+    })
+
+
+@staff_member_required
+def network_report(request):
+    """Revenue of every club over ?from=&to=, read from each club's database."""
+    date_from, date_to, start, end = _date_range(request, default_days=7)
+    clubs, total = network_summary(start, end)
+    return render(request, 'core/clubs_report.html', {
+        'clubs': clubs,
+        'total': total,
+        'date_from': date_from,
+        'date_to': date_to,
+    })
+
+
+@staff_member_required
+def reorder_report(request):
+    try:
+        day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = timezone.localdate()
+    return render(request, 'core/reorder.html', {
+        'day': day,
+        'products': reorder_list(day),
+    })
+
+
+@staff_member_required
+def export_csv(request, dataset):
+    """Streams one of the accounting datasets for ?from=&to= as CSV."""
+    if dataset not in exports.DATASETS:
+        raise Http404
+    date_from, date_to, start, end = _date_range(request, default_days=31)
+    queryset, header = exports.export_queryset(dataset, start, end)
+    return exports.csv_response(f"{dataset}_{date_from:%Y%m%d}_{date_to:%Y%m%d}", queryset, header)
+
+
+@staff_member_required
+def perf_report(request):
+    """Recently profiled requests of this worker, newest or slowest first."""
+    requests = list(perf.recent)
+    if request.GET.get('sort') == 'slow':
+        requests.sort(key=lambda r: r['total_ms'], reverse=True)
+    else:
+        requests.reverse()
+    return render(request, 'core/perf.html', {
+        'requests': requests,
+        'sample_rate': settings.PERF_SAMPLE_RATE,
+        'buffer_size': perf.recent.maxlen,
+    })
+
+
+def metrics_endpoint(request):
+    """Prometheus scrape target, open to METRICS_ALLOWED_IPS only."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
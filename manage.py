@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'billard_pos.settings')
+    # Tests must not share the server's cache and logs, see billard_pos/test_settings.py
+    settings_module = 'billard_pos.test_settings' if sys.argv[1:2] == ['test'] else 'billard_pos.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: